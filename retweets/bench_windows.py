@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Window engine benchmark: runs compute_one_window from
+dgx_windows_single_gpu_hardened_plus.py over a windows CSV (typically the one
+written by synth_retweets.py) and records, per window and per size tier,
+events/sec and the per-stage times of the engine's --profile spans.
+
+    python synth_retweets.py --out /tmp/synth --events 2000000
+    python bench_windows.py --parquet-root /tmp/synth --windows-file /tmp/synth/windows.csv \\
+        --outroot /tmp/bench --engine-args="--drop-self-loops --variants base,unweighted,thr2"
+
+Outputs under <outroot>/bench/:
+  windows.csv           one row per window run (tier, events, wall seconds, events/sec)
+  tiers.csv             per tier totals, events/sec and p50 / p95 window wall time
+  stage_rollup_<tier>.csv  per stage p50 / p95 within the tier (from the profile traces)
+  bench.json            run metadata and the tier table, for tracking regressions
+
+--backend cpu (or auto without cuDF) runs the engine's CPU backend (pandas /
+NumPy / SciPy), so throughput can be tracked on machines without a GPU.
+"""
+
+import os, csv, json, time, shlex, argparse, platform
+
+import numpy as np
+import pandas as pd
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+
+    p.add_argument("--parquet-root", required=True)
+    p.add_argument("--windows-file", required=True, help="company,start,end[,window_id][,tier]")
+    p.add_argument("--outroot", required=True)
+
+    p.add_argument("--backend", choices=["auto", "gpu", "cpu"], default="auto")
+    p.add_argument("--engine-args", default="", help="Extra engine flags; pass as --engine-args=\"--variants base --rolling\"")
+    p.add_argument("--tiers", default="", help="Only run these tiers (comma separated; default: all)")
+    p.add_argument("--max-windows", type=int, default=0, help="Per tier (0 = all)")
+    p.add_argument("--repeat", type=int, default=1, help="Runs per window; tables use every run")
+    p.add_argument("--warmup", type=int, default=1, help="Unrecorded runs of the first window (imports, JIT, pools)")
+
+    return p.parse_args(argv)
+
+
+# ----------------------------
+# Engine import (GPU or CPU)
+# ----------------------------
+def load_engine(backend: str):
+    """Import the engine; returns (engine module, frame module, graph module, backend used)."""
+    import dgx_windows_single_gpu_hardened_plus as eng
+    if backend in ("auto", "gpu"):
+        try:
+            return (eng, *eng.load_backend("gpu"), "gpu")
+        except ImportError:
+            if backend == "gpu":
+                raise
+    return (eng, *eng.load_backend("cpu"), "cpu")
+
+
+def read_bench_windows(path, tiers, max_windows):
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows.append({
+                "company": row["company"].strip(),
+                "start": row["start"].strip(),
+                "end": row["end"].strip(),
+                "window_id": row.get("window_id", "").strip(),
+                "tier": (row.get("tier") or "").strip(),
+            })
+    if tiers:
+        rows = [r for r in rows if r["tier"] in tiers]
+    if max_windows:
+        kept, per_tier = [], {}
+        for r in rows:
+            per_tier[r["tier"]] = per_tier.get(r["tier"], 0) + 1
+            if per_tier[r["tier"]] <= max_windows:
+                kept.append(r)
+        rows = kept
+    return rows
+
+
+def size_tier(n_events: int) -> str:
+    """Decade bucket of the window's event count: 1e3 = [1e3, 1e4)."""
+    return "0" if n_events <= 0 else f"1e{int(np.log10(n_events))}"
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main(argv=None):
+    args = parse_args(argv)
+    eng, cudf, cugraph, backend = load_engine(args.backend)
+
+    eargs = eng.parse_args(["--parquet-root", args.parquet_root, "--windows-file", args.windows_file,
+                            "--outroot", os.path.join(args.outroot, "windows"), "--profile",
+                            "--catalog-mode", "off", "--backend", backend]
+                           + shlex.split(args.engine_args))
+    eargs.skip_existing = False
+    eargs.results_sink = "json"  # the bench reads each window's summary.json back (no sink writer runs here)
+    bench_dir = os.path.join(args.outroot, "bench")
+    os.makedirs(bench_dir, exist_ok=True)
+
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip()]
+    windows = read_bench_windows(args.windows_file, tiers, args.max_windows)
+    if not windows:
+        raise SystemExit("No windows to run.")
+
+    class _Flag:
+        def is_set(self):
+            return False
+
+    def run(w):
+        t0 = time.time()
+        eng.compute_one_window(cudf, cugraph, eargs, w["company"], w["start"], w["end"], w["window_id"], _Flag())
+        return time.time() - t0
+
+    for _ in range(args.warmup):
+        run(windows[0])
+
+    records = []
+    by_tier: dict = {}
+    for w in windows:
+        by_tier.setdefault(w["tier"] or "all", []).append(w)
+    for tier, ws in by_tier.items():
+        eng.start_profiler(eargs, f"bench-{tier}")
+        for w in ws:
+            for rep in range(args.repeat):
+                with eng.stage("window", push=False, company=w["company"], window_id=w["window_id"], tier=tier):
+                    wall = run(w)
+                _, outdir = eng.window_paths(eargs, w["company"], w["start"], w["end"], w["window_id"])
+                with open(os.path.join(outdir, "summary.json")) as f:
+                    summary = json.load(f)
+                n = int(summary.get("n_retweet_events", 0) or 0)
+                records.append({"tier": tier, "size_tier": size_tier(n), "company": w["company"],
+                                "window_id": w["window_id"], "start": w["start"], "end": w["end"], "repeat": rep,
+                                "n_events": n, "n_nodes": summary.get("base__n_nodes"),
+                                "wall_s": round(wall, 4), "events_per_s": round(n / wall, 1) if wall > 0 else None})
+        eng._PROFILER.close()
+        eng._PROFILER = None
+        eng.profile_rollup(eargs, f"trace-bench-{tier}.json", f"stage_rollup_{tier}.csv")
+        os.replace(os.path.join(eargs.outroot, "profile", f"stage_rollup_{tier}.csv"),
+                   os.path.join(bench_dir, f"stage_rollup_{tier}.csv"))
+        print(f"{tier}: {len(ws)} windows x {args.repeat}")
+
+    df = pd.DataFrame(records)
+    df.to_csv(os.path.join(bench_dir, "windows.csv"), index=False)
+    g = df.groupby("tier")
+    tiers_df = pd.DataFrame({
+        "runs": g.size(),
+        "events": g["n_events"].sum(),
+        "wall_s": g["wall_s"].sum(),
+        "p50_wall_s": g["wall_s"].median(),
+        "p95_wall_s": g["wall_s"].quantile(0.95),
+    })
+    tiers_df["events_per_s"] = (tiers_df["events"] / tiers_df["wall_s"]).round(1)
+    tiers_df = tiers_df.reset_index()
+    tiers_df.to_csv(os.path.join(bench_dir, "tiers.csv"), index=False)
+
+    meta = {
+        "backend": backend,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parquet_root": args.parquet_root,
+        "windows_file": args.windows_file,
+        "engine_args": args.engine_args,
+        "repeat": args.repeat,
+        "total_events": int(df["n_events"].sum()),
+        "total_wall_s": float(df["wall_s"].sum()),
+        "events_per_s": float(df["n_events"].sum() / max(1e-9, df["wall_s"].sum())),
+        "tiers": tiers_df.to_dict(orient="records"),
+    }
+    with open(os.path.join(bench_dir, "bench.json"), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+
+    print(tiers_df.to_string(index=False))
+    print(f"{meta['total_events']} events in {meta['total_wall_s']:.2f}s ({meta['events_per_s']:.0f} events/s, "
+          f"{backend}) -> {bench_dir}")
+
+
+if __name__ == "__main__":
+    main()
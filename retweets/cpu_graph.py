@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU stand-in for the subset of cuGraph used by
+dgx_windows_single_gpu_hardened_plus.py (--backend cpu).
+
+Graphs are scipy.sparse CSR matrices over the engine's factorized vertex ids
+(0..n-1, renumber=False). Every function takes and returns the same shapes as
+its cuGraph namesake (pandas frames with a "vertex" column), so the metric
+blocks run unchanged:
+
+    pagerank                     power iteration with uniform dangling mass (optional nstart)
+    weakly/strongly_connected_components  scipy.sparse.csgraph
+    core_number                  frontier level peeling over the simple undirected graph
+    triangle_count               degree-ordered (forward) wedge counting
+    louvain                      weighted label propagation (attrs["method"]); modularity of that partition
+    eigenvector_centrality       power iteration on A + I
+    betweenness_centrality       level-synchronous Brandes, all or k sampled sources
+    closeness_centrality         (reachable vertices) / (sum of distances), BFS per source
+    bfs                          unweighted distances from one source
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+# ----------------------------
+# Graph
+# ----------------------------
+class Graph:
+    """Edge list -> CSR. Directed graphs keep src->dst; undirected ones are symmetrized (weights summed)."""
+
+    def __init__(self, directed=False, store_transposed=False):
+        self.directed = directed
+
+    def from_cudf_edgelist(self, df, source="src", destination="dst", edge_attr=None, renumber=False):
+        src = np.asarray(df[source].values, dtype=np.int64)
+        dst = np.asarray(df[destination].values, dtype=np.int64)
+        w = np.asarray(df[edge_attr].values, dtype=np.float64) if edge_attr else np.ones(len(src))
+        self.n = int(max(src.max(), dst.max()) + 1) if len(src) else 0
+        W = sp.csr_matrix((w, (src, dst)), shape=(self.n, self.n))
+        W.sum_duplicates()
+        self.W = W if self.directed else (W + W.T).tocsr()
+        self._simple = None
+
+    @property
+    def simple(self):
+        """Unweighted symmetric adjacency without self-loops (core number, triangles, degree, BFS)."""
+        if self._simple is None:
+            A = self.W if not self.directed else (self.W + self.W.T)
+            A = sp.csr_matrix((np.ones(A.nnz), A.indices, A.indptr), shape=A.shape)
+            A.setdiag(0)
+            A.eliminate_zeros()
+            self._simple = A
+        return self._simple
+
+    def degree(self):
+        return _frame(degree=np.diff(self.simple.indptr).astype(np.int64))
+
+    def number_of_vertices(self):
+        return self.n
+
+
+def _frame(**cols):
+    n = len(next(iter(cols.values())))
+    return pd.DataFrame({"vertex": np.arange(n, dtype=np.int32), **cols})
+
+
+# ----------------------------
+# Components / cores / triangles
+# ----------------------------
+def weakly_connected_components(G):
+    _, labels = csgraph.connected_components(G.W, directed=True, connection="weak")
+    return _frame(labels=labels.astype(np.int32))
+
+
+def strongly_connected_components(G):
+    _, labels = csgraph.connected_components(G.W, directed=True, connection="strong")
+    return _frame(labels=labels.astype(np.int32))
+
+
+def core_number(G):
+    """
+    Level peeling in the order of Batagelj-Zaversnik, frontier by frontier: at
+    level k every vertex whose remaining degree is <= k is removed (core number
+    k) and only the rows of the removed vertices are read to lower their
+    neighbours' degrees; neighbours that drop to <= k form the next frontier.
+    When none is left at k, k moves to the smallest remaining degree. Degree
+    updates touch each edge once (O(m)); each level adds one O(n) scan.
+    """
+    A = G.simple
+    deg = np.diff(A.indptr).astype(np.int64)
+    core = np.zeros(G.n, dtype=np.int32)
+    alive = np.ones(G.n, dtype=bool)
+    left = G.n
+    k = 0
+    while left:
+        k = max(k, int(deg[alive].min()))
+        peel = np.flatnonzero(alive & (deg <= k))
+        while peel.size:
+            core[peel] = k
+            alive[peel] = False
+            left -= peel.size
+            starts, ends = A.indptr[peel], A.indptr[peel + 1]
+            lens = ends - starts
+            pos = np.arange(int(lens.sum())) + np.repeat(starts - (np.cumsum(lens) - lens), lens)
+            nbr, cnt = np.unique(A.indices[pos], return_counts=True)
+            deg[nbr] -= cnt
+            nbr = nbr[alive[nbr]]
+            peel = nbr[deg[nbr] <= k]
+    return _frame(core_number=core)
+
+
+def triangle_count(G):
+    """
+    Orient each edge from lower to higher (degree, id) rank; every triangle
+    a<b<c is then seen once as the wedge a->b->c closed by a->c. Vertex counts
+    add up the a, b and c roles.
+    """
+    A = G.simple
+    deg = np.diff(A.indptr)
+    rank = np.empty(G.n, dtype=np.int64)
+    rank[np.lexsort((np.arange(G.n), deg))] = np.arange(G.n)
+    C = A.tocoo()
+    keep = rank[C.row] < rank[C.col]
+    L = sp.csr_matrix((np.ones(int(keep.sum())), (C.row[keep], C.col[keep])), shape=A.shape)
+    T = (L @ L).multiply(L)             # (a, c): number of b with a->b->c
+    M = (L @ L.T).multiply(L.T)         # (b, a): number of c with a->c, b->c, a->b
+    tri = (np.asarray(T.sum(axis=1)).ravel() + np.asarray(T.sum(axis=0)).ravel()
+           + np.asarray(M.sum(axis=1)).ravel())
+    return _frame(triangle_count=tri.astype(np.int64))
+
+
+# ----------------------------
+# Influence / centrality
+# ----------------------------
+def pagerank(G, alpha=0.85, tol=1e-5, max_iter=100, nstart=None):
+    """
+    nstart: optional starting vector (frame with vertex / values columns, as in
+    cuGraph). The iteration count is returned in the frame's attrs["iterations"].
+    """
+    W = G.W
+    n = G.n
+    out_w = np.asarray(W.sum(axis=1)).ravel()
+    dangling = out_w == 0
+    inv = np.where(dangling, 0.0, 1.0 / np.where(dangling, 1.0, out_w))
+    PT = (sp.diags(inv) @ W).T.tocsr()
+    x = np.full(n, 1.0 / n)
+    if nstart is not None:
+        x = np.zeros(n)
+        x[np.asarray(nstart["vertex"].values, dtype=np.int64)] = np.asarray(nstart["values"].values, dtype=np.float64)
+        x = x / x.sum()
+    it = 0
+    for it in range(1, max_iter + 1):
+        x_new = alpha * (PT @ x + x[dangling].sum() / n) + (1.0 - alpha) / n
+        err = np.abs(x_new - x).sum()
+        x = x_new
+        if err < tol:  # L1 change, as cuGraph's pagerank
+            break
+    df = _frame(pagerank=x / x.sum())
+    df.attrs["iterations"] = it
+    return df
+
+
+def eigenvector_centrality(G, max_iter=100, tol=1e-6):
+    A = G.W
+    x = np.full(G.n, 1.0 / G.n)
+    for _ in range(max_iter):
+        x_new = A @ x + x
+        norm = np.linalg.norm(x_new)
+        x_new = x_new / norm if norm > 0 else x_new
+        if np.abs(x_new - x).sum() < G.n * tol:
+            x = x_new
+            break
+        x = x_new
+    return _frame(eigenvector_centrality=x)
+
+
+def _bfs_levels(A, sources):
+    """Distances (n x k, -1 unreachable) and shortest-path counts from k sources, one sparse product per level."""
+    n, k = A.shape[0], len(sources)
+    dist = np.full((n, k), -1, dtype=np.int64)
+    sigma = np.zeros((n, k))
+    cols = np.arange(k)
+    dist[sources, cols] = 0
+    sigma[sources, cols] = 1.0
+    frontier = np.zeros((n, k))
+    frontier[sources, cols] = 1.0
+    d = 0
+    while frontier.any():
+        reach = A @ frontier
+        new = (reach > 0) & (dist < 0)
+        d += 1
+        dist[new] = d
+        sigma[new] = reach[new]
+        frontier = np.where(new, sigma, 0.0)
+    return dist, sigma
+
+
+def _batch(n: int) -> int:
+    """Sources per level-synchronous pass, keeping the n x batch work arrays around 20M cells."""
+    return max(1, min(256, int(2e7 // max(1, n))))
+
+
+def betweenness_centrality(G, k=None, normalized=True, seed=None):
+    """Brandes on the simple undirected graph, from all sources or k sampled ones (scaled by n / k)."""
+    A = G.simple
+    n = G.n
+    sources = np.arange(n) if k is None or k >= n else np.random.default_rng(seed).choice(n, size=k, replace=False)
+    bc = np.zeros(n)
+    batch = _batch(n)
+    for i in range(0, len(sources), batch):
+        s = sources[i:i + batch]
+        dist, sigma = _bfs_levels(A, s)
+        delta = np.zeros_like(sigma)
+        for d in range(int(dist.max()), 0, -1):
+            at = dist == d
+            t = np.where(at, (1.0 + delta) / np.where(at, sigma, 1.0), 0.0)
+            up = dist == d - 1
+            delta += np.where(up, sigma * (A @ t), 0.0)
+        delta[s, np.arange(len(s))] = 0.0
+        bc += delta.sum(axis=1)
+    bc = bc / 2.0 * (n / len(sources))  # each undirected pair is seen from both ends
+    if normalized and n > 2:
+        bc = bc * 2.0 / ((n - 1) * (n - 2))
+    return _frame(betweenness_centrality=bc)
+
+
+def closeness_centrality(G):
+    A = G.simple
+    n = G.n
+    batch = _batch(n)
+    dist_sum = np.zeros(n)
+    reach = np.zeros(n)
+    for i in range(0, n, batch):
+        dist, _ = _bfs_levels(A, np.arange(i, min(n, i + batch)))
+        ok = dist > 0
+        dist_sum += np.where(ok, dist, 0).sum(axis=1)
+        reach += ok.sum(axis=1)
+    cc = np.where(dist_sum > 0, reach / np.where(dist_sum > 0, dist_sum, 1.0), 0.0)
+    return _frame(closeness_centrality=cc)
+
+
+def bfs(G, start=0):
+    dist, _ = _bfs_levels(G.simple, np.array([start]))
+    d = dist[:, 0]
+    return _frame(distance=np.where(d < 0, INT32_MAX, d).astype(np.int32))
+
+
+# ----------------------------
+# Communities
+# ----------------------------
+def modularity(A, labels) -> float:
+    """Weighted modularity of a partition of the symmetric matrix A."""
+    two_m = A.sum()
+    if two_m <= 0:
+        return float("nan")
+    C = A.tocoo()
+    inside = C.data[labels[C.row] == labels[C.col]].sum()
+    strength = np.bincount(labels, weights=np.asarray(A.sum(axis=1)).ravel())
+    return float(inside / two_m - ((strength / two_m) ** 2).sum())
+
+
+def louvain(G, max_iter=50, seed=0):
+    """
+    Weighted label propagation (half of the vertices update per sweep, which
+    avoids the two-cycle oscillation of fully synchronous updates), returning
+    (partition frame, modularity of the partition) like cugraph.louvain. This is
+    not Louvain, so its modularity is lower and its communities differ; the frame's
+    attrs["method"] says "label_propagation" and the engine records it per variant.
+    """
+    A = G.W.tocoo()
+    off = A.row != A.col
+    rows, cols, w = A.row[off], A.col[off], A.data[off]
+    n = G.n
+    labels = np.arange(n)
+    rng = np.random.default_rng(seed)
+    for _ in range(max_iter):
+        # weight of each (vertex, neighbour label); the heaviest label wins (ties: smallest label)
+        agg = pd.DataFrame({"v": rows, "l": labels[cols], "w": w}).groupby(["v", "l"], sort=False)["w"].sum()
+        agg = agg.reset_index().sort_values(["v", "w", "l"], ascending=[True, False, True])
+        best = agg.drop_duplicates("v")
+        proposal = labels.copy()
+        proposal[best["v"].values] = best["l"].values
+        move = (proposal != labels) & (rng.random(n) < 0.5)
+        if not move.any():
+            if (proposal == labels).all():
+                break
+            continue
+        labels = np.where(move, proposal, labels)
+    _, labels = np.unique(labels, return_inverse=True)
+    parts = _frame(partition=labels.astype(np.int32))
+    parts.attrs["method"] = "label_propagation"
+    return parts, modularity(G.W, labels)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import pandas as pd
+import numpy as np
 import os
 import cudf
 
@@ -9,6 +10,10 @@ import cudf
 csv_file = "/data/retweet_network2017.csv"
 parquet_root = "/data/retweets_parquet"
 
+# Screen name -> int32 user id, shared by every CSV converted into parquet_root.
+# Existing names keep their ids; new names get the next ones (id = row number).
+user_dict_file = os.path.join(parquet_root, "_user_dict.parquet")
+
 # Create output folder if missing
 os.makedirs(parquet_root, exist_ok=True)
 
@@ -49,6 +54,36 @@ print(f"Rows after dropping bad timestamps: {len(df)}")
 df["year"] = df["year"].astype("int32")
 df["month"] = df["month"].astype("int32")
 
+# ---------------------------
+# Global user ids
+# ---------------------------
+df = df.dropna(subset=["edgeA", "edgeB"])
+
+if os.path.exists(user_dict_file):
+    names = pd.read_parquet(user_dict_file)["screen_name"]
+else:
+    names = pd.Series([], dtype=object, name="screen_name")
+print(f"User dictionary: {len(names)} names")
+
+seen = pd.unique(pd.concat([df["edgeA"], df["edgeB"]], ignore_index=True))
+known = pd.Index(names)
+new = seen[known.get_indexer(seen) < 0]
+if len(names) + len(new) > np.iinfo(np.int32).max:
+    raise RuntimeError("User dictionary would exceed the int32 id range.")
+if len(new):
+    names = pd.concat([names, pd.Series(new, name="screen_name")], ignore_index=True)
+    tmp = user_dict_file + ".tmp"
+    pd.DataFrame({
+        "user_id": np.arange(len(names), dtype="int32"),
+        "screen_name": names.values,
+    }).to_parquet(tmp, index=False)
+    os.replace(tmp, user_dict_file)  # only a complete dictionary ever replaces the old one
+print(f"New names: {len(new)}; dictionary now {len(names)}")
+
+index = pd.Index(names)
+df["src_id"] = index.get_indexer(df["edgeA"]).astype("int32")
+df["dst_id"] = index.get_indexer(df["edgeB"]).astype("int32")
+
 # ---------------------------
 # Convert to cuDF (GPU DataFrame)
 # ---------------------------
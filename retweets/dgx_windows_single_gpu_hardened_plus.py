@@ -1,58 +1,174 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, csv, glob, json, math, argparse, traceback
+import os, csv, glob, json, math, hashlib, argparse, traceback, queue, time, threading
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from multiprocessing import get_context
-from typing import Dict, Any, Tuple, Optional
+from multiprocessing.connection import wait as mp_wait
+from typing import Dict, Any, List, Tuple, Optional
 
 import pandas as pd
-import cudf
 import numpy as np
 import re
-import cupy as cp
+
+# Array module for the vertex / edge arrays: CuPy on the GPU backend, NumPy on
+# the CPU one. cuDF, CuPy and cuGraph are imported by load_backend() in each worker.
+cp = np
 
 
 # ----------------------------
 # CLI
 # ----------------------------
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser()
 
     p.add_argument("--parquet-root", required=True)
     p.add_argument("--windows-file", required=True)
     p.add_argument("--outroot", required=True)
 
-    p.add_argument("--ngpus", type=int, default=8)
+    p.add_argument("--ngpus", type=int, default=8, help="Worker processes (one per GPU; CPU workers with --backend cpu)")
+    p.add_argument("--backend", choices=["gpu", "cpu"], default="gpu",
+                   help="gpu: cuDF / CuPy / cuGraph; cpu: pandas / NumPy / SciPy (cpu_graph.py), same summary keys")
     p.add_argument("--queue-max", type=int, default=20000)
 
+    # scheduling
+    p.add_argument("--schedule", choices=["lpt", "fifo"], default="lpt",
+                   help="lpt: largest estimated window first, with company affinity; fifo: windows-file order")
+    p.add_argument("--affinity-slack", type=float, default=0.5,
+                   help="Prefer a worker's last company if its largest window is >= this x the largest pending")
+    p.add_argument("--bytes-per-event", type=float, default=1024.0,
+                   help="Rough device bytes per event, for gating windows on a worker's free memory")
+
     p.add_argument("--src-col", default="edgeA")
     p.add_argument("--dst-col", default="edgeB")
+    p.add_argument("--user-ids", choices=["auto", "on", "off"], default="auto",
+                   help="Read the int32 src_id/dst_id columns from csv_to_parquet.py instead of the handles "
+                        "(auto: when the user dictionary exists and --src-col/--dst-col are not given); "
+                        "labels are decoded only for node tables")
+    p.add_argument("--user-dict", default="", help="Screen-name dictionary (default: <parquet-root>/_user_dict.parquet)")
     p.add_argument("--timestamp-col", default="timestamp")
 
+    p.add_argument("--reader", choices=["cudf", "pyarrow"], default="cudf",
+                   help="Parquet decode path; both skip row groups outside the window and read only src/dst/ts")
+
+    p.add_argument("--catalog", default="",
+                   help="Partition catalog JSON (default: <outroot>/_partition_catalog.json)")
+    p.add_argument("--catalog-mode", choices=["refresh", "reuse", "off"], default="refresh",
+                   help="refresh: re-list the tree, re-read only changed footers; reuse: trust the saved "
+                        "catalog as is; off: glob month directories per window")
+
+    p.add_argument("--partition-cache-mb", type=float, default=0,
+                   help="Per-worker LRU cache of decoded company/year/month frames (0 = off)")
+    p.add_argument("--partition-cache-location", choices=["device", "host"], default="device")
+
     p.add_argument("--drop-self-loops", action="store_true")
-    p.add_argument("--skip-existing", action="store_true")
+    p.add_argument("--skip-existing", action="store_true",
+                   help="Skip windows recorded in <outroot>/_manifest/ (ok or failed), and json outputs already on disk")
+    p.add_argument("--retry-failed", action="store_true",
+                   help="Run only the windows whose latest manifest status is failed")
+    p.add_argument("--manifest-sync-every", type=int, default=256,
+                   help="fsync the completion manifest after this many records")
+    p.add_argument("--manifest-sync-sec", type=float, default=5.0,
+                   help="... or after this many seconds since the last fsync")
     p.add_argument("--max-tasks", type=int, default=0)
 
+    # results output
+    p.add_argument("--results-sink", choices=["json", "parquet"], default="json",
+                   help="json: summary/errors/validation.json per window directory; parquet: one writer process "
+                        "appends summary rows to <outroot>/results/company=X/ (window directories only for node tables)")
+    p.add_argument("--sink-batch-rows", type=int, default=2000, help="Rows per committed parquet file per company")
+    p.add_argument("--sink-flush-sec", type=float, default=60.0, help="Commit a company's buffered rows after this long")
+
     # robustness / validation
     p.add_argument("--validation-tol", type=float, default=1e-6)
     p.add_argument("--fail-fast-window", action="store_true")
     p.add_argument("--fail-fast-global", action="store_true")
+    p.add_argument("--prefetch-depth", type=int, default=1,
+                   help="Windows each worker reads ahead of the one computing (0 = read inline)")
+    p.add_argument("--prefetch-mb", type=float, default=0,
+                   help="Do not start another read-ahead while prefetched frames hold this much (0 = no cap)")
+    p.add_argument("--task-timeout", type=float, default=0,
+                   help="Wall-clock seconds per window of a leased unit before its worker is killed (0 = off)")
+    p.add_argument("--max-retries", type=int, default=1,
+                   help="Re-runs (degraded: no extra centrality, no node tables) of a unit whose worker died or timed out")
 
     # variants: robustness to weight definition / noise
     p.add_argument("--variants", default="base,unweighted,thr2",
                    help="Comma-separated: base,unweighted,thr2,thr3")
 
+    # rolling series: incremental edge aggregation between consecutive windows of a company
+    p.add_argument("--rolling", action="store_true",
+                   help="Run each company's windows in start order on one worker and update the edge table incrementally")
+    p.add_argument("--rolling-step", default="1D",
+                   help="Slice size for entering/leaving events; window starts should fall on multiples of it")
+    p.add_argument("--rolling-chunk", type=int, default=0,
+                   help="Split each company series into runs of N windows for parallelism (0 = whole series)")
+    p.add_argument("--pagerank-warm-start", choices=["on", "off"], default="on",
+                   help="Start PageRank from the last vector this worker computed for the company (per variant, "
+                        "matched by user id / label); off: uniform start every window")
+
+    # batched execution of many tiny windows (segmented groupby, no graph algorithms)
+    p.add_argument("--batch-small", type=int, default=0,
+                   help="Windows with at most N events run in segmented batches (0 = off); larger ones run per window")
+    p.add_argument("--batch-size", type=int, default=256, help="Windows per batch")
+
+    # sketch mode for very large windows (streamed row groups, bounded memory)
+    p.add_argument("--approx-above", type=int, default=0,
+                   help="Windows with more than N estimated events (row-group statistics) run in sketch mode: "
+                        "one streamed pass, base variant summary with approx_* error bounds, no graph "
+                        "algorithms (0 = off)")
+    p.add_argument("--hll-p", type=int, default=14, help="HyperLogLog precision: 2^p registers, rse 1.04/sqrt(2^p)")
+    p.add_argument("--cms-width", type=int, default=1 << 18,
+                   help="Count-Min counters per row; top-k strengths overcount by <= e/width of the total weight")
+    p.add_argument("--cms-depth", type=int, default=4, help="Count-Min rows; the bound holds with prob 1 - exp(-depth)")
+    p.add_argument("--sketch-topk", type=int, default=100, help="Vertices kept per side for top in / out strength")
+    p.add_argument("--quantile-alpha", type=float, default=0.01, help="Relative error of the event-time quantile sketch")
+    p.add_argument("--node-sample-cap", type=int, default=1_000_000,
+                   help="Most vertices in the hash sample behind the strength distributions")
+
     # diffusion (time binning)
     p.add_argument("--diff-bin", default="10min", help="e.g., 1min,5min,10min,1H")
     p.add_argument("--growth-window-hours", type=float, default=2.0,
                    help="Fit early growth rate on first X hours from first event")
+    p.add_argument("--profile-bins", default="",
+                   help="Also report peak share, time to peak, half-life and early slope at these resolutions, "
+                        "e.g. 1min,10min,1H (columns suffixed _1min, _10min, _1H)")
+    p.add_argument("--export-adoption-curves", action="store_true",
+                   help="Write cumulative event / node / source / target curves per window to adoption_curves.npz")
 
     # extras (may be heavy; version dependent)
     p.add_argument("--extra-centrality", action="store_true")
+    p.add_argument("--metric-budget", default="betweenness=2e10,closeness=2e10",
+                   help="Work budget per path centrality in edge visits (exact ~ n_nodes * n_edges); "
+                        "over budget runs from k sampled sources. metric=0 keeps it exact")
+    p.add_argument("--metric-time-budget", type=float, default=0,
+                   help="Also sample when the time predicted from this worker's observed rate exceeds N seconds (0 = off)")
+    p.add_argument("--sample-k-min", type=int, default=64, help="Fewest sources for a sampled centrality")
+    p.add_argument("--sample-seed", type=int, default=42)
+    p.add_argument("--bootstrap", type=int, default=0,
+                   help="Bootstrap replicates (events resampled with replacement) for percentile CIs of the "
+                        "in-strength gini / hhi / top / max shares, per variant (0 = off)")
+    p.add_argument("--bootstrap-level", type=float, default=0.95, help="Confidence level of the bootstrap intervals")
     p.add_argument("--save-node-tables", action="store_true")
-
-    return p.parse_args()
+    p.add_argument("--profile", action="store_true",
+                   help="Record per-stage wall time, host RSS and device memory to <outroot>/profile/ "
+                        "(Chrome trace JSON per worker, stage_rollup.csv with p50/p95 per stage)")
+
+    a = p.parse_args(argv)
+    if a.backend == "cpu":
+        a.reader = "pyarrow"
+    if not a.user_dict:
+        a.user_dict = os.path.join(a.parquet_root, "_user_dict.parquet")
+    custom_cols = (a.src_col, a.dst_col) != (p.get_default("src_col"), p.get_default("dst_col"))
+    if a.user_ids == "on" and custom_cols:
+        p.error("--user-ids on reads src_id/dst_id; it cannot be combined with --src-col/--dst-col")
+    if a.user_ids == "on" or (a.user_ids == "auto" and not custom_cols and os.path.exists(a.user_dict)):
+        a.src_col, a.dst_col = "src_id", "dst_id"
+    else:
+        a.user_dict = ""
+    return a
 
 
 def safe_float(x, default=float("nan")):
@@ -74,6 +190,28 @@ def month_iter(start_dt: datetime, end_dt: datetime):
             y += 1
 
 
+# ----------------------------
+# Backends
+# ----------------------------
+def load_backend(name: str):
+    """
+    (frame module, graph module) for --backend, and bind the module-level array
+    module `cp` to match. Every helper takes the frame module as its `cudf`
+    argument, so the same code runs on cuDF / CuPy / cuGraph or on pandas /
+    NumPy / cpu_graph (SciPy CSR with the cuGraph call signatures).
+    """
+    global cp
+    if name == "cpu":
+        import cpu_graph
+        cp = np
+        return pd, cpu_graph
+    import cudf
+    import cupy
+    import cugraph
+    cp = cupy
+    return cudf, cugraph
+
+
 # ----------------------------
 # GPU helpers (require cudf)
 # ----------------------------
@@ -90,330 +228,1040 @@ def normalize_end_of_day_cudf(cudf, end_ts):
     return end_ts
 
 
-def gini_cudf(cudf, s):
-    s = s.dropna().astype("float64")
-    s = s[s >= 0]
-    n = len(s)
-    if n == 0:
-        return float("nan")
-    total = float(s.sum())
-    if total <= 0:
-        return 0.0
-    s = s.sort_values()
-    idx = cudf.Series(range(1, n + 1), dtype="float64")
-    g = (2.0 * float((idx * s).sum()) / (n * total)) - ((n + 1.0) / n)
-    if g < 0 and g > -1e-12:
-        g = 0.0
-    return float(g)
+# ----------------------------
+# Distribution summaries (one sort per series)
+# ----------------------------
+DIST_QS = (0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+DIST_TOPS = (("top1", 0.01), ("top5", 0.05), ("top10", 0.10))
 
 
-def hhi_cudf(s):
-    s = s.dropna().astype("float64")
-    if len(s) == 0:
-        return float("nan")
-    tot = float(s.sum())
-    if tot <= 0:
-        return 0.0
-    p = s / tot
-    return float((p * p).sum())
+def _xp_of(a):
+    """numpy for host arrays, cupy for device arrays (cudf Series.values)."""
+    return np if isinstance(a, np.ndarray) else cp
 
 
-def entropy_share_cudf(s):
-    # entropy of shares p_i = s_i/sum(s)
-    s = s.dropna().astype("float64")
-    tot = float(s.sum())
-    if len(s) == 0 or tot <= 0:
-        return float("nan")
-    p = (s / tot).astype("float64")
-    # avoid log(0)
-    p = p[p > 0]
-    if len(p) == 0:
-        return float("nan")
-    return float(-(p * cp.log(p)).sum())
+def _dist_arrays(xp, x, sg, S, qs, tops):
+    """
+    Per-segment distribution statistics of x, already sorted by (sg, x), sg in 0..S-1.
+    Everything is derived from the sorted values and prefix sums; returns
+    {name: host array of length S} after a single device-to-host transfer.
+    """
+    pad = int(x.shape[0]) == 0
+    if pad:  # keep the indexing below valid; the padding segment is dropped at the end
+        x, sg = xp.zeros(1, dtype="float64"), xp.full(1, S, dtype="int64")
+    S_all = S + 1 if pad else S
+    S, S_out = S_all, S
+
+    cnt = xp.bincount(sg, minlength=S)
+    off = xp.cumsum(cnt) - cnt
+    nz = cnt > 0
+    last = off + xp.maximum(cnt, 1) - 1
+
+    tot = xp.bincount(sg, weights=x, minlength=S)
+    c = xp.cumsum(x)
+    base = xp.where(off > 0, c[xp.maximum(off - 1, 0)], 0.0)
+    n_f = cnt.astype("float64")
+    mean = tot / xp.maximum(n_f, 1.0)
+    dev = x - mean[sg]
+    var = xp.bincount(sg, weights=dev * dev, minlength=S) / xp.maximum(n_f - 1.0, 1.0)
+
+    cols = {"n": n_f, "tot": tot, "mean": mean, "std": xp.sqrt(var), "min": x[off * nz], "max": x[last]}
+    for q in qs:
+        pos = q * (n_f - 1.0)
+        lo = xp.floor(pos).astype("int64")
+        hi = xp.ceil(pos).astype("int64")
+        xl = x[(off + lo) * nz]
+        xh = x[(off + hi) * nz]
+        cols[f"q{int(q*100)}"] = xl + (xh - xl) * (pos - lo)
+
+    # top-k share: the k largest are the last k of each sorted segment
+    for name, frac in tops:
+        k = xp.maximum(xp.ceil(frac * n_f), 1.0).astype("int64")
+        j = off + cnt - k - 1
+        below = xp.where(cnt > k, c[xp.maximum(j, 0)] - base, 0.0)
+        cols[name] = tot - below
+    cols["top_max"] = x[last]
+
+    cols["x2"] = xp.bincount(sg, weights=x * x, minlength=S)
+    safe_tot = xp.where(tot > 0, tot, 1.0)
+    p = x / safe_tot[sg]
+    pos_p = p > 0
+    pl = xp.where(pos_p, p, 1.0)
+    cols["plogp"] = xp.bincount(sg, weights=xp.where(pos_p, p * xp.log(pl), 0.0), minlength=S)
+    cols["plogpn"] = xp.bincount(sg, weights=xp.where(pos_p, p * xp.log(pl * n_f[sg]), 0.0), minlength=S)
+
+    # Gini over the non-negative values: with w the values zeroed below 0 (a
+    # prefix of each sorted segment) and W its in-segment prefix sums,
+    # sum_i rank_i * w_i = (n+1) * total - sum_i W_i
+    nonneg = x >= 0
+    w = xp.where(nonneg, x, 0.0)
+    cw = xp.cumsum(w)
+    base_w = xp.where(off > 0, cw[xp.maximum(off - 1, 0)], 0.0)
+    cols["nn"] = xp.bincount(sg, weights=nonneg.astype("float64"), minlength=S)
+    cols["tot_nn"] = xp.bincount(sg, weights=w, minlength=S)
+    cols["sum_w"] = xp.bincount(sg, weights=cw - base_w[sg], minlength=S)
+
+    names = list(cols)
+    stacked = xp.stack([xp.asarray(cols[k], dtype="float64") for k in names])
+    host = stacked if xp is np else stacked.get()
+    return {k: v[:S_out] for k, v in zip(names, host)}
+
+
+def _dist_frame(a, prefix, qs, tops) -> pd.DataFrame:
+    """Turn _dist_arrays output into the stats/conc summary columns (one row per segment)."""
+    n, tot = a["n"], a["tot"]
+    empty = n == 0
+    pos = tot > 0
+    nan = float("nan")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {
+            f"{prefix}_mean": np.where(empty, nan, a["mean"]),
+            f"{prefix}_std": np.where(n > 1, a["std"], nan),
+            f"{prefix}_min": np.where(empty, nan, a["min"]),
+            f"{prefix}_max": np.where(empty, nan, a["max"]),
+        }
+        for q in qs:
+            out[f"{prefix}_q{int(q*100)}"] = np.where(empty, nan, a[f"q{int(q*100)}"])
+
+        nn, tn = a["nn"], a["tot_nn"]
+        gini = 2.0 * ((nn + 1.0) * tn - a["sum_w"]) / (nn * tn) - (nn + 1.0) / nn
+        gini = np.where((gini < 0) & (gini > -1e-12), 0.0, gini)
+        out[f"{prefix}_gini"] = np.where(nn == 0, nan, np.where(tn > 0, gini, 0.0))
+        out[f"{prefix}_hhi"] = np.where(empty, nan, np.where(pos, a["x2"] / (tot * tot), 0.0))
+        out[f"{prefix}_entropy"] = np.where(pos & ~empty, -a["plogp"], nan)
+        out[f"{prefix}_theil"] = np.where(pos & ~empty, a["plogpn"], nan)
+        for name, _ in tops:
+            out[f"{prefix}_{name}_share"] = np.where(empty, nan, np.where(pos, a[name] / tot, 0.0))
+        out[f"{prefix}_max_share"] = np.where(empty, nan, np.where(pos, a["top_max"] / tot, 0.0))
+    return pd.DataFrame(out)
+
+
+class DistributionSummary:
+    """
+    Sort a series once and derive mean/std/min/max, quantiles (linear
+    interpolation, as Series.quantile), top-k and max shares, Gini (over the
+    non-negative values), Theil, share entropy and HHI from the sorted array and
+    its prefix sums, with one host transfer. Works on cuDF (cupy) and pandas /
+    NumPy (numpy) input; NaNs are dropped first.
+
+    stats(prefix) gives {prefix}_mean/std/min/max/q25..q99, conc(prefix) gives
+    {prefix}_gini/hhi/entropy/theil/top1/top5/top10/max_share, pack(prefix) both.
+    """
+
+    def __init__(self, s, qs=DIST_QS, tops=DIST_TOPS):
+        x = s.dropna().astype("float64").values if hasattr(s, "dropna") else s
+        xp = _xp_of(x)
+        x = xp.asarray(x, dtype="float64")
+        x = x[~xp.isnan(x)]
+        x = xp.sort(x)
+        self.qs, self.tops = tuple(qs), tuple(tops)
+        self.n = int(x.shape[0])
+        self._x = x
+        a = _dist_arrays(xp, x, xp.zeros(self.n, dtype="int64"), 1, self.qs, self.tops)
+        self.total = float(a["tot"][0])
+        self._row = _dist_frame(a, "", self.qs, self.tops).iloc[0].to_dict()
+
+    def get(self, key: str) -> float:
+        return float(self._row["_" + key])
+
+    def stats(self, prefix: str) -> Dict[str, float]:
+        keys = ["mean", "std", "min", "max"] + [f"q{int(q*100)}" for q in self.qs]
+        return {f"{prefix}_{k}": self.get(k) for k in keys}
+
+    def conc(self, prefix: str) -> Dict[str, float]:
+        keys = ["gini", "hhi", "entropy", "theil"] + [f"{name}_share" for name, _ in self.tops] + ["max_share"]
+        return {f"{prefix}_{k}": self.get(k) for k in keys}
+
+    def pack(self, prefix: str) -> Dict[str, float]:
+        return {**self.stats(prefix), **self.conc(prefix)}
+
+    def top_k_share(self, k: int) -> float:
+        """Share of the k largest values (e.g. the 5 largest components)."""
+        if self.n == 0:
+            return float("nan")
+        if self.total <= 0:
+            return 0.0
+        return float(self._x[-max(1, int(k)):].sum()) / self.total
+
+
+def batched_distribution(values, seg, prefix, qs=DIST_QS, tops=DIST_TOPS) -> pd.DataFrame:
+    """
+    DistributionSummary for many series at once: values and integer segment ids
+    (cudf/pandas Series or arrays, same length). One lexsort by (seg, value);
+    returns a host frame indexed by the segment ids that have values.
+    """
+    x = values.values if hasattr(values, "values") else values
+    sg = seg.values if hasattr(seg, "values") else seg
+    xp = _xp_of(x)
+    x = xp.asarray(x, dtype="float64")
+    sg = xp.asarray(sg, dtype="int64")
+    keep = ~xp.isnan(x)
+    x, sg = x[keep], sg[keep]
+    order = xp.lexsort(xp.stack([x, sg.astype("float64")]))
+    x, sg = x[order], sg[order]
+    S = int(sg[-1]) + 1 if int(sg.shape[0]) else 0
+    a = _dist_arrays(xp, x, sg, S, tuple(qs), tuple(tops))
+    out = _dist_frame(a, prefix, tuple(qs), tuple(tops))
+    return out[a["n"] > 0]
+
+
+def expand_counts(values, counts):
+    """
+    values[i] repeated counts[i] times (xp.repeat with array counts), by
+    searchsorted of the slot positions in the cumulative counts; CuPy's repeat
+    takes no device array as counts, so both backends use this.
+    """
+    xp = _xp_of(values)
+    ends = xp.cumsum(xp.asarray(counts, dtype="int64"))
+    total = int(ends[-1]) if int(ends.shape[0]) else 0
+    return values[xp.searchsorted(ends, xp.arange(total, dtype="int64"), side="right")]
 
 
-def theil_share_cudf(s):
-    # Theil index on shares: T = sum p_i * log(p_i * n)
-    s = s.dropna().astype("float64")
-    tot = float(s.sum())
-    n = len(s)
-    if n == 0 or tot <= 0:
-        return float("nan")
-    p = (s / tot).astype("float64")
-    p = p[p > 0]
-    if len(p) == 0:
-        return float("nan")
-    return float((p * cp.log(p * float(n))).sum())
+class BootstrapCI:
+    """
+    Bootstrap intervals for the concentration of vertex strengths (--bootstrap).
+    A replicate resamples the window's N events with replacement, i.e. draws the
+    edge weights from Multinomial(N, weight / N), and sums them per vertex over
+    the window's fixed vertex set (vertices never drawn get 0). Replicates are
+    the rows of a (b x V) strength matrix filled by one bincount per chunk of b
+    replicates (b * max(N, V) <= max_cells); each row is sorted once and gini /
+    hhi / top-k / max shares come from its prefix sums, for all rows at once.
+    Many windows run side by side as segments, like batched_distribution.
+
+    Resampling with replacement adds multinomial noise, which raises every one
+    of these concentration measures: the replicate percentiles sit above the
+    point estimate, often entirely. Intervals are therefore bias-corrected
+    percentile intervals, [q_lo - bias, q_hi - bias] with bias = mean(replicates)
+    - estimate, reported as _bias; _se is the replicate standard deviation.
+
+    Uniforms are a hash of (window seed, replicate, event slot) with the slots
+    of a window ordered by vertex label, so a window's intervals are the same
+    per window or in any batch, and with any chunking.
+
+    Keys: {prefix}_{gini,hhi,top1_share,top5_share,top10_share,max_share}_{ci_lo,ci_hi,se,bias}.
+    """
 
+    STATS = ("ci_lo", "ci_hi", "se", "bias")
+
+    def __init__(self, replicates: int, level: float = 0.95, seed: int = 42, max_cells: int = 4_000_000,
+                 tops=DIST_TOPS):
+        self.replicates = int(replicates)
+        self.level = float(level)
+        self.seed = int(seed)
+        self.max_cells = int(max_cells)
+        self.tops = tuple(tops)
+        self.metrics = ["gini", "hhi"] + [f"{name}_share" for name, _ in self.tops] + ["max_share"]
+
+    @classmethod
+    def from_args(cls, args):
+        """None when --bootstrap is off."""
+        return cls(args.bootstrap, args.bootstrap_level, args.sample_seed) if args.bootstrap > 0 else None
+
+    def info(self) -> Dict[str, Any]:
+        return {"bootstrap_replicates": self.replicates, "bootstrap_level": self.level}
+
+    def window_seed(self, company: str, window_id: str) -> int:
+        """Per-window seed: --sample-seed mixed with a hash of company / window_id."""
+        h = hashlib.blake2b(f"{company}/{window_id}".encode(), digest_size=8).digest()
+        return (int.from_bytes(h, "little") ^ self.seed) & ((1 << 63) - 1)
+
+    @staticmethod
+    def uniforms(seeds, rep, slot):
+        """(len(rep) x len(slot)) uniforms in [0, 1): splitmix64 of (replicate, slot) keyed by each slot's seed."""
+        xp = _xp_of(seeds)
+        h = splitmix64((rep.astype("uint64")[:, None] << xp.uint64(32)) | slot.astype("uint64")[None, :])
+        h = splitmix64(h ^ seeds[None, :])
+        return (h >> xp.uint64(11)).astype("float64") * (1.0 / (1 << 53))
+
+    def _metrics(self, x, rank, voff, vend, kth, last, n_safe, tot) -> Dict[str, Any]:
+        """Concentration metrics of row-sorted strengths x (rows x V), per row and segment."""
+        xp = _xp_of(x)
+        rows = x.shape[0]
+
+        def seg_sum(m):
+            c = xp.concatenate([xp.zeros((rows, 1)), xp.cumsum(m, axis=1)], axis=1)
+            return c, c[:, vend] - c[:, voff]
+
+        c, _ = seg_sum(x)
+        _, sum_rx = seg_sum(rank * x)
+        _, sum_x2 = seg_sum(x * x)
+        gini = 2.0 * sum_rx / (n_safe * tot) - (n_safe + 1.0) / n_safe
+        out = {"gini": xp.where((gini < 0) & (gini > -1e-12), 0.0, gini), "hhi": sum_x2 / (tot * tot)}
+        for (name, _), k0 in zip(self.tops, kth):
+            out[f"{name}_share"] = (c[:, vend] - c[:, k0]) / tot
+        out["max_share"] = x[:, last] / tot
+        return out
 
-def top_share_cudf(s, frac):
-    s = s.dropna().astype("float64")
-    n = len(s)
-    if n == 0:
-        return float("nan")
-    tot = float(s.sum())
-    if tot <= 0:
-        return 0.0
-    k = max(1, int(math.ceil(frac * n)))
-    return float(s.sort_values(ascending=False).head(k).sum() / tot)
+    def intervals(self, v, w, seg, vseg, seeds) -> pd.DataFrame:
+        """
+        v: vertex per edge (0..V-1, in label order within each segment), w:
+        integer edge weights, seg: segment per edge; vseg: segment per vertex,
+        non-decreasing (each segment's vertices are contiguous); seeds: one seed
+        per segment. Returns a host frame indexed by segment (0..S-1) with the
+        unprefixed {metric}_ci_lo / _ci_hi / _se / _bias columns; NaN for
+        segments without events.
+        """
+        xp = _xp_of(w)
+        w = xp.rint(xp.asarray(w, dtype="float64")).astype("int64")
+        v = xp.asarray(v, dtype="int64")
+        seg = xp.asarray(seg, dtype="int64")
+        vseg = xp.asarray(vseg, dtype="int64")
+        order = xp.lexsort(xp.stack([v, seg]))  # event slots by (segment, vertex): independent of edge order
+        v, w, seg = v[order], w[order], seg[order]
+
+        V = int(vseg.shape[0])
+        S = int(vseg[-1]) + 1 if V else 0
+        cols = [f"{m}_{s}" for m in self.metrics for s in self.STATS]
+        ev_v = expand_counts(v, w).astype("int32")  # one slot per event, grouped by segment
+        T = int(ev_v.shape[0])
+        if S == 0 or T == 0:
+            return pd.DataFrame(index=pd.RangeIndex(S), columns=cols, dtype="float64")
+
+        n_ev = xp.bincount(seg, weights=w.astype("float64"), minlength=S)[:S]
+        ev_off = xp.cumsum(n_ev) - n_ev
+        slot_seg = expand_counts(xp.arange(S), n_ev.astype("int64"))
+        slot_off = ev_off[slot_seg].astype("int64")
+        slot_n = n_ev[slot_seg]
+        slot_j = xp.arange(T, dtype="int64") - slot_off  # slot index within its segment
+        slot_seed = xp.asarray(seeds, dtype="uint64")[slot_seg]
+
+        nv = xp.bincount(vseg, minlength=S)[:S]
+        voff = xp.cumsum(nv) - nv
+        vend = voff + nv
+        n_f = nv.astype("float64")
+        shape = dict(
+            rank=(xp.arange(V) - voff[vseg] + 1).astype("float64"), voff=voff, vend=vend,
+            kth=[vend - xp.minimum(xp.maximum(xp.ceil(frac * n_f), 1.0).astype("int64"), nv) for _, frac in self.tops],
+            last=xp.maximum(vend - 1, 0))
+        span = int(n_ev.max()) + 1
+        seg_key = vseg * span  # row sort keeps each segment's block in place
+        ok = (n_ev > 0) & (nv > 0)
+        shape["tot"] = xp.where(ok, n_ev, 1.0)
+        shape["n_safe"] = xp.where(ok, n_f, 1.0)
+
+        x0 = xp.bincount(v, weights=w.astype("float64"), minlength=V)[None, :]
+        est = self._metrics(xp.sort(x0 + seg_key, axis=1) - seg_key, **shape)
+
+        reps: Dict[str, list] = {m: [] for m in self.metrics}
+        b = max(1, min(self.replicates, self.max_cells // max(T, V)))
+        for lo in range(0, self.replicates, b):
+            bb = min(b, self.replicates - lo)
+            u = self.uniforms(slot_seed, xp.arange(lo, lo + bb), slot_j)
+            pick = slot_off + xp.minimum((u * slot_n).astype("int64"), (slot_n - 1).astype("int64"))
+            cell = ev_v[pick] + (xp.arange(bb, dtype="int32") * V)[:, None]  # bb * V <= max_cells
+            x = xp.bincount(cell.ravel(), minlength=bb * V).reshape(bb, V)
+            x = (xp.sort(x + seg_key, axis=1) - seg_key).astype("float64")
+            for m, r in self._metrics(x, **shape).items():
+                reps[m].append(r)
+
+        R = xp.stack([xp.concatenate(reps[m], axis=0) for m in self.metrics])  # metrics x replicates x segments
+        R = xp.where(ok[None, None, :], R, xp.nan)
+        E = xp.stack([est[m][0] for m in self.metrics])  # metrics x segments
+        alpha = (1.0 - self.level) / 2.0
+        q = xp.quantile(R, xp.asarray([alpha, 1.0 - alpha]), axis=1)
+        bias = R.mean(axis=1) - E
+        se = R.std(axis=1, ddof=1) if self.replicates > 1 else xp.full(E.shape, xp.nan)
+        host = xp.stack([q[0] - bias, q[1] - bias, se, bias], axis=1)  # metrics x STATS x segments
+        host = host if xp is np else host.get()
+        return pd.DataFrame(host.reshape(len(cols), S).T, columns=cols)
+
+    def window(self, wg, prefix: str, seed: int) -> Dict[str, float]:
+        """In-strength intervals of one WindowGraph (seed from window_seed)."""
+        if wg.n_edges == 0:
+            return {}
+        order = cp.asarray(wg.labels.argsort().values)
+        rank = cp.empty(wg.n_nodes, dtype="int64")
+        rank[order] = cp.arange(wg.n_nodes)
+        row = self.intervals(rank[wg.dst], wg.weight, cp.zeros(wg.n_edges, dtype="int64"),
+                             cp.zeros(wg.n_nodes, dtype="int64"), [seed]).iloc[0]
+        return {f"{prefix}_{k}": float(v) for k, v in row.items()}
+
+    def segments(self, edges, nodes, prefix: str, seeds) -> pd.DataFrame:
+        """
+        Batched path: in-strength intervals per seg from a label-space edge list
+        (seg, src, dst, weight) and its vertex set `nodes` (seg, v); seeds[seg]
+        from window_seed, so each window gets the same draws as per window.
+        """
+        verts = nodes[["seg", "v"]].sort_values(["seg", "v"]).reset_index(drop=True)
+        verts["vi"] = cp.arange(len(verts))
+        e = edges[["seg", "dst", "weight"]].rename(columns={"dst": "v"}).merge(verts, on=["seg", "v"], how="left")
+        out = self.intervals(e["vi"].values, e["weight"].values, e["seg"].values, verts["seg"].values, seeds)
+        return out.add_prefix(prefix + "_")
 
 
-def quantiles_cudf(s, qs=(0.25, 0.5, 0.75, 0.9, 0.95, 0.99)):
-    s = s.dropna().astype("float64")
-    if len(s) == 0:
-        return {f"q{int(q*100)}": float("nan") for q in qs}
-    qv = s.quantile(list(qs))
-    return {f"q{int(q*100)}": safe_float(qv.loc[q]) for q in qs}
+# ----------------------------
+# I/O: parquet footers / partition catalog
+# ----------------------------
+def _ts_ns(x) -> Optional[int]:
+    try:
+        return int(pd.Timestamp(x).value)
+    except Exception:
+        return None
 
 
-def stats_pack_cudf(s, prefix):
-    s = s.dropna().astype("float64")
-    out = {
-        f"{prefix}_mean": safe_float(s.mean()) if len(s) else float("nan"),
-        f"{prefix}_std": safe_float(s.std()) if len(s) > 1 else float("nan"),
-        f"{prefix}_min": safe_float(s.min()) if len(s) else float("nan"),
-        f"{prefix}_max": safe_float(s.max()) if len(s) else float("nan"),
-    }
-    for k, v in quantiles_cudf(s).items():
-        out[f"{prefix}_{k}"] = v
-    return out
+def ts_series_ns(s):
+    """int64 nanoseconds of a datetime column, whatever its stored unit (parquet often holds us/ms)."""
+    return s.astype("datetime64[ns]").astype("int64")
 
 
-def conc_pack_cudf(cudf, s, prefix):
-    s = s.dropna().astype("float64")
-    return {
-        f"{prefix}_gini": gini_cudf(cudf, s),
-        f"{prefix}_hhi": hhi_cudf(s),
-        f"{prefix}_entropy": entropy_share_cudf(s),
-        f"{prefix}_theil": theil_share_cudf(s),
-        f"{prefix}_top1_share": top_share_cudf(s, 0.01),
-        f"{prefix}_top5_share": top_share_cudf(s, 0.05),
-        f"{prefix}_top10_share": top_share_cudf(s, 0.10),
-        f"{prefix}_max_share": top_share_cudf(s, 1.0 / max(1, len(s))),
-    }
+def parquet_file_entry(path, timestamp_col) -> Dict[str, Any]:
+    """
+    Footer summary of one parquet file (pyarrow, CPU only): row count and, per row
+    group, row count, min/max of timestamp_col (int ns, None if no usable
+    statistics) and compressed bytes per column.
+    """
+    import pyarrow.parquet as pq
+
+    md = pq.read_metadata(path)
+    names = [md.schema.column(j).name for j in range(md.num_columns)]
+    ts_j = names.index(timestamp_col) if timestamp_col in names else None
+
+    rgs = []
+    for i in range(md.num_row_groups):
+        rg = md.row_group(i)
+        ts_min = ts_max = None
+        st = rg.column(ts_j).statistics if ts_j is not None else None
+        if st is not None and st.has_min_max:
+            ts_min, ts_max = _ts_ns(st.min), _ts_ns(st.max)
+        rgs.append({
+            "num_rows": int(rg.num_rows),
+            "ts_min": ts_min,
+            "ts_max": ts_max,
+            "col_bytes": {names[j]: int(rg.column(j).total_compressed_size) for j in range(rg.num_columns)},
+        })
+    return {"num_rows": int(md.num_rows), "row_groups": rgs}
+
+
+def plan_row_groups(entries, columns, start_ts, end_ts) -> Dict[str, Any]:
+    """
+    Row-group pushdown plan over (path, file_entry) pairs.
+
+    A row group is kept unless its min/max timestamps prove it lies entirely
+    outside [start_ts, end_ts]; row groups without statistics are always kept.
+    bytes_read covers the projected columns of the kept row groups, bytes_skipped
+    everything else in the listed files (compressed sizes). est_rows is the kept
+    row count scaled by each row group's time overlap with the window.
+    """
+    lo, hi = _ts_ns(start_ts), _ts_ns(end_ts)
+    plan = {"files": [], "row_groups": [], "bytes_read": 0, "bytes_skipped": 0,
+            "row_groups_read": 0, "row_groups_total": 0, "est_rows": 0.0}
+
+    for path, entry in entries:
+        keep = []
+        for i, rg in enumerate(entry["row_groups"]):
+            plan["row_groups_total"] += 1
+            total = sum(rg["col_bytes"].values())
+            mn, mx = rg["ts_min"], rg["ts_max"]
+
+            frac = 1.0
+            if mn is not None and mx is not None and lo is not None and hi is not None:
+                if mx < lo or mn > hi:
+                    plan["bytes_skipped"] += total
+                    continue
+                if mx > mn:
+                    frac = (min(mx, hi) - max(mn, lo)) / float(mx - mn)
+
+            keep.append(i)
+            read = sum(b for c, b in rg["col_bytes"].items() if c in columns)
+            plan["bytes_read"] += read
+            plan["bytes_skipped"] += total - read
+            plan["row_groups_read"] += 1
+            plan["est_rows"] += frac * rg["num_rows"]
+
+        if keep:
+            plan["files"].append(path)
+            plan["row_groups"].append(keep)
+    return plan
+
+
+class PartitionCatalog:
+    """
+    Persistent index of the company=X/year=Y/month=M/*.parquet tree.
+
+    Holds, per file: partition keys, size/mtime (for incremental refresh) and the
+    parquet_file_entry() footer summary. Built once from --parquet-root and saved
+    as JSON; refresh() lists the tree and re-reads footers only for new or changed
+    files. Workers load it and look files up in memory instead of globbing.
+    """
+
+    VERSION = 1
+
+    def __init__(self, parquet_root, timestamp_col):
+        self.parquet_root = os.path.abspath(parquet_root)
+        self.timestamp_col = timestamp_col
+        self.files: Dict[str, Dict[str, Any]] = {}  # relpath -> entry
+        self._index: Dict[Tuple[str, int, int], list] = {}
+
+    # ---- persistence ----
+    @classmethod
+    def load(cls, path, parquet_root, timestamp_col) -> "PartitionCatalog":
+        cat = cls(parquet_root, timestamp_col)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                doc = json.load(f)
+            if (doc.get("version") == cls.VERSION
+                    and doc.get("parquet_root") == cat.parquet_root
+                    and doc.get("timestamp_col") == timestamp_col):
+                cat.files = doc.get("files", {})
+        cat._reindex()
+        return cat
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": self.VERSION,
+                "parquet_root": self.parquet_root,
+                "timestamp_col": self.timestamp_col,
+                "files": self.files,
+            }, f)
+        os.replace(tmp, path)
+
+    # ---- build / refresh ----
+    def refresh(self) -> Dict[str, int]:
+        """List the tree once; re-read footers only for new or changed files."""
+        seen = set()
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        for company, year, month, mdir in self._partition_dirs():
+            for de in os.scandir(mdir):
+                if not (de.is_file() and de.name.endswith(".parquet")):
+                    continue
+                rel = os.path.relpath(de.path, self.parquet_root)
+                seen.add(rel)
+                st = de.stat()
+                old = self.files.get(rel)
+                if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                    stats["unchanged"] += 1
+                    continue
+                entry = parquet_file_entry(de.path, self.timestamp_col)
+                entry.update({"company": company, "year": year, "month": month,
+                              "size": int(st.st_size), "mtime_ns": int(st.st_mtime_ns)})
+                self.files[rel] = entry
+                stats["updated" if old is not None else "added"] += 1
+        for rel in [r for r in self.files if r not in seen]:
+            del self.files[rel]
+            stats["removed"] += 1
+        self._reindex()
+        return stats
+
+    def _partition_dirs(self):
+        def kv(name, key):
+            return name[len(key) + 1:] if name.startswith(key + "=") else None
+
+        for cd in os.scandir(self.parquet_root):
+            company = kv(cd.name, "company") if cd.is_dir() else None
+            if company is None:
+                continue
+            for yd in os.scandir(cd.path):
+                year = kv(yd.name, "year") if yd.is_dir() else None
+                if year is None:
+                    continue
+                for md in os.scandir(yd.path):
+                    month = kv(md.name, "month") if md.is_dir() else None
+                    if month is None:
+                        continue
+                    yield company, int(year), int(month), md.path
+
+    def _reindex(self):
+        self._index = {}
+        for rel, e in self.files.items():
+            self._index.setdefault((e["company"], int(e["year"]), int(e["month"])), []).append(rel)
+        for v in self._index.values():
+            v.sort()
+
+    # ---- lookups ----
+    def entries_for_window(self, company, start_ts, end_ts):
+        """(abs path, entry) pairs for every file in the months the window overlaps."""
+        start_py = pd.Timestamp(start_ts).to_pydatetime()
+        end_py = pd.Timestamp(end_ts).to_pydatetime()
+        out = []
+        for y, m in month_iter(start_py, end_py):
+            for rel in self._index.get((company, y, m), []):
+                out.append((os.path.join(self.parquet_root, rel), self.files[rel]))
+        return out
+
+    def month_paths(self, company, y, m):
+        return [os.path.join(self.parquet_root, rel) for rel in self._index.get((company, y, m), [])]
+
+    def plan(self, company, start_ts, end_ts, columns) -> Dict[str, Any]:
+        return plan_row_groups(self.entries_for_window(company, start_ts, end_ts), columns, start_ts, end_ts)
+
+    def estimate_rows(self, company, start_ts, end_ts) -> float:
+        """Event-count estimate for a window from row-group statistics (no data read)."""
+        return self.plan(company, start_ts, end_ts, columns=())["est_rows"]
+
+
+def open_catalog(args) -> Optional[PartitionCatalog]:
+    """Load (and unless --catalog-mode reuse, refresh and save) the catalog; None if off."""
+    if args.catalog_mode == "off":
+        return None
+    path = args.catalog or os.path.join(args.outroot, "_partition_catalog.json")
+    cat = PartitionCatalog.load(path, args.parquet_root, args.timestamp_col)
+    if args.catalog_mode == "refresh" or not cat.files:
+        stats = cat.refresh()
+        cat.save(path)
+        print(f"Partition catalog {path}: {len(cat.files)} files {stats}")
+    return cat
+
+
+# ----------------------------
+# I/O: decoded month-partition cache (per worker)
+# ----------------------------
+class MonthCache:
+    """
+    Byte-budgeted LRU of decoded (company, year, month) frames (projected columns,
+    all rows of the month). Frames live on the device, or on the host as Arrow
+    tables when location="host" and are moved back to cudf on a hit. The
+    WindowPrefetcher thread and the compute thread share one cache, so lookups,
+    inserts and evictions hold a lock (conversions run outside it).
+    """
+
+    def __init__(self, cudf, budget_bytes, location="device"):
+        self.cudf = cudf
+        self.budget = int(budget_bytes)
+        self.location = location
+        self.items: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self.items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+        df = item[0]
+        if self.location == "host" and hasattr(self.cudf.DataFrame, "from_arrow"):
+            df = self.cudf.DataFrame.from_arrow(df)
+        return df
+
+    def put(self, key, df):
+        if self.location == "host" and hasattr(df, "to_arrow"):
+            df = df.to_arrow()
+            nbytes = int(df.nbytes)
+        else:
+            nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.budget:
+            return
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.items[key] = (df, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.budget and self.items:
+                _, (_, b) = self.items.popitem(last=False)
+                self.bytes -= b
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cache_hits": self.hits, "cache_misses": self.misses, "cache_evictions": self.evictions,
+                    "cache_entries": len(self.items), "cache_bytes": self.bytes}
 
 
 # ----------------------------
 # I/O: read parquet for a window
 # ----------------------------
-def read_window_parquet(cudf, parquet_root, company, start_ts, end_ts, timestamp_col) -> Optional[Any]:
+def decode_parquet(cudf, files, columns, row_groups=None, reader="cudf"):
+    """Decode files (optionally only the given row groups per file) to a cudf frame."""
+    if reader == "pyarrow":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if row_groups is None:
+            tables = [pq.read_table(f, columns=columns) for f in files]
+        else:
+            tables = [pq.ParquetFile(f).read_row_groups(rgs, columns=columns) for f, rgs in zip(files, row_groups)]
+        table = pa.concat_tables(tables)
+        return cudf.DataFrame.from_arrow(table) if hasattr(cudf.DataFrame, "from_arrow") else table.to_pandas()
+    if row_groups is None:
+        return cudf.read_parquet(files, columns=columns)
+    return cudf.read_parquet(files, columns=columns, row_groups=row_groups)
+
+
+def month_files(parquet_root, company, y, m, catalog=None):
+    if catalog is not None:
+        return catalog.month_paths(company, y, m)
+    patt = os.path.join(parquet_root, f"company={company}", f"year={y}", f"month={m}", "*.parquet")
+    return glob.glob(patt)
+
+
+def read_window_parquet(cudf, parquet_root, company, start_ts, end_ts, timestamp_col,
+                        columns=None, reader="cudf", io_stats=None, catalog=None, cache=None) -> Optional[Any]:
+    """
+    Read one company window with projection (only `columns`) and predicate pushdown
+    (row groups outside the window skipped by their timestamp statistics), then
+    filter rows exactly.
+
+    Files and row-group statistics come from `catalog` when given, otherwise from
+    globbing the month directories and reading footers.
+    reader="cudf" decodes the kept row groups on the GPU; reader="pyarrow" decodes
+    on the CPU and hands the Arrow table to cudf (or to pandas if `cudf` is pandas).
+    With a MonthCache, whole months are decoded once and reused by later windows
+    instead of row-group pushdown.
+    io_stats, if given, is filled with bytes/row groups read vs skipped.
+    """
+    columns = list(columns) if columns else None
     start_py = pd.Timestamp(start_ts).to_pydatetime()
     end_py = pd.Timestamp(end_ts).to_pydatetime()
 
-    files = []
-    for y, m in month_iter(start_py, end_py):
-        patt = os.path.join(parquet_root, f"company={company}", f"year={y}", f"month={m}", "*.parquet")
-        files.extend(glob.glob(patt))
+    if cache is not None and columns:
+        frames, hits, misses = [], 0, 0
+        for y, m in month_iter(start_py, end_py):
+            key = (company, y, m)
+            dfm = cache.get(key)
+            if dfm is None:
+                files_m = month_files(parquet_root, company, y, m, catalog)
+                if not files_m:
+                    continue
+                misses += 1
+                dfm = decode_parquet(cudf, files_m, columns, reader=reader)
+                cache.put(key, dfm)
+            else:
+                hits += 1
+            frames.append(dfm)
+        if io_stats is not None:
+            io_stats.update({"io_cache_hits": hits, "io_cache_misses": misses})
+        if not frames:
+            return None
+        df = frames[0] if len(frames) == 1 else cudf.concat(frames, ignore_index=True)
+        return df[(df[timestamp_col] >= start_ts) & (df[timestamp_col] <= end_ts)]
+
+    if catalog is not None:
+        plan = catalog.plan(company, start_ts, end_ts, columns or [])
+        files = plan["files"]
+    else:
+        files = []
+        for y, m in month_iter(start_py, end_py):
+            files.extend(month_files(parquet_root, company, y, m))
+        plan = None
+        if files and columns:
+            entries = [(f, parquet_file_entry(f, timestamp_col)) for f in files]
+            plan = plan_row_groups(entries, columns, start_ts, end_ts)
+            files = plan["files"]
+
+    if io_stats is not None and plan is not None:
+        io_stats.update({f"io_{k}": plan[k] for k in ("bytes_read", "bytes_skipped", "row_groups_read", "row_groups_total")})
     if not files:
         return None
 
-    df = cudf.read_parquet(files)
+    if plan is None:
+        df = cudf.read_parquet(files)
+    else:
+        df = decode_parquet(cudf, plan["files"], columns, plan["row_groups"], reader)
+
     df = df[(df[timestamp_col] >= start_ts) & (df[timestamp_col] <= end_ts)]
     return df
 
 
-def floor_ts_cudf(ts, diff_bin):
-    """
-    Floor a cuDF datetime64[ns] Series to a multiple of diff_bin like '10m', '5h', '1d'.
-    Fully GPU-compatible and avoids TypeErrors from datetime64 + TimeDeltaColumn.
+def window_read_plan(parquet_root, company, start_ts, end_ts, timestamp_col, columns, catalog=None):
+    """Row-group plan of one window (plan_row_groups), from the catalog or the month footers; None without files."""
+    if catalog is not None:
+        return catalog.plan(company, start_ts, end_ts, columns)
+    files = []
+    for y, m in month_iter(pd.Timestamp(start_ts).to_pydatetime(), pd.Timestamp(end_ts).to_pydatetime()):
+        files.extend(month_files(parquet_root, company, y, m))
+    if not files:
+        return None
+    return plan_row_groups([(f, parquet_file_entry(f, timestamp_col)) for f in files], columns, start_ts, end_ts)
 
-    Parameters:
-        ts (cudf.Series): datetime64[ns] Series
-        diff_bin (str): e.g., '10m', '5h', '1d'
 
-    Returns:
-        cudf.Series: floored datetime64[ns] Series
+def iter_window_row_groups(cudf, args, company, start_ts, end_ts, catalog=None, io_stats=None):
     """
-    if not isinstance(ts, cudf.Series):
-        raise TypeError("ts must be a cudf.Series of datetime64[ns]")
+    Stream one window as src / dst / ts frames, one kept row group at a time
+    (same projection and pushdown as read_window_parquet), so memory is bounded
+    by the largest row group rather than by the window.
+    """
+    columns = [args.src_col, args.dst_col, args.timestamp_col]
+    plan = window_read_plan(args.parquet_root, company, start_ts, end_ts, args.timestamp_col, columns, catalog)
+    if plan is None:
+        return
+    if io_stats is not None:
+        io_stats.update({f"io_{k}": plan[k] for k in ("bytes_read", "bytes_skipped", "row_groups_read", "row_groups_total")})
+    for path, rgs in zip(plan["files"], plan["row_groups"]):
+        for rg in rgs:
+            df = decode_parquet(cudf, [path], columns, [[rg]], args.reader)
+            df = df[(df[args.timestamp_col] >= start_ts) & (df[args.timestamp_col] <= end_ts)]
+            if len(df):
+                yield df.rename(columns={args.src_col: "src", args.dst_col: "dst", args.timestamp_col: "ts"})
+
+
+# ----------------------------
+# User-id dictionary (csv_to_parquet.py: screen name <-> int32 id)
+# ----------------------------
+_USER_NAMES: Dict[str, Any] = {}
+
+
+def user_names(cudf, path):
+    """Screen names indexed by user id (the id is the dictionary row), read once per process."""
+    if path not in _USER_NAMES:
+        _USER_NAMES[path] = cudf.read_parquet(path, columns=["screen_name"])["screen_name"]
+    return _USER_NAMES[path]
 
-    # Parse diff_bin
-    m = re.match(r"(\d+)([smhdSMHD])", diff_bin)
-    if m is None:
-        raise ValueError(f"Invalid diff_bin: {diff_bin}")
 
-    n, unit = int(m.group(1)), m.group(2).lower()
-    unit_seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# ----------------------------
+# Time binning (int64 nanoseconds, several resolutions)
+# ----------------------------
+_BIN_RE = re.compile(r"^\s*(\d+)\s*([smhdSMHD])\s*$")
+_BIN_UNIT_S = {"s": 1, "m": 60, "h": 3600, "d": 86400}
 
-    if unit not in unit_seconds:
-        raise ValueError(f"Unsupported unit in diff_bin: {unit}")
 
-    delta_sec = n * unit_seconds[unit]
+def diff_bin_ns(diff_bin: str) -> int:
+    """
+    Bin width in nanoseconds. Accepts the short forms used so far ('10m', '5h',
+    '1d', 'M' meaning minutes) and anything pandas reads as a Timedelta
+    ('10min', '90s', '1h30min', '500ms').
+    """
+    m = _BIN_RE.match(str(diff_bin))
+    if m is not None:
+        ns = int(m.group(1)) * _BIN_UNIT_S[m.group(2).lower()] * 1_000_000_000
+    else:
+        try:
+            ns = int(pd.Timedelta(str(diff_bin).strip()).value)
+        except ValueError:
+            raise ValueError(f"Invalid diff_bin: {diff_bin}")
+    if ns <= 0:
+        raise ValueError(f"diff_bin must be positive: {diff_bin}")
+    return ns
 
-    # Use cuDF datetime Series as origin (min timestamp)
-    t0_series = cudf.Series([ts.min()] * len(ts))
 
-    # Difference in seconds from t0
-    ts_diff_sec = (ts - t0_series).astype("timedelta64[s]").astype("int64")
+def bin_widths_ns(spec: str) -> List[int]:
+    """Comma-separated resolutions ('10m,1h,1d') -> widths in ns, finest first, duplicates dropped."""
+    return sorted({diff_bin_ns(x) for x in str(spec).split(",") if x.strip()})
 
-    # Floor to nearest multiple of delta_sec
-    ts_floored_sec = (ts_diff_sec // delta_sec) * delta_sec
 
-    # Convert back to timedelta64[ns] Series and add t0_series
-    ts_floored = t0_series + cudf.Series(ts_floored_sec * 1_000_000_000, dtype="timedelta64[ns]")
+def bin_codes(ts_ns, width_ns: int, origin_ns=None):
+    """
+    Integer bin code (ts - origin) // width of int64-ns timestamps (Series or
+    array; cuDF/cupy stay on the device). origin defaults to the minimum, and
+    may be a per-row Series (e.g. each segment's first event). Bin b starts at
+    origin + b * width.
+    """
+    if origin_ns is None:
+        origin_ns = ts_ns.min()
+    return (ts_ns - origin_ns) // int(width_ns)
 
-    return ts_floored
 
-def floor_cudf_series(ts, diff_bin):
+def multi_bin_codes(ts_ns, widths_ns, origin_ns=None) -> Dict[int, Any]:
     """
-    Floor a cuDF datetime Series to a multiple of diff_bin like '10m', '5h', '1d'.
+    bin_codes at several widths from one subtraction: a width that is a multiple
+    of a finer one is derived from the finer codes by integer division.
+    Returns {width_ns: codes}.
     """
-    if not isinstance(ts, cudf.Series):
-        raise TypeError("ts must be a cudf.Series")
+    if origin_ns is None:
+        origin_ns = ts_ns.min()
+    rel = ts_ns - origin_ns
+    out: Dict[int, Any] = {}
+    for w in sorted(int(w) for w in widths_ns):
+        finer = [f for f in out if w % f == 0]
+        if finer:
+            f = max(finer)
+            out[w] = out[f] // (w // f)
+        else:
+            out[w] = rel // w
+    return out
+
+
+# ----------------------------
+# Adoption curves (first appearance of sources, targets and nodes)
+# ----------------------------
+ADOPTION_ROLES = ("nodes", "src", "dst")
 
-    # Parse diff_bin
-    m = re.match(r"(\d+)([smhdSMHD])", diff_bin)
-    if not m:
-        raise ValueError(f"Invalid diff_bin: {diff_bin}")
 
-    n, unit = int(m.group(1)), m.group(2).lower()
-    unit_seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}
-    if unit not in unit_seconds:
-        raise ValueError(f"Unsupported unit in diff_bin: {unit}")
+def adoption_first_times(cudf, ev, keys=()):
+    """
+    First-appearance time of every id as a source, as a target and as any node.
+    ev has src, dst, ts (int64 ns) plus any `keys` (e.g. seg). One groupby over the
+    stacked (id, role) table gives the per-role minima; the node union is the
+    minimum over the (at most 2 per id) role rows. Returns {role: frame of keys + ts}.
+    """
+    keys = list(keys)
+    s = ev[keys + ["src", "ts"]].rename(columns={"src": "id"})
+    s["role"] = 0
+    d = ev[keys + ["dst", "ts"]].rename(columns={"dst": "id"})
+    d["role"] = 1
+    first = cudf.concat([s, d], ignore_index=True).groupby(keys + ["id", "role"])["ts"].min().reset_index()
+    return {
+        "src": first[first["role"] == 0][keys + ["ts"]],
+        "dst": first[first["role"] == 1][keys + ["ts"]],
+        "nodes": first.groupby(keys + ["id"])["ts"].min().reset_index()[keys + ["ts"]],
+    }
 
-    delta_sec = n * unit_seconds[unit]
 
-    # Use a series for the min timestamp as base
-    t0_series = cudf.Series([ts.min()] * len(ts))
+def adoption_curves(cudf, ev, width_ns: int, t0_ns: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Cumulative adoption step curves of one window: for each role in
+    ADOPTION_ROLES, (bin codes where new ids appear, cumulative distinct ids
+    up to and including that bin) as host int64 arrays.
+    """
+    curves = {}
+    for role, first in adoption_first_times(cudf, ev).items():
+        cnt = _to_host(bin_codes(first["ts"], width_ns, t0_ns).value_counts()).sort_index()
+        curves[role] = (cnt.index.to_numpy(dtype="int64"), cnt.to_numpy(dtype="int64").cumsum())
+    return curves
 
-    # Difference from base in seconds
-    ts_diff_sec = (ts - t0_series).astype("timedelta64[s]").astype("int64")
 
-    # Floor
-    ts_floored_sec = (ts_diff_sec // delta_sec) * delta_sec
+def curve_time_at(curve, frac: float) -> Optional[int]:
+    """First bin whose cumulative count reaches frac of the final count (None for an empty curve)."""
+    bins, cum = curve
+    if len(cum) == 0 or cum[-1] <= 0:
+        return None
+    return int(bins[int(np.searchsorted(cum, frac * cum[-1], side="left"))])
 
-    # Convert back to timedelta64[ns] and add base
-    ts_floored = t0_series + cudf.Series(ts_floored_sec * 1_000_000_000, dtype="timedelta64[ns]")
 
-    return ts_floored
+def save_adoption_curves(path, curves, width_ns: int, t0_ns: int):
+    """Compact per-window export for plotting: int32 bin codes and counts per curve, plus bin width and origin."""
+    arrays = {"bin_ns": np.int64(width_ns), "t0_ns": np.int64(t0_ns)}
+    for role, (bins, cum) in curves.items():
+        arrays[f"{role}_bin"] = bins.astype("int32")
+        arrays[f"{role}_cum"] = cum.astype("int32")
+    np.savez_compressed(path, **arrays)
 
 
 # ----------------------------
 # Diffusion / timing metrics
 # ----------------------------
-def diffusion_metrics(cudf, events, diff_bin: str, growth_window_hours: float) -> Dict[str, Any]:
+PROFILE_METRICS = ("peak_share", "time_to_peak_hours", "post_peak_half_life_hours", "early_log_cum_events_slope")
+
+
+def profile_bins(spec: str) -> List[Tuple[str, int]]:
+    """--profile-bins '1min,10min,1H' -> [(column suffix, width ns)], e.g. ('10min', 600e9)."""
+    out = []
+    for x in str(spec).split(","):
+        if x.strip():
+            out.append((re.sub(r"[^0-9A-Za-z]+", "", x.strip()), diff_bin_ns(x)))
+    return out
+
+
+class DiffusionProfile:
+    """
+    One window's event counts at a fine resolution, kept sparse as the
+    non-empty fine bins (codes from the first event) and their cumulative
+    counts. Peak share, time to peak, post-peak half-life and the early
+    log-cumulative growth slope at any multiple of the fine width are derived
+    from that prefix-sum array alone: a coarse bin's count is the difference
+    of the cumulative counts at its boundaries, so nothing is re-sorted or
+    re-grouped.
+    """
+
+    def __init__(self, fine_bins, fine_counts, fine_ns: int):
+        self.fine_ns = int(fine_ns)
+        self.bins = np.asarray(fine_bins, dtype="int64")
+        self.cum = np.cumsum(np.asarray(fine_counts, dtype="int64"))
+        self.total = int(self.cum[-1]) if len(self.cum) else 0
+
+    @classmethod
+    def from_codes(cls, codes, fine_ns: int):
+        """codes: fine bin codes of the window's events (Series, any order)."""
+        vc = _to_host(codes.value_counts()).sort_index()
+        return cls(vc.index.to_numpy(), vc.to_numpy(), fine_ns)
+
+    def counts_at(self, width_ns: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(non-empty bin codes, counts) at width_ns, which must be a multiple of the fine width."""
+        r, rem = divmod(int(width_ns), self.fine_ns)
+        if r < 1 or rem:
+            raise ValueError(f"width {width_ns}ns is not a multiple of the fine bin {self.fine_ns}ns")
+        coarse = self.bins // r
+        last = np.r_[np.flatnonzero(np.diff(coarse)), len(coarse) - 1]
+        end = self.cum[last]
+        return coarse[last], np.diff(end, prepend=0)
+
+    def metrics_at(self, width_ns: int, growth_window_hours: float) -> Dict[str, float]:
+        H = 3600.0 * 1e9
+        nan = float("nan")
+        if self.total == 0:
+            return {"peak_share": nan, "time_to_peak_hours": nan,
+                    "post_peak_half_life_hours": nan, "early_log_cum_events_slope": nan}
+        bins, counts = self.counts_at(width_ns)
+        ip = int(np.argmax(counts))  # earliest bin with the maximum count
+        peak_b, peak_n = int(bins[ip]), int(counts[ip])
+        out = {"peak_share": peak_n / self.total, "time_to_peak_hours": peak_b * width_ns / H}
+
+        # post-peak half-life: first non-empty bin after the peak with count <= half the peak
+        hit = np.flatnonzero(counts[ip + 1:] <= 0.5 * peak_n)
+        out["post_peak_half_life_hours"] = (int(bins[ip + 1 + hit[0]]) - peak_b) * width_ns / H if len(hit) else nan
+
+        # early growth: slope of log(cum events) vs hours over the first growth_window_hours
+        x = bins * (width_ns / H)
+        keep = x <= float(growth_window_hours)
+        x, y = x[keep], np.log(np.cumsum(counts)[keep].astype("float64"))
+        slope = nan
+        if len(x) >= 3:
+            xmu, ymu = x.mean(), y.mean()
+            var = float(((x - xmu) ** 2).mean())
+            if var > 0:
+                slope = float(((x - xmu) * (y - ymu)).mean() / var)
+        out["early_log_cum_events_slope"] = slope
+        return out
+
+
+def diffusion_metrics(cudf, events, diff_bin: str, growth_window_hours: float, curves=None,
+                      profile=()) -> Dict[str, Any]:
     """
     events columns: src, dst, ts
     Computes:
       - time to reach 10/50/90% of: events, unique nodes, unique sources, unique targets
       - peak timing and post-peak half-life based on binned event counts
       - early growth rate (log cumulative events slope) in first X hours
+      - the peak / half-life / growth measures again, plus peak_share, at each
+        (suffix, width) of `profile`, as <metric>_<suffix>
+    If `curves` is a dict it receives the cumulative curves (events and
+    ADOPTION_ROLES, see adoption_curves) plus bin_ns / t0_ns, for export.
     """
     out = {}
     if len(events) == 0:
-        return {k: float("nan") for k in [
+        out = {k: float("nan") for k in [
             "t10_hours","t50_hours","t90_hours",
             "nodes_t10_hours","nodes_t50_hours","nodes_t90_hours",
             "src_t10_hours","src_t50_hours","src_t90_hours",
             "dst_t10_hours","dst_t50_hours","dst_t90_hours",
             "time_to_peak_hours","post_peak_half_life_hours","early_log_cum_events_slope"
         ]}
+        for suffix, _ in profile:
+            out.update({f"{k}_{suffix}": float("nan") for k in PROFILE_METRICS})
+        return out
 
-    ev = events.sort_values("ts")
-    t0 = ev["ts"].iloc[0]
-    total_events = len(ev)
+    H = 3600.0 * 1e9
+    width = diff_bin_ns(diff_bin)
+    ev = events[["src", "dst", "ts"]].copy()
+    ev["ts"] = ts_series_ns(ev["ts"])
+    ev = ev.sort_values("ts")
+    t0 = int(ev["ts"].iloc[0])
 
     # helper: time to reach fraction of cumulative series
     def time_to_frac(ts_series, frac):
         k = max(1, int(math.ceil(frac * len(ts_series))))
-        return ts_series.iloc[k-1]
+        return int(ts_series.iloc[k-1])
 
     # event t10/t50/t90
-    t10 = time_to_frac(ev["ts"], 0.10)
-    t50 = time_to_frac(ev["ts"], 0.50)
-    t90 = time_to_frac(ev["ts"], 0.90)
-
-    # FIX: replace .total_seconds() with numpy timedelta division
-    out["t10_hours"] = float((t10 - t0) / np.timedelta64(1, 's') / 3600.0)
-    out["t50_hours"] = float((t50 - t0) / np.timedelta64(1, 's') / 3600.0)
-    out["t90_hours"] = float((t90 - t0) / np.timedelta64(1, 's') / 3600.0)
-
-    # binned event counts
-    tmp = ev[["src","dst","ts"]].copy()
-    tmp["bin"] = floor_ts_cudf(tmp["ts"], diff_bin)
-    binc = tmp.groupby("bin").size().reset_index().rename(columns={0:"n_events"})
-
-    # peak timing
-    peak_row = binc.sort_values("n_events", ascending=False).head(1)
-    peak_t = peak_row["bin"].iloc[0]
-    peak_n = int(peak_row["n_events"].iloc[0])
-    out["time_to_peak_hours"] = float((peak_t - t0) / np.timedelta64(1, 's') / 3600.0)
-
-    # post-peak half-life: first bin after peak where count <= half peak
-    half = 0.5 * peak_n
-    after = binc[binc["bin"] > peak_t].sort_values("bin")
-    if len(after) == 0:
-        out["post_peak_half_life_hours"] = float("nan")
-    else:
-        hit = after[after["n_events"] <= half]
-        if len(hit) == 0:
-            out["post_peak_half_life_hours"] = float("nan")
-        else:
-            t_half = hit["bin"].iloc[0]
-            out["post_peak_half_life_hours"] = float((t_half - peak_t) / np.timedelta64(1, 's') / 3600.0)
+    out["t10_hours"] = (time_to_frac(ev["ts"], 0.10) - t0) / H
+    out["t50_hours"] = (time_to_frac(ev["ts"], 0.50) - t0) / H
+    out["t90_hours"] = (time_to_frac(ev["ts"], 0.90) - t0) / H
+
+    # binned event counts: one fine cumulative count array (the gcd of all
+    # requested widths), from which every resolution is derived
+    fine = math.gcd(width, *[w for _, w in profile])
+    prof = DiffusionProfile.from_codes(bin_codes(ev["ts"], fine, t0), fine)
+    base = prof.metrics_at(width, growth_window_hours)
+    for k in ("time_to_peak_hours", "post_peak_half_life_hours", "early_log_cum_events_slope"):
+        out[k] = base[k]
+    for suffix, w in profile:
+        out.update({f"{k}_{suffix}": v for k, v in prof.metrics_at(w, growth_window_hours).items()})
 
     # adoption curves: unique nodes, unique sources, unique targets over bins
-    # compute cumulative unique counts per bin by taking first appearance time per id
-    def first_time(series_id, series_ts):
-        g = cudf.DataFrame({"id": series_id, "ts": series_ts})
-        g = g.sort_values("ts")
-        first = g.groupby("id")["ts"].min().reset_index()
-        return first
-
-    src_first = first_time(ev["src"], ev["ts"])
-    dst_first = first_time(ev["dst"], ev["ts"])
-
-    # nodes = union(src,dst)
-    all_ids = cudf.concat([ev["src"], ev["dst"]], ignore_index=True)
-    all_ts = cudf.concat([ev["ts"], ev["ts"]], ignore_index=True)
-    node_first = first_time(all_ids, all_ts)
-
-    def times_for_first(first_df, prefix):
-        first_df["bin"] = floor_cudf_series(first_df["ts"], diff_bin)
-        cnt = first_df.groupby("bin").size().reset_index().rename(columns={0:"n_new"})
-        cnt = cnt.sort_values("bin")
-        cnt["cum"] = cnt["n_new"].cumsum()
-        total = int(cnt["cum"].max()) if len(cnt) else 0
-        if total <= 0:
-            out[f"{prefix}_t10_hours"] = float("nan")
-            out[f"{prefix}_t50_hours"] = float("nan")
-            out[f"{prefix}_t90_hours"] = float("nan")
-            return
-        def t_at(frac):
-            target = frac * total
-            hit = cnt[cnt["cum"] >= target].head(1)
-            t = hit["bin"].iloc[0]
-            return float((t - t0) / np.timedelta64(1, 's') / 3600.0)
-        out[f"{prefix}_t10_hours"] = t_at(0.10)
-        out[f"{prefix}_t50_hours"] = t_at(0.50)
-        out[f"{prefix}_t90_hours"] = t_at(0.90)
-
-    times_for_first(node_first, "nodes")
-    times_for_first(src_first, "src")
-    times_for_first(dst_first, "dst")
-
-    # early growth rate: slope of log(cum events) vs time (hours) in first growth_window_hours
-    try:
-        bw = binc.sort_values("bin")
-        # FIX: replace .total_seconds()
-        bw["t_hours"] = (bw["bin"] - t0) / np.timedelta64(1, 's') / 3600.0
-        bw = bw[bw["t_hours"] <= float(growth_window_hours)]
-        if len(bw) < 3:
-            out["early_log_cum_events_slope"] = float("nan")
-        else:
-            bw["cum"] = bw["n_events"].cumsum().astype("float64")
-            bw = bw[bw["cum"] > 0]
-            if len(bw) < 3:
-                out["early_log_cum_events_slope"] = float("nan")
-            else:
-                y = cp.log(bw["cum"]).astype("float64")
-                x = bw["t_hours"].astype("float64")
-                xmu = float(x.mean()); ymu = float(y.mean())
-                cov = float(((x - xmu) * (y - ymu)).mean())
-                var = float(((x - xmu) * (x - xmu)).mean())
-                out["early_log_cum_events_slope"] = float(cov / var) if var > 0 else float("nan")
-    except Exception:
-        out["early_log_cum_events_slope"] = float("nan")
+    adoption = adoption_curves(cudf, ev, width, t0)
+    for role in ADOPTION_ROLES:
+        for frac, name in ((0.10, "t10"), (0.50, "t50"), (0.90, "t90")):
+            b = curve_time_at(adoption[role], frac)
+            out[f"{role}_{name}_hours"] = float("nan") if b is None else b * width / H
+    if curves is not None:
+        bins, counts = prof.counts_at(width)
+        curves["events"] = (bins, counts.cumsum())
+        curves.update(adoption)
+        curves["bin_ns"], curves["t0_ns"] = width, t0
 
     return out
 
@@ -421,8 +1269,100 @@ def diffusion_metrics(cudf, events, diff_bin: str, growth_window_hours: float) -
 # ----------------------------
 # Network construction helpers
 # ----------------------------
-def build_weighted_edges(events, drop_self_loops: bool):
-    edges = events.groupby(["src", "dst"]).size().reset_index().rename(columns={0: "weight"})
+def pack_edge_keys(src, dst):
+    """One uint64 key per edge: src in the high 32 bits, dst in the low 32 (non-negative int32 ids)."""
+    xp = _xp_of(src)
+    return (src.astype(xp.uint64) << xp.uint64(32)) | dst.astype(xp.uint64)
+
+
+def unpack_edge_keys(keys):
+    xp = _xp_of(keys)
+    return (keys >> xp.uint64(32)).astype("int32"), (keys & xp.uint64(0xFFFFFFFF)).astype("int32")
+
+
+def splitmix64(x):
+    """splitmix64 finalizer of a uint64 array: a well-mixed 64-bit hash per value."""
+    xp = _xp_of(x)
+    x = (x ^ (x >> xp.uint64(30))) * xp.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> xp.uint64(27))) * xp.uint64(0x94D049BB133111EB)
+    return x ^ (x >> xp.uint64(31))
+
+
+def hash_labels(s):
+    """
+    64-bit hash per label (Series): splitmix64 of integer ids, cuDF's xxhash64 for
+    other labels on the GPU, pandas' hash_pandas_object on the CPU. (cuDF's default
+    murmur3 is only 32 bits wide, which would cap HLL/Count-Min at 2^32 keys.)
+    """
+    if str(s.dtype).startswith("int"):
+        x = cp.asarray(s.values).astype("uint64")
+        return splitmix64(x + _xp_of(x).uint64(0x9E3779B97F4A7C15))  # the increment keeps id 0 off hash 0
+    if hasattr(s, "hash_values"):
+        return cp.asarray(s.hash_values(method="xxhash64").values).astype("uint64")
+    return pd.util.hash_pandas_object(s, index=False).values
+
+
+def mutual_edge_mask(keys):
+    """
+    True where the reverse of an edge is also present. keys must be unique; the
+    reversed keys (halves swapped) are looked up in one sorted copy with
+    searchsorted, so no join is built.
+    """
+    xp = _xp_of(keys)
+    if len(keys) == 0:
+        return xp.zeros(0, dtype=bool)
+    rev = (keys << xp.uint64(32)) | (keys >> xp.uint64(32))
+    s = xp.sort(keys)
+    pos = xp.minimum(xp.searchsorted(s, rev), len(s) - 1)
+    return s[pos] == rev
+
+
+def build_weighted_edges(cudf, events, drop_self_loops: bool):
+    """
+    (src, dst) -> weight table of a window, aggregated on packed uint64 keys
+    (one sort + unique) instead of a two-column groupby. Integer user ids in
+    [0, 2^31) are packed as they are; other labels (including larger integer ids,
+    e.g. raw Twitter ids) are factorized (sorted) to int32 codes first.
+    Self-loops (equal key halves) are counted and dropped on the keys, before
+    labels are gathered back. Rows come out sorted by (src, dst) id.
+    """
+    src, dst = events["src"], events["dst"]
+    if (str(src.dtype).startswith("int") and str(dst.dtype).startswith("int") and len(src)
+            and min(int(src.min()), int(dst.min())) >= 0 and max(int(src.max()), int(dst.max())) < 2**31):
+        labels = None
+        s, d = cp.asarray(src.values).astype("int32"), cp.asarray(dst.values).astype("int32")
+    else:
+        m = len(events)
+        codes, uniques = cudf.concat([src, dst], ignore_index=True).factorize(sort=True)
+        labels = cudf.Series(uniques).reset_index(drop=True)
+        s, d = cp.asarray(codes[:m]).astype("int32"), cp.asarray(codes[m:]).astype("int32")
+        ok = (s >= 0) & (d >= 0)  # null labels (code -1) are not edges, as in a groupby
+        if not bool(ok.all()):
+            s, d = s[ok], d[ok]
+
+    keys, weight = cp.unique(pack_edge_keys(s, d), return_counts=True)
+    s, d = unpack_edge_keys(keys)
+    n_self = 0
+    if drop_self_loops:
+        loop = s == d
+        n_self = int(loop.sum())
+        if n_self:
+            keep = ~loop
+            s, d, weight = s[keep], d[keep], weight[keep]
+
+    if labels is None:
+        edges = cudf.DataFrame({"src": s, "dst": d, "weight": weight.astype("int64")})
+        edges["src"] = edges["src"].astype(src.dtype)
+        edges["dst"] = edges["dst"].astype(dst.dtype)
+        return edges, n_self
+    return cudf.DataFrame({
+        "src": labels.take(s).reset_index(drop=True),
+        "dst": labels.take(d).reset_index(drop=True),
+        "weight": cudf.Series(weight.astype("int64")),
+    }), n_self
+
+
+def drop_edge_self_loops(edges, drop_self_loops: bool):
     n_self = 0
     if drop_self_loops:
         n_self = int((edges["src"] == edges["dst"]).sum())
@@ -430,15 +1370,82 @@ def build_weighted_edges(events, drop_self_loops: bool):
     return edges, n_self
 
 
-def apply_variant(edges, variant: str):
-    if variant == "unweighted":
-        e = edges.copy()
-        e["weight"] = 1
-        return e
-    if variant.startswith("thr"):
-        thr = int(variant.replace("thr", ""))
-        return edges[edges["weight"] >= thr]
-    return edges  # base
+# ----------------------------
+# Rolling windows: incremental edge aggregation
+# ----------------------------
+class RollingEdges:
+    """
+    (src, dst) -> weight table of the previous window of one company, kept per
+    worker and updated for the next window by adding the slices that enter and
+    subtracting the slices that leave, instead of regrouping every event.
+
+    Events are bucketed by `step` (e.g. 1 day) and kept as per-bucket edge counts,
+    so a leaving slice is known exactly. An update is incremental when the new
+    window is the same company, starts on a bucket boundary, does not move
+    backwards and overlaps the previous one; otherwise the state is rebuilt from
+    the window's events. Cost per incremental step is the entering events plus a
+    merge over the unique-edge table, not a groupby over all window events.
+    """
+
+    def __init__(self, cudf, step: str):
+        self.cudf = cudf
+        self.step_ns = int(pd.Timedelta(step).value)
+        self.company = None
+        self.start_ns = self.end_ns = None
+        self.slices = None  # bucket, src, dst, weight
+        self.table = None   # src, dst, weight
+
+    def _bucketed(self, events):
+        tmp = events[["src", "dst"]].copy()
+        tmp["bucket"] = ts_series_ns(events["ts"]) // self.step_ns
+        return tmp.groupby(["bucket", "src", "dst"]).size().reset_index().rename(columns={0: "weight"})
+
+    def _collapse(self, df):
+        t = df.groupby(["src", "dst"])["weight"].sum().reset_index()
+        return t[t["weight"] > 0]
+
+    def update(self, events, company, start_ts, end_ts):
+        """Return (edges src,dst,weight for [start_ts, end_ts], mode) where mode is 'incremental' or 'rebuild'."""
+        s, e = int(pd.Timestamp(start_ts).value), int(pd.Timestamp(end_ts).value)
+
+        incremental = (
+            self.table is not None and company == self.company
+            and s % self.step_ns == 0
+            and self.start_ns <= s <= self.end_ns and e >= self.end_ns
+        )
+        if incremental:
+            entering = events[ts_series_ns(events["ts"]) > self.end_ns]
+            add = self._bucketed(entering)
+            keep_mask = self.slices["bucket"] >= s // self.step_ns
+            leave = self.slices[~keep_mask]
+            self.slices = self.cudf.concat([self.slices[keep_mask], add], ignore_index=True)
+
+            leave = leave[["src", "dst", "weight"]].copy()
+            leave["weight"] = -leave["weight"]
+            self.table = self._collapse(self.cudf.concat(
+                [self.table, add[["src", "dst", "weight"]], leave], ignore_index=True))
+            mode = "incremental"
+        else:
+            self.slices = self._bucketed(events)
+            self.table = self._collapse(self.slices)
+            mode = "rebuild"
+
+        self.company, self.start_ns, self.end_ns = company, s, e
+        return self.table, mode
+
+
+def group_rolling_series(tasks, chunk: int):
+    """Group windows by company, in start order; split each series into runs of `chunk` windows (0 = whole series)."""
+    by_company: Dict[str, list] = {}
+    for t in tasks:
+        by_company.setdefault(t[0], []).append(t)
+    units = []
+    for company, ts in by_company.items():
+        ts.sort(key=lambda t: pd.Timestamp(t[1]))
+        step = chunk if chunk and chunk > 0 else len(ts)
+        for i in range(0, len(ts), step):
+            units.append(tuple(ts[i:i + step]))
+    return units
 
 
 def freeman_centralization_from_degree(cudf, degree_series):
@@ -498,10 +1505,10 @@ def echo_chamber_metrics(cudf, edges_label, parts, total_weight: float) -> Dict[
     out["EI_index_weighted"] = (between - within) / tot if tot > 0 else float("nan")
 
     # community size concentration
-    comm_sizes = parts.groupby("partition").size().astype("float64")
-    out["comm_size_hhi"] = hhi_cudf(comm_sizes)
-    out["comm_size_gini"] = gini_cudf(cudf, comm_sizes)
-    out["comm_size_entropy"] = entropy_share_cudf(comm_sizes)
+    comm_sizes = DistributionSummary(parts.groupby("partition").size())
+    out["comm_size_hhi"] = comm_sizes.get("hhi")
+    out["comm_size_gini"] = comm_sizes.get("gini")
+    out["comm_size_entropy"] = comm_sizes.get("entropy")
 
     # community "attention" = total incoming weight staying within each community (or total within weight per comm)
     within_edges = e[e["c_src"] == e["c_dst"]]
@@ -512,10 +1519,11 @@ def echo_chamber_metrics(cudf, edges_label, parts, total_weight: float) -> Dict[
         out["comm_attention_entropy"] = float("nan")
         out["largest_comm_attention_share"] = float("nan")
     else:
-        out["comm_attention_hhi"] = hhi_cudf(comm_attention)
-        out["comm_attention_gini"] = gini_cudf(cudf, comm_attention)
-        out["comm_attention_entropy"] = entropy_share_cudf(comm_attention)
-        out["largest_comm_attention_share"] = float(comm_attention.max() / comm_attention.sum())
+        att = DistributionSummary(comm_attention)
+        out["comm_attention_hhi"] = att.get("hhi")
+        out["comm_attention_gini"] = att.get("gini")
+        out["comm_attention_entropy"] = att.get("entropy")
+        out["largest_comm_attention_share"] = att.get("max") / att.total
 
     # mixing entropy: distribution of dst communities given src community, aggregated
     # Build mixing matrix weights
@@ -534,268 +1542,620 @@ def echo_chamber_metrics(cudf, edges_label, parts, total_weight: float) -> Dict[
 
 
 # ----------------------------
-# Core graph metrics per variant
+# Window graph (built once per window, derived per variant)
 # ----------------------------
-def compute_variant_metrics(cudf, cugraph, edges_label, variant_name, outdir, save_node_tables, extra_centrality, errors):
-    pref = f"{variant_name}__"
-    out: Dict[str, Any] = {}
+class WindowGraph:
+    """
+    Integer-id graph bundle for one variant of one window.
 
-    if len(edges_label) == 0:
-        out[pref + "n_nodes"] = 0
-        return out
-    # directed graph
-    Gd = cugraph.Graph(directed=True, store_transposed=True)
-    Gd.from_cudf_edgelist(edges_label, source="src", destination="dst", edge_attr="weight", renumber=True)
-
-    # Undirected graph (REQUIRED for WCC, clustering, eigenvector)
-    Gu = cugraph.Graph(directed=False, store_transposed=True)
-    Gu.from_cudf_edgelist(
-        edges_label,
-        source="src",
-        destination="dst",
-        edge_attr="weight",
-        renumber=True
-    )
+    src/dst labels are factorized once (from_edges); the directed (Gd) and
+    undirected (Gu) cuGraph objects are built lazily from the integer edge list
+    with renumber=False, so cuGraph goes straight to its CSR/CSC without a
+    renumbering pass of its own. Every metric block (PageRank, components,
+    Louvain, core number, triangles, echo chambers) shares these objects.
 
-    n_nodes = int(Gd.number_of_vertices())
-    total_weight = float(edges_label["weight"].sum()) if len(edges_label) else 0.0
-    out[pref + "n_nodes"] = n_nodes
-    out[pref + "edges_unique"] = int(len(edges_label))
-    out[pref + "total_weight"] = float(total_weight)
-    out[pref + "density"] = float(len(edges_label) / (n_nodes * (n_nodes - 1))) if n_nodes > 1 else float("nan")
+    Variants are derived from the base graph (derive): new weights and/or an
+    edge mask over the same structure, without re-factorizing labels.
 
-    # degrees (unweighted) for centralization
-    try:
-        deg_df = Gd.degree()  # unweighted
-        indeg_u = deg_df[["vertex", "in_degree"]].rename(columns={"in_degree": "in_deg"})
-        outdeg_u = deg_df[["vertex", "out_degree"]].rename(columns={"out_degree": "out_deg"})
-        d_u = indeg_u.merge(outdeg_u, on="vertex", how="outer").fillna(0)
-        out[pref + "in_deg_centralization"] = freeman_centralization_from_degree(cudf, d_u["in_deg"])
-        out[pref + "out_deg_centralization"] = freeman_centralization_from_degree(cudf, d_u["out_deg"])
-        if save_node_tables:
-            d_u.to_parquet(os.path.join(outdir, f"{variant_name}_node_degree_unweighted.parquet"), index=False)
-    except Exception as ex:
-        errors[pref + "deg_centralization"] = repr(ex)
+    Vertex ids are 0..n_nodes-1 and `labels[i]` is the label of vertex i.
+    Degree / strength arrays are dense, indexed by vertex id.
+    """
 
-    # strengths (weighted degrees)
-    try:
-        deg_df = Gd.degree()  # weighted
-        indeg = deg_df[["vertex", "in_degree"]].rename(columns={"in_degree": "in_strength"})
-        outdeg = deg_df[["vertex", "out_degree"]].rename(columns={"out_degree": "out_strength"})
-        deg = indeg.merge(outdeg, on="vertex", how="outer").fillna(0)
-        in_s = deg["in_strength"].astype("float64")
-        out_s = deg["out_strength"].astype("float64")
-
-        out.update({pref + k: v for k, v in stats_pack_cudf(in_s, "in").items()})
-        out.update({pref + k: v for k, v in stats_pack_cudf(out_s, "out").items()})
-        out.update({pref + k: v for k, v in conc_pack_cudf(cudf, in_s, "in").items()})
-        out.update({pref + k: v for k, v in conc_pack_cudf(cudf, out_s, "out").items()})
-
-        out[pref + "in_zero_share"] = float((in_s == 0).mean())
-        out[pref + "out_zero_share"] = float((out_s == 0).mean())
-        out[pref + "check_sum_in_minus_total"] = float(in_s.sum()) - float(total_weight)
-        out[pref + "check_sum_out_minus_total"] = float(out_s.sum()) - float(total_weight)
-
-        if save_node_tables:
-            deg.to_parquet(os.path.join(outdir, f"{variant_name}_node_strengths.parquet"), index=False)
-    except Exception as ex:
-        errors[pref + "strengths"] = repr(ex)
+    def __init__(self, cudf, cugraph, src, dst, weight, labels, names=None):
+        self._cudf = cudf
+        self._cugraph = cugraph
+        self.names = names
+
+        self.src = src
+        self.dst = dst
+        self.weight = weight
+        self.labels = labels
+        self.n_nodes = int(len(labels))
+        self.n_edges = int(len(src))
+
+        # integer edge list (vertex space)
+        self.edges = cudf.DataFrame({"src": src, "dst": dst, "weight": weight})
+        self.total_weight = float(weight.sum()) if self.n_edges else 0.0
+
+        # unweighted degrees and strengths (weighted degrees), dense by vertex id
+        n = self.n_nodes
+        if self.n_edges == 0:
+            # e.g. a threshold variant that drops every edge: no metric reads these
+            self.in_deg, self.out_deg, self.in_strength, self.out_strength = (cp.zeros(n) for _ in range(4))
+        else:
+            self.in_deg = cp.bincount(dst, minlength=n).astype("float64")
+            self.out_deg = cp.bincount(src, minlength=n).astype("float64")
+            self.in_strength = cp.bincount(dst, weights=weight, minlength=n)
+            self.out_strength = cp.bincount(src, weights=weight, minlength=n)
+
+        self._Gd = None
+        self._Gu = None
+        self._fingerprint = None
+        self._mutual = None
+        self._vertex_labels = None
+
+    @classmethod
+    def from_edges(cls, cudf, cugraph, edges_label, names=None):
+        """
+        Factorize a label-space src,dst,weight edge list. With integer user ids as
+        labels, `names` (screen names indexed by user id) lets decode() write handles.
+        """
+        m = len(edges_label)
+        nodes = cudf.concat([edges_label["src"], edges_label["dst"]], ignore_index=True)
+        codes, uniques = nodes.factorize()  # codes length 2m, uniques length n
+        src = cp.asarray(codes[:m]).astype("int32")
+        dst = cp.asarray(codes[m:]).astype("int32")
+        w = cp.asarray(edges_label["weight"].astype("float64").values)
+        return cls(cudf, cugraph, src, dst, w, cudf.Series(uniques).reset_index(drop=True), names)
+
+    def derive(self, weight=None, mask=None):
+        """
+        Variant over the same structure: replace weights and/or keep only the
+        masked edges. Vertices left without edges are dropped and ids re-compacted,
+        so a variant has the same vertex set it would have if built from scratch.
+        """
+        src, dst, labels = self.src, self.dst, self.labels
+        w = self.weight if weight is None else weight
+        if mask is not None:
+            src, dst, w = src[mask], dst[mask], w[mask]
+            if len(src) == 0:
+                # nothing survives: an empty graph (compute_variant_metrics returns before any graph call)
+                return WindowGraph(self._cudf, self._cugraph, src, dst, w, labels[:0], self.names)
+            used = cp.zeros(self.n_nodes, dtype=bool)
+            used[src] = True
+            used[dst] = True
+            if not bool(used.all()):
+                remap = (cp.cumsum(used) - 1).astype("int32")
+                src, dst = remap[src], remap[dst]
+                labels = labels[used].reset_index(drop=True)
+        g = WindowGraph(self._cudf, self._cugraph, src, dst, w, labels, self.names)
+        if mask is None:
+            g._mutual = self._mutual  # same edge set
+        return g
+
+    @property
+    def Gd(self):
+        if self._Gd is None:
+            self._Gd = self._cugraph.Graph(directed=True, store_transposed=True)
+            self._Gd.from_cudf_edgelist(self.edges, source="src", destination="dst", edge_attr="weight", renumber=False)
+        return self._Gd
+
+    @property
+    def Gu(self):
+        # undirected projection (WCC, Louvain, core number, triangles, extra centrality)
+        if self._Gu is None:
+            self._Gu = self._cugraph.Graph(directed=False, store_transposed=True)
+            self._Gu.from_cudf_edgelist(self.edges, source="src", destination="dst", edge_attr="weight", renumber=False)
+        return self._Gu
+
+    @property
+    def fingerprint(self):
+        """Edge-set fingerprint (weights ignored): (n_nodes, n_edges, mixed hash of packed src/dst)."""
+        if self._fingerprint is None:
+            # splitmix64 per packed edge, then an order-independent sum (wraps mod 2^64)
+            key = splitmix64(pack_edge_keys(self.src, self.dst))
+            self._fingerprint = (self.n_nodes, self.n_edges, int(key.sum()) if self.n_edges else 0)
+        return self._fingerprint
+
+    @property
+    def mutual(self):
+        """Per-edge bool: the reverse edge is also present (sort + searchsorted on packed keys)."""
+        if self._mutual is None:
+            self._mutual = mutual_edge_mask(pack_edge_keys(self.src, self.dst))
+        return self._mutual
+
+    def vertex_frame(self, **cols):
+        """Dense per-vertex table: vertex id plus the given arrays."""
+        df = self._cudf.DataFrame({"vertex": cp.arange(self.n_nodes, dtype="int32")})
+        for k, v in cols.items():
+            df[k] = v
+        return df
+
+    def decode(self, df, col="vertex"):
+        """Replace integer vertex ids in `col` with their labels (for node tables)."""
+        if self._vertex_labels is None:
+            labels = self.labels
+            if self.names is not None:
+                labels = self.names.take(labels.values).reset_index(drop=True)
+            self._vertex_labels = self._cudf.DataFrame({
+                "_vid": cp.arange(self.n_nodes, dtype="int32"),
+                "_label": labels,
+            })
+        out = df.merge(self._vertex_labels, left_on=col, right_on="_vid", how="left")
+        out[col] = out["_label"]
+        return out.drop(columns=["_vid", "_label"])
+
+
+def variant_graph(base: WindowGraph, variant: str) -> WindowGraph:
+    if variant == "unweighted":
+        return base.derive(weight=cp.ones_like(base.weight))
+    if variant.startswith("thr"):
+        thr = int(variant.replace("thr", ""))
+        return base.derive(mask=base.weight >= thr)
+    return base  # base
 
-    # reciprocity in label space (unique edges)
-    try:
-        e = edges_label[["src","dst"]]
-        mutual = e.merge(e.rename(columns={"src":"dst","dst":"src"}), on=["src","dst"], how="inner")
-        out[pref + "reciprocity"] = float(len(mutual) / max(1, len(e)))
-    except Exception as ex:
-        errors[pref + "reciprocity"] = repr(ex)
-        out[pref + "reciprocity"] = float("nan")
 
-    # components
-    try:
-        wcc = cugraph.weakly_connected_components(Gu)
-        sizes = wcc.groupby("labels").size().astype("float64")
-        out[pref + "n_wcc"] = int(len(sizes))
-        out[pref + "largest_wcc_share"] = float(sizes.max()/n_nodes) if n_nodes else float("nan")
-        # fragmentation distribution measures
-        out[pref + "wcc_size_hhi"] = hhi_cudf(sizes)
-        out[pref + "wcc_size_gini"] = gini_cudf(cudf, sizes)
-        out[pref + "wcc_size_entropy"] = entropy_share_cudf(sizes)
-        out[pref + "wcc_top5_share"] = top_share_cudf(sizes, 5.0/max(1,len(sizes)))
-    except Exception as ex:
-        errors[pref + "wcc"] = repr(ex)
+# ----------------------------
+# Topology-only metrics (memoized per edge set)
+# ----------------------------
+def topology_metrics(cudf, cugraph, wg: WindowGraph, save_node_tables) -> Dict[str, Any]:
+    """
+    Metrics that depend only on the edge set, not on weights: unweighted degree
+    centralization, reciprocity, WCC, SCC, core number, triangles / clustering.
+    Returns {"values", "errors", "tables"} with unprefixed keys so the result can
+    be reused by any variant with the same fingerprint.
+    """
+    vals: Dict[str, Any] = {}
+    errs: Dict[str, str] = {}
+    tables: Dict[str, Any] = {}
+    n_nodes = wg.n_nodes
 
-    try:
-        scc = cugraph.strongly_connected_components(Gd)
-        sizes = scc.groupby("labels").size().astype("float64")
-        out[pref + "n_scc"] = int(len(sizes))
-        out[pref + "largest_scc_share"] = float(sizes.max()/n_nodes) if n_nodes else float("nan")
-        out[pref + "scc_size_hhi"] = hhi_cudf(sizes)
-        out[pref + "scc_size_gini"] = gini_cudf(cudf, sizes)
-        out[pref + "scc_size_entropy"] = entropy_share_cudf(sizes)
-    except Exception as ex:
-        errors[pref + "scc"] = repr(ex)
+    # degrees (unweighted) for centralization
+    with stage("degree"):
+        try:
+            vals["in_deg_centralization"] = freeman_centralization_from_degree(cudf, cudf.Series(wg.in_deg))
+            vals["out_deg_centralization"] = freeman_centralization_from_degree(cudf, cudf.Series(wg.out_deg))
+            if save_node_tables:
+                tables["node_degree_unweighted"] = wg.vertex_frame(in_deg=wg.in_deg, out_deg=wg.out_deg)
+        except Exception as ex:
+            errs["deg_centralization"] = repr(ex)
 
-    # PageRank (influence)
-    try:
-        pr = cugraph.pagerank(Gd)
-        v = pr["pagerank"].astype("float64")
-        out.update({pref + k: v2 for k, v2 in stats_pack_cudf(v, "pagerank").items()})
-        out.update({pref + k: v2 for k, v2 in conc_pack_cudf(cudf, v, "pagerank").items()})
-        out[pref + "pagerank_sum"] = float(v.sum())
-        if save_node_tables:
-            pr.to_parquet(os.path.join(outdir, f"{variant_name}_pagerank.parquet"), index=False)
-    except Exception as ex:
-        errors[pref + "pagerank"] = repr(ex)
+    # reciprocity (unique edges, vertex space; the weighted share is per variant)
+    with stage("reciprocity"):
+        try:
+            vals["reciprocity"] = float(wg.mutual.sum() / max(1, wg.n_edges))
+        except Exception as ex:
+            errs["reciprocity"] = repr(ex)
+            vals["reciprocity"] = float("nan")
 
-    # undirected projection for echo chambers / clustering / core / communities
-    try:
-        Gu = cugraph.Graph(directed=False, store_transposed=True)
-        Gu.from_cudf_edgelist(edges_label, source="src", destination="dst", edge_attr="weight", renumber=True)
+    # components
+    with stage("wcc"):
+        try:
+            wcc = cugraph.weakly_connected_components(wg.Gu)
+            sizes = wcc.groupby("labels").size().astype("float64")
+            vals["n_wcc"] = int(len(sizes))
+            vals["largest_wcc_share"] = float(sizes.max()/n_nodes) if n_nodes else float("nan")
+            # fragmentation distribution measures
+            dist = DistributionSummary(sizes)
+            vals["wcc_size_hhi"] = dist.get("hhi")
+            vals["wcc_size_gini"] = dist.get("gini")
+            vals["wcc_size_entropy"] = dist.get("entropy")
+            vals["wcc_top5_share"] = dist.top_k_share(5)
+        except Exception as ex:
+            errs["wcc"] = repr(ex)
 
-        # Louvain communities
-        parts = None
+    with stage("scc"):
         try:
-            parts, modularity = cugraph.louvain(Gu)
-            out[pref + "modularity"] = safe_float(modularity)
-            comm_sizes = parts.groupby("partition").size().astype("float64")
-            out[pref + "n_communities"] = int(len(comm_sizes))
-            out[pref + "comm_size_hhi"] = hhi_cudf(comm_sizes)
-            out[pref + "comm_size_gini"] = gini_cudf(cudf, comm_sizes)
-            out[pref + "comm_size_entropy"] = entropy_share_cudf(comm_sizes)
-            out[pref + "largest_comm_share"] = float(comm_sizes.max()/n_nodes) if n_nodes else float("nan")
-            if save_node_tables:
-                parts.to_parquet(os.path.join(outdir, f"{variant_name}_communities.parquet"), index=False)
+            scc = cugraph.strongly_connected_components(wg.Gd)
+            sizes = scc.groupby("labels").size().astype("float64")
+            vals["n_scc"] = int(len(sizes))
+            vals["largest_scc_share"] = float(sizes.max()/n_nodes) if n_nodes else float("nan")
+            dist = DistributionSummary(sizes)
+            vals["scc_size_hhi"] = dist.get("hhi")
+            vals["scc_size_gini"] = dist.get("gini")
+            vals["scc_size_entropy"] = dist.get("entropy")
         except Exception as ex:
-            errors[pref + "louvain"] = repr(ex)
-
-        # echo chamber metrics (need parts in renumbered space, edges in renumbered space!)
-        # IMPORTANT: We have edges_label in label space, but Gu/Gd are renumbered internally.
-        # However, cugraph.louvain returns partitions in the renumbered vertex space consistent with Gu.
-        # To align, we must also use edges in the renumbered vertex space. Easiest: rebuild edges in renumbered space.
-        # cuGraph doesn't expose mapping directly from Graph object cleanly across versions; so we compute echo metrics
-        # using the partitions by joining on "vertex" computed from Graph renumbering on a NEW edgelist build.
-        #
-        # Practical workaround: compute echo metrics in renumbered space by rebuilding an undirected graph from edges_label
-        # and using the partition + triangle/degree outputs which are also in renumbered space.
-        #
-        # We'll approximate echo metrics using the SAME renumbered vertex IDs by:
-        #   - creating a temporary graph on edges_label (as above),
-        #   - getting its edgelist back is not always supported across versions.
-        # So instead, we compute within/between weight using a merge between partitions and a renumbered edgelist we create:
-        #
-        # Use cugraph.utilities.renumbering is version dependent, so we do a safe approach:
-        # Rebuild a DiGraph with renumber=True and request a renumbered edgelist via internal API is risky.
-        #
-        # Therefore: we compute echo metrics in LABEL SPACE using LABEL-SPACE communities is not available from louvain.
-        # Solution: compute echo metrics using label-space communities via a CPU algorithm is too slow.
-        #
-        # So: we compute echo metrics using renumbered edges by doing louvain on a graph built from a renumbered edgelist
-        # that we create ourselves via a cudf factorization (stable and version-agnostic).
-        #
-        # That’s implemented below.
-
-        # core number (cohesion)
+            errs["scc"] = repr(ex)
+
+    # core number (cohesion)
+    with stage("core"):
         try:
-            core = cugraph.core_number(Gu)
-            out[pref + "max_core"] = float(core["core_number"].max()) if len(core) else float("nan")
+            core = cugraph.core_number(wg.Gu)
+            vals["max_core"] = float(core["core_number"].max()) if len(core) else float("nan")
             for k in range(2, 11):
-                out[pref + f"core_size_k{k}"] = int((core["core_number"] >= k).sum())
+                vals[f"core_size_k{k}"] = int((core["core_number"] >= k).sum())
             if save_node_tables:
-                core.to_parquet(os.path.join(outdir, f"{variant_name}_core_number.parquet"), index=False)
+                tables["core_number"] = core
         except Exception as ex:
-            errors[pref + "core_number"] = repr(ex)
+            errs["core_number"] = repr(ex)
 
-        # triangles / clustering
+    # triangles / clustering
+    with stage("triangles"):
         try:
-            tri = cugraph.triangle_count(Gu)
-            deg_u = Gu.degree().rename(columns={"degree": "deg"})
+            tri = cugraph.triangle_count(wg.Gu)
+            deg_u = wg.Gu.degree().rename(columns={"degree": "deg"})
             tmp = deg_u.merge(tri, on="vertex", how="left").fillna(0)
             d = tmp["deg"].astype("float64")
             t = tmp["triangle_count"].astype("float64")
             triplets = float((d*(d-1.0)/2.0).sum())
             total_tri = float(t.sum()/3.0)
-            out[pref + "total_triangles"] = total_tri
-            out[pref + "transitivity"] = float((3.0*total_tri/triplets) if triplets > 0 else float("nan"))
+            vals["total_triangles"] = total_tri
+            vals["transitivity"] = float((3.0*total_tri/triplets) if triplets > 0 else float("nan"))
             denom = d*(d-1.0)
             local = cudf.Series([0.0]*len(tmp), dtype="float64")
             mask = denom > 0
             local[mask] = (2.0*t[mask]) / denom[mask]
-            out[pref + "avg_clustering"] = float(local.mean()) if len(local) else float("nan")
+            vals["avg_clustering"] = float(local.mean()) if len(local) else float("nan")
             # fragmentation proxy: leaf share (degree==1) in undirected
-            out[pref + "leaf_share_undirected"] = float((d == 1).mean()) if len(d) else float("nan")
+            vals["leaf_share_undirected"] = float((d == 1).mean()) if len(d) else float("nan")
             if save_node_tables:
-                tmp.to_parquet(os.path.join(outdir, f"{variant_name}_deg_triangles.parquet"), index=False)
+                tables["deg_triangles"] = tmp
         except Exception as ex:
-            errors[pref + "clustering"] = repr(ex)
-
-        # OPTIONAL extra centrality (heavy, version dependent)
-        if extra_centrality:
-            try:
-                # eigenvector
-                evc = cugraph.eigenvector_centrality(Gu)
-                v = evc["eigenvector_centrality"].astype("float64")
-                out.update({pref + "evec_" + k: v2 for k, v2 in stats_pack_cudf(v, "").items() if k != "_mean"})  # keep light
-                out[pref + "evec_gini"] = gini_cudf(cudf, v)
-                out[pref + "evec_hhi"] = hhi_cudf(v)
-                if save_node_tables:
-                    evc.to_parquet(os.path.join(outdir, f"{variant_name}_eigenvector.parquet"), index=False)
-            except Exception as ex:
-                errors[pref + "eigenvector"] = repr(ex)
-
-            try:
-                bc = cugraph.betweenness_centrality(Gu, normalized=True)
-                v = bc["betweenness_centrality"].astype("float64")
-                out[pref + "betweenness_gini"] = gini_cudf(cudf, v)
-                out[pref + "betweenness_hhi"] = hhi_cudf(v)
-                if save_node_tables:
-                    bc.to_parquet(os.path.join(outdir, f"{variant_name}_betweenness.parquet"), index=False)
-            except Exception as ex:
-                errors[pref + "betweenness"] = repr(ex)
-
-            try:
-                cc = cugraph.closeness_centrality(Gu)
-                v = cc["closeness_centrality"].astype("float64")
-                out[pref + "closeness_gini"] = gini_cudf(cudf, v)
-                out[pref + "closeness_hhi"] = hhi_cudf(v)
-                if save_node_tables:
-                    cc.to_parquet(os.path.join(outdir, f"{variant_name}_closeness.parquet"), index=False)
-            except Exception as ex:
-                errors[pref + "closeness"] = repr(ex)
+            errs["clustering"] = repr(ex)
 
-    except Exception as ex:
-        errors[pref + "undirected_block"] = repr(ex)
+    return {"values": vals, "errors": errs, "tables": tables}
 
-    # Echo chamber block (version-agnostic): compute communities + mixing using our own factorization
-    try:
-        # Factorize all unique nodes to integer ids
-        nodes = cudf.concat([edges_label["src"], edges_label["dst"]], ignore_index=True)
-        codes, uniques = nodes.factorize()  # codes length 2m, uniques length n
-        m = len(edges_label)
-        src_code = codes[:m]
-        dst_code = codes[m:]
 
-        e_ren = cudf.DataFrame({"src": src_code, "dst": dst_code, "weight": edges_label["weight"].astype("int64")})
-        # undirected graph on these integer ids
-        Gu2 = cugraph.Graph(directed=False, store_transposed=True)
-        Gu2.from_cudf_edgelist(e_ren, source="src", destination="dst", edge_attr="weight", renumber=False)
+# ----------------------------
+# Metric budgets (exact vs sampled path centralities)
+# ----------------------------
+def parse_metric_budgets(spec: str) -> Dict[str, float]:
+    """'betweenness=2e10,closeness=2e10' -> {metric: work budget in edge visits} (0 = always exact)."""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if part.strip():
+            name, _, val = part.partition("=")
+            out[name.strip()] = float(val)
+    return out
 
-        parts2, modularity2 = cugraph.louvain(Gu2)
-        out[pref + "modularity_factorized"] = safe_float(modularity2)
 
-        echo = echo_chamber_metrics(cudf, e_ren, parts2, float(e_ren["weight"].sum()))
-        out.update({pref + "echo_" + k: v for k, v in echo.items()})
+class MetricBudget:
+    """
+    Per-worker exact / sampled planner for path-based centralities. Exact
+    betweenness or closeness runs one traversal per vertex, about
+    n_nodes * n_edges edge visits. When that exceeds the metric's work budget,
+    or the time predicted from the edge-visit rate this worker has observed so
+    far exceeds --metric-time-budget, the metric runs from k sampled sources
+    instead (k = what the budget affords, at least --sample-k-min).
+    """
 
-        if save_node_tables:
-            parts2.to_parquet(os.path.join(outdir, f"{variant_name}_communities_factorized.parquet"), index=False)
+    def __init__(self, work: Dict[str, float], time_s: float = 0.0, k_min: int = 64, seed: int = 42):
+        self.work = work
+        self.time_s = time_s
+        self.k_min = k_min
+        self.seed = seed
+        self.rate: Dict[str, float] = {}  # metric -> edge visits / s (running average)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(parse_metric_budgets(args.metric_budget), args.metric_time_budget, args.sample_k_min,
+                   args.sample_seed)
+
+    def plan(self, metric: str, n_nodes: int, n_edges: int) -> Tuple[str, int]:
+        """('exact', n_nodes) or ('sampled', k)."""
+        per_source = max(1, n_edges)
+        k = n_nodes
+        if self.work.get(metric, 0) > 0:
+            k = min(k, int(self.work[metric] // per_source))
+        if self.time_s > 0 and metric in self.rate:
+            k = min(k, int(self.time_s * self.rate[metric] // per_source))
+        if k >= n_nodes:
+            return "exact", n_nodes
+        return "sampled", min(n_nodes, max(self.k_min, k))
+
+    def observe(self, metric: str, k: int, n_edges: int, seconds: float):
+        if seconds <= 0:
+            return
+        r = k * max(1, n_edges) / seconds
+        self.rate[metric] = r if metric not in self.rate else 0.5 * (self.rate[metric] + r)
 
-    except Exception as ex:
-        errors[pref + "echo_factorized"] = repr(ex)
 
-    return out
+def sampled_closeness(cudf, cugraph, wg: WindowGraph, k: int, seed: int):
+    """
+    Closeness estimated from k BFS sources on the undirected graph: for each
+    vertex, (sources reaching it) / (sum of their distances), i.e. the inverse
+    mean distance to the sampled sources in its component.
+    """
+    n = wg.n_nodes
+    sources = np.random.default_rng(seed).choice(n, size=k, replace=False)
+    dist_sum = cp.zeros(n, dtype="float64")
+    reach = cp.zeros(n, dtype="float64")
+    for s in sources:
+        b = cugraph.bfs(wg.Gu, start=int(s))
+        v = cp.asarray(b["vertex"].values)
+        d = cp.asarray(b["distance"].values).astype("float64")
+        ok = (d > 0) & (d < np.iinfo(np.int32).max)
+        dist_sum[v[ok]] += d[ok]
+        reach[v[ok]] += 1.0
+    cc = cp.where(dist_sum > 0, reach / cp.where(dist_sum > 0, dist_sum, 1.0), 0.0)
+    return wg.vertex_frame(closeness_centrality=cc)
 
 
 # ----------------------------
-# Validation checks
+# Warm-started PageRank (per worker, per company)
+# ----------------------------
+class PageRankWarmStart:
+    """
+    Last PageRank vector per (company, variant) on this worker, stored against
+    vertex labels (the global user id with --user-ids, the handle otherwise), so
+    it survives the per-window re-factorization. The next window of the company
+    starts from it: vertices seen before take their previous score, new ones
+    1/n, renormalized to sum 1. Consecutive windows share most vertices, so the
+    power iteration starts near its fixed point. Integer ids are matched with
+    searchsorted on the sorted previous ids, handles with a merge. Companies
+    are kept LRU.
+    """
+
+    def __init__(self, cudf, max_companies: int = 16):
+        self.cudf = cudf
+        self.max_companies = max_companies
+        # company -> {variant: (sorted ids, pagerank) or label / pagerank frame}
+        self.last: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def nstart(self, company, variant, wg: WindowGraph):
+        """(starting vector frame with vertex / values, share of vertices seeded) or (None, 0.0)."""
+        prev = self.last.get(company, {}).get(variant)
+        if prev is None:
+            return None, 0.0
+        self.last.move_to_end(company)
+        n = wg.n_nodes
+        if isinstance(prev, tuple):
+            keys, vals = prev
+            ids = cp.asarray(wg.labels.values)
+            pos = cp.minimum(cp.searchsorted(keys, ids), len(keys) - 1)
+            v = cp.where(keys[pos] == ids, vals[pos], -1.0)
+        else:
+            x = wg.vertex_frame(label=wg.labels).merge(prev, on="label", how="left").sort_values("vertex")
+            v = cp.asarray(x["pagerank"].fillna(-1.0).values)
+        seen = v >= 0
+        seeded = float(seen.sum()) / max(1, n)
+        if seeded == 0.0:
+            return None, 0.0
+        v = cp.where(seen, v, 1.0 / n)
+        return wg.vertex_frame(values=v / float(v.sum())), seeded
+
+    def store(self, company, variant, wg: WindowGraph, x):
+        """x: dense PageRank by vertex id."""
+        if str(wg.labels.dtype).startswith("int"):
+            ids = cp.asarray(wg.labels.values)
+            order = cp.argsort(ids)
+            prev = (ids[order], x[order])
+        else:
+            prev = self.cudf.DataFrame({"label": wg.labels, "pagerank": x})
+        self.last.setdefault(company, {})[variant] = prev
+        self.last.move_to_end(company)
+        while len(self.last) > self.max_companies:
+            self.last.popitem(last=False)
+
+
+def pagerank_dense(wg: WindowGraph, pr):
+    """PageRank frame (vertex, pagerank) -> dense array indexed by vertex id."""
+    x = cp.zeros(wg.n_nodes, dtype="float64")
+    x[cp.asarray(pr["vertex"].values)] = cp.asarray(pr["pagerank"].astype("float64").values)
+    return x
+
+
+def pagerank_residual(wg: WindowGraph, x, alpha: float = 0.85) -> float:
+    """
+    L1 change of one more power-iteration step from x over the weighted
+    directed edge list (dangling mass spread uniformly, as cuGraph does): how
+    far the returned vector is from the fixed point.
+    """
+    n = wg.n_nodes
+    dangling = wg.out_strength == 0
+    share = wg.weight / cp.where(dangling, 1.0, wg.out_strength)[wg.src]
+    y = cp.bincount(wg.dst, weights=x[wg.src] * share, minlength=n)
+    y = alpha * (y + float(x[dangling].sum()) / n) + (1.0 - alpha) / n
+    return float(cp.abs(y - x).sum())
+
+
+# ----------------------------
+# Core graph metrics per variant
+# ----------------------------
+def compute_variant_metrics(cudf, cugraph, wg, variant_name, outdir, save_node_tables, extra_centrality, errors,
+                            topo_memo=None, budget=None, warm=None, company="", boot=None, window_id=""):
+    """
+    wg: WindowGraph for this variant.
+    topo_memo: optional dict shared across the variants of one window; topology-only
+    results are looked up by wg.fingerprint and reused when the edge set repeats
+    (base vs unweighted, or a threshold that removes no edges).
+    budget: optional MetricBudget choosing exact or sampled betweenness / closeness
+    (exact when None).
+    warm: optional PageRankWarmStart; PageRank starts from the company's previous
+    vector for this variant and leaves its own for the next window.
+    boot: optional BootstrapCI; adds interval columns for the in-strength
+    concentration, seeded from company / window_id.
+    """
+    pref = f"{variant_name}__"
+    out: Dict[str, Any] = {}
+    budget = budget if budget is not None else MetricBudget({})
+
+    if wg.n_edges == 0:
+        out[pref + "n_nodes"] = 0
+        return out
+
+    def save_nodes(df, name):
+        wg.decode(df).to_parquet(os.path.join(outdir, f"{variant_name}_{name}.parquet"), index=False)
+
+    n_nodes = wg.n_nodes
+    total_weight = wg.total_weight
+    out[pref + "n_nodes"] = n_nodes
+    out[pref + "edges_unique"] = wg.n_edges
+    out[pref + "total_weight"] = float(total_weight)
+    out[pref + "density"] = float(wg.n_edges / (n_nodes * (n_nodes - 1))) if n_nodes > 1 else float("nan")
+
+    # topology-only block (memoized on the edge-set fingerprint)
+    topo = topo_memo.get(wg.fingerprint) if topo_memo is not None else None
+    out[pref + "topology_cached"] = topo is not None
+    if topo is None:
+        with stage("topology"):
+            topo = topology_metrics(cudf, cugraph, wg, save_node_tables)
+        if topo_memo is not None:
+            topo_memo[wg.fingerprint] = topo
+    out.update({pref + k: v for k, v in topo["values"].items()})
+    errors.update({pref + k: v for k, v in topo["errors"].items()})
+    if save_node_tables:
+        for name, df in topo["tables"].items():
+            save_nodes(df, name)
+
+    # strengths (weighted degrees)
+    with stage("strengths"):
+        try:
+            in_s = cudf.Series(wg.in_strength)
+            out_s = cudf.Series(wg.out_strength)
+
+            out.update({pref + k: v for k, v in DistributionSummary(in_s).pack("in").items()})
+            out.update({pref + k: v for k, v in DistributionSummary(out_s).pack("out").items()})
+
+            out[pref + "in_zero_share"] = float((in_s == 0).mean())
+            out[pref + "out_zero_share"] = float((out_s == 0).mean())
+            out[pref + "check_sum_in_minus_total"] = float(in_s.sum()) - float(total_weight)
+            out[pref + "check_sum_out_minus_total"] = float(out_s.sum()) - float(total_weight)
+
+            if save_node_tables:
+                save_nodes(wg.vertex_frame(in_strength=wg.in_strength, out_strength=wg.out_strength), "node_strengths")
+        except Exception as ex:
+            errors[pref + "strengths"] = repr(ex)
+
+        # share of the weight on mutual pairs (reuses the edge mask behind reciprocity)
+        try:
+            out[pref + "reciprocity_weighted"] = float(wg.weight[wg.mutual].sum() / total_weight) if total_weight else float("nan")
+        except Exception as ex:
+            errors[pref + "reciprocity_weighted"] = repr(ex)
+            out[pref + "reciprocity_weighted"] = float("nan")
+
+    if boot is not None:
+        with stage("bootstrap"):
+            try:
+                out.update({pref + k: v for k, v in boot.window(wg, "in", boot.window_seed(company, window_id)).items()})
+            except Exception as ex:
+                errors[pref + "bootstrap"] = repr(ex)
+
+    # PageRank (influence)
+    with stage("pagerank"):
+        try:
+            nstart, seeded = warm.nstart(company, variant_name, wg) if warm is not None else (None, 0.0)
+            pr = cugraph.pagerank(wg.Gd, nstart=nstart) if nstart is not None else cugraph.pagerank(wg.Gd)
+            v = pr["pagerank"].astype("float64")
+            dist = DistributionSummary(v)
+            out.update({pref + k: v2 for k, v2 in dist.pack("pagerank").items()})
+            out[pref + "pagerank_sum"] = dist.total
+            # cuGraph does not report its iteration count; the CPU backend does
+            out[pref + "pagerank_iterations"] = safe_float(getattr(pr, "attrs", {}).get("iterations"))
+            out[pref + "pagerank_warm_share"] = seeded
+            x = pagerank_dense(wg, pr)
+            out[pref + "pagerank_residual"] = pagerank_residual(wg, x)
+            if warm is not None:
+                warm.store(company, variant_name, wg, x)
+            if save_node_tables:
+                save_nodes(pr, "pagerank")
+        except Exception as ex:
+            errors[pref + "pagerank"] = repr(ex)
+
+    # undirected projection for echo chambers / communities / extra centrality
+    parts = None
+    try:
+        # Louvain communities (vertex space, shared with the echo chamber block below)
+        with stage("louvain"):
+            try:
+                parts, modularity = cugraph.louvain(wg.Gu)
+                # cuGraph runs Louvain; the CPU backend names its stand-in in attrs["method"]
+                out[pref + "community_method"] = getattr(parts, "attrs", {}).get("method", "louvain")
+                out[pref + "modularity"] = safe_float(modularity)
+                comm_sizes = DistributionSummary(parts.groupby("partition").size())
+                out[pref + "n_communities"] = comm_sizes.n
+                out[pref + "comm_size_hhi"] = comm_sizes.get("hhi")
+                out[pref + "comm_size_gini"] = comm_sizes.get("gini")
+                out[pref + "comm_size_entropy"] = comm_sizes.get("entropy")
+                out[pref + "largest_comm_share"] = comm_sizes.get("max")/n_nodes if n_nodes else float("nan")
+                if save_node_tables:
+                    save_nodes(parts, "communities")
+            except Exception as ex:
+                parts = None
+                errors[pref + "louvain"] = repr(ex)
+
+        # OPTIONAL extra centrality (heavy, version dependent)
+        if extra_centrality:
+            with stage("eigenvector"):
+                try:
+                    # eigenvector
+                    evc = cugraph.eigenvector_centrality(wg.Gu)
+                    v = evc["eigenvector_centrality"].astype("float64")
+                    dist = DistributionSummary(v)
+                    out.update({pref + "evec_" + k: v2 for k, v2 in dist.stats("").items() if k != "_mean"})  # keep light
+                    out[pref + "evec_gini"] = dist.get("gini")
+                    out[pref + "evec_hhi"] = dist.get("hhi")
+                    if save_node_tables:
+                        save_nodes(evc, "eigenvector")
+                except Exception as ex:
+                    errors[pref + "eigenvector"] = repr(ex)
+
+            with stage("betweenness"):
+                try:
+                    method, k = budget.plan("betweenness", n_nodes, wg.n_edges)
+                    t0 = time.time()
+                    if method == "exact":
+                        bc = cugraph.betweenness_centrality(wg.Gu, normalized=True)
+                    else:
+                        bc = cugraph.betweenness_centrality(wg.Gu, k=k, normalized=True, seed=budget.seed)
+                    v = bc["betweenness_centrality"].astype("float64")
+                    dist = DistributionSummary(v)
+                    budget.observe("betweenness", k, wg.n_edges, time.time() - t0)
+                    out[pref + "betweenness_method"] = method
+                    out[pref + "betweenness_k"] = k
+                    out[pref + "betweenness_gini"] = dist.get("gini")
+                    out[pref + "betweenness_hhi"] = dist.get("hhi")
+                    if save_node_tables:
+                        save_nodes(bc, "betweenness")
+                except Exception as ex:
+                    errors[pref + "betweenness"] = repr(ex)
+
+            with stage("closeness"):
+                try:
+                    method, k = budget.plan("closeness", n_nodes, wg.n_edges)
+                    t0 = time.time()
+                    if method == "exact":
+                        cc = cugraph.closeness_centrality(wg.Gu)
+                    else:
+                        cc = sampled_closeness(cudf, cugraph, wg, k, budget.seed)
+                    v = cc["closeness_centrality"].astype("float64")
+                    dist = DistributionSummary(v)
+                    budget.observe("closeness", k, wg.n_edges, time.time() - t0)
+                    out[pref + "closeness_method"] = method
+                    out[pref + "closeness_k"] = k
+                    out[pref + "closeness_gini"] = dist.get("gini")
+                    out[pref + "closeness_hhi"] = dist.get("hhi")
+                    if save_node_tables:
+                        save_nodes(cc, "closeness")
+                except Exception as ex:
+                    errors[pref + "closeness"] = repr(ex)
+
+    except Exception as ex:
+        errors[pref + "undirected_block"] = repr(ex)
+
+    # Echo chamber block: Gu is already in factorized vertex space, so the Louvain
+    # partition above lines up with wg.edges directly (no second graph / Louvain run).
+    # modularity_factorized is kept for output compatibility and equals modularity.
+    with stage("echo"):
+        try:
+            if parts is None:
+                raise RuntimeError("Louvain partition unavailable (see louvain error).")
+            out[pref + "modularity_factorized"] = out.get(pref + "modularity", float("nan"))
+
+            echo = echo_chamber_metrics(cudf, wg.edges, parts, wg.total_weight)
+            out.update({pref + "echo_" + k: v for k, v in echo.items()})
+
+            if save_node_tables:
+                parts.to_parquet(os.path.join(outdir, f"{variant_name}_communities_factorized.parquet"), index=False)
+
+        except Exception as ex:
+            errors[pref + "echo_factorized"] = repr(ex)
+
+    return out
+
+
+# ----------------------------
+# Validation checks
 # ----------------------------
 def validate_variant(summary: Dict[str, Any], variant: str, tol: float) -> Tuple[bool, Dict[str, Any]]:
     pref = f"{variant}__"
@@ -832,20 +2192,596 @@ def validate_variant(summary: Dict[str, Any], variant: str, tol: float) -> Tuple
 
 
 # ----------------------------
-# Per-window compute
+# Results: per-window JSON files or a columnar sink
 # ----------------------------
-def compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_id, stop_flag):
-    if not window_id:
-        window_id = f"{company}_{start_str.replace(':','').replace(' ','T')}_{end_str.replace(':','').replace(' ','T')}"
-    outdir = os.path.join(args.outroot, f"company={company}", window_id)
+def emit_window(args, sink, outdir, summary, errors, validations=None, manifest=None):
+    """
+    Hand one window's results to the configured output.
+
+    json sink: summary.json, errors.json and validation.json in the window directory
+    (validations=None, used by the batched path, writes errors.json only when non-empty
+    and no validation.json), then a line in the worker's completion manifest.
+    parquet sink: one row to the results writer process, which records the manifest
+    once the row is committed.
+    """
+    status = "failed" if "fatal" in errors else "ok"
+    if sink is not None:
+        row = dict(summary)
+        row["status"] = status
+        row["errors_json"] = json.dumps(errors)
+        row["validation_json"] = json.dumps(validations if validations is not None else [])
+        sink.put(row)
+        return
+
     os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    if validations is None:
+        if errors:
+            with open(os.path.join(outdir, "errors.json"), "w") as f:
+                json.dump(errors, f, indent=2)
+    else:
+        with open(os.path.join(outdir, "errors.json"), "w") as f:
+            json.dump(errors, f, indent=2)
+        with open(os.path.join(outdir, "validation.json"), "w") as f:
+            json.dump(validations, f, indent=2)
+    if manifest is not None:
+        manifest.record(summary["company"], summary["window_id"], status)
+
+
+def results_dataset_dir(args):
+    return os.path.join(args.outroot, "results")
+
+
+def results_writer_main(results_q, args):
+    """
+    Buffer summary rows from all workers and append them to a company-partitioned
+    Parquet dataset under <outroot>/results/company=X/. A company's buffer is
+    committed once it reaches --sink-batch-rows rows or is older than
+    --sink-flush-sec seconds, and on shutdown. Each commit is one file written
+    under a temporary name, fsynced and renamed into place, so readers never see
+    a partial batch.
+    """
+    import uuid
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    root = results_dataset_dir(args)
+    tag = uuid.uuid4().hex[:8]
+    seq = 0
+    buffers: Dict[str, list] = {}
+    first_seen: Dict[str, float] = {}
+    manifest = open_manifest(args, f"sink-{tag}")
+
+    def commit(company):
+        nonlocal seq
+        rows = buffers.pop(company, [])
+        first_seen.pop(company, None)
+        if not rows:
+            return
+        d = os.path.join(root, f"company={company}")
+        os.makedirs(d, exist_ok=True)
+        table = pa.Table.from_pandas(pd.DataFrame(rows).drop(columns=["company"]), preserve_index=False)
+        final = os.path.join(d, f"part-{tag}-{seq:06d}.parquet")
+        tmp = final + ".tmp"
+        pq.write_table(table, tmp)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, final)
+        seq += 1
+        for r in rows:
+            manifest.record(company, r["window_id"], r["status"])
+        manifest.sync()
+
+    while True:
+        try:
+            row = results_q.get(timeout=1.0)
+        except queue.Empty:
+            row = ()
+        if row is None:
+            break
+        if row:
+            c = row["company"]
+            buffers.setdefault(c, []).append(row)
+            first_seen.setdefault(c, time.time())
+            if len(buffers[c]) >= args.sink_batch_rows:
+                commit(c)
+        now = time.time()
+        for c in [c for c, t in first_seen.items() if now - t >= args.sink_flush_sec]:
+            commit(c)
+
+    for c in list(buffers):
+        commit(c)
+    manifest.close()
+
+
+# ----------------------------
+# Completion manifest (resume without touching window directories)
+# ----------------------------
+def manifest_dir(args):
+    return os.path.join(args.outroot, "_manifest")
+
+
+class CompletionManifest:
+    """
+    Append-only log of finished windows, one JSON line per window:
+    {"company", "window_id", "status": "ok"|"failed", "t"}. Every writer process
+    owns its own file, so lines never interleave. Lines are flushed and fsynced
+    in batches (every `sync_every` records or `sync_sec` seconds, and on close);
+    each line is flushed to the OS as written, so only a machine crash can lose
+    the unsynced tail, whose windows simply run again.
+    """
+
+    def __init__(self, path, sync_every=256, sync_sec=5.0):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.f = open(path, "a")
+        self.sync_every = max(1, int(sync_every))
+        self.sync_sec = sync_sec
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def record(self, company, window_id, status):
+        self.f.write(json.dumps({"company": company, "window_id": window_id,
+                                 "status": status, "t": time.time()}) + "\n")
+        self.f.flush()  # survives a worker crash; the batched fsync covers machine crashes
+        self.pending += 1
+        if self.pending >= self.sync_every or time.time() - self.last_sync >= self.sync_sec:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            os.fsync(self.f.fileno())
+            self.pending = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+
+def open_manifest(args, name):
+    return CompletionManifest(os.path.join(manifest_dir(args), f"{name}.jsonl"),
+                              args.manifest_sync_every, args.manifest_sync_sec)
+
+
+def load_manifest(args):
+    """
+    Read every manifest file under <outroot>/_manifest/ and return (done, failed):
+    sets of (company, window_id) by each window's latest status. A torn last line
+    from a crashed writer is ignored.
+    """
+    latest: Dict[Tuple[str, str], Tuple[float, str]] = {}
+    for path in glob.glob(os.path.join(manifest_dir(args), "*.jsonl")):
+        with open(path) as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                key = (r["company"], r["window_id"])
+                if key not in latest or r["t"] >= latest[key][0]:
+                    latest[key] = (r["t"], r["status"])
+    done = {k for k, (_, s) in latest.items() if s == "ok"}
+    failed = {k for k, (_, s) in latest.items() if s != "ok"}
+    return done, failed
+
+
+# ----------------------------
+# Sketch mode (--approx-above): bounded-memory metrics for very large windows
+# ----------------------------
+def _clz64(x):
+    """Leading zero bits of each uint64 (64 for 0), by halving shifts."""
+    xp = _xp_of(x)
+    n = xp.zeros(x.shape, dtype="int64")
+    for s in (32, 16, 8, 4, 2, 1):
+        top_zero = (x >> xp.uint64(64 - s)) == 0
+        n += xp.where(top_zero, s, 0)
+        x = xp.where(top_zero, x << xp.uint64(s), x)
+    return n + (x == 0)
+
+
+class HyperLogLog:
+    """
+    Distinct count of 64-bit hashes in 2^p one-byte registers: the top p bits
+    pick a register, which keeps the longest run of leading zeros seen in the
+    remaining bits. Relative standard error 1.04 / sqrt(2^p); sketches merge by
+    register max.
+    """
+
+    def __init__(self, p: int = 14):
+        self.p = int(p)
+        self.m = 1 << self.p
+        self.reg = cp.zeros(self.m, dtype="uint8")
+
+    @property
+    def rse(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, h):
+        if len(h) == 0:
+            return
+        xp = _xp_of(h)
+        idx = (h >> xp.uint64(64 - self.p)).astype("int64")
+        rho = xp.minimum(_clz64(h << xp.uint64(self.p)), 64 - self.p) + 1
+        # one (register, max rank) pair per register touched: sorted unique keys, last of each register
+        key = xp.unique(idx * 64 + rho)
+        i, r = key // 64, key % 64
+        last = xp.concatenate([i[1:] != i[:-1], xp.ones(1, dtype=bool)])
+        i, r = i[last], r[last].astype("uint8")
+        self.reg[i] = xp.maximum(self.reg[i], r)
+
+    def merge(self, other: "HyperLogLog"):
+        self.reg = cp.maximum(self.reg, other.reg)
+
+    def estimate(self) -> float:
+        reg = self.reg if isinstance(self.reg, np.ndarray) else self.reg.get()
+        m = float(self.m)
+        e = 0.7213 / (1.0 + 1.079 / m) * m * m / float(np.sum(np.exp2(-reg.astype("float64"))))
+        zeros = int((reg == 0).sum())
+        if e <= 2.5 * m and zeros:
+            e = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return e
+
+
+class CountMinTopK:
+    """
+    Count-Min sketch of weight by key (depth rows of width counters, one hash
+    per row; a key's estimate is its smallest counter) plus the k keys with the
+    largest estimates so far. Estimates never undercount and overcount by at
+    most e / width of the total weight with probability 1 - exp(-depth). The
+    top k is a bounded heap kept as a frame: after each batch, the previous
+    top k and the batch's distinct keys are re-ranked by their estimates.
+    """
+
+    def __init__(self, cudf, width: int = 1 << 18, depth: int = 4, k: int = 100):
+        self.cudf = cudf
+        self.width, self.depth, self.k = int(width), int(depth), int(k)
+        self.table = cp.zeros((self.depth, self.width), dtype="float64")
+        self.seeds = [int(x) for x in splitmix64(np.arange(1, self.depth + 1, dtype="uint64"))]
+        self.top = None  # h, label, est
+        self.total = 0.0
+
+    @property
+    def eps(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    def _cols(self, h, r):
+        xp = _xp_of(h)
+        return (splitmix64(h ^ xp.uint64(self.seeds[r])) % xp.uint64(self.width)).astype("int64")
+
+    def estimate(self, h):
+        est = self.table[0][self._cols(h, 0)]
+        for r in range(1, self.depth):
+            est = cp.minimum(est, self.table[r][self._cols(h, r)])
+        return est
+
+    def add(self, h, labels, w):
+        """h: key hashes, labels: Series of the keys (reported for the top k), w: weights; all aligned."""
+        for r in range(self.depth):
+            self.table[r] += cp.bincount(self._cols(h, r), weights=w, minlength=self.width)
+        self.total += float(w.sum())
+        batch = self.cudf.DataFrame({"h": h, "label": labels.reset_index(drop=True)}).drop_duplicates("h")
+        cand = batch if self.top is None else self.cudf.concat(
+            [self.top[["h", "label"]], batch], ignore_index=True).drop_duplicates("h")
+        cand["est"] = self.estimate(cp.asarray(cand["h"].values))
+        self.top = cand.nlargest(self.k, "est").reset_index(drop=True)
+
+
+class QuantileSketch:
+    """
+    Relative-error quantile sketch (DDSketch): positive values are counted in
+    logarithmic buckets ceil(log_gamma x), gamma = (1 + a) / (1 - a), over a
+    dense host array of bucket keys; zeros are counted apart. A quantile is
+    returned within relative error a of the exact order statistic, memory grows
+    with log(max / min) / log(gamma) only, and sketches merge by adding counts.
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = float(alpha)
+        self.gamma = (1.0 + self.alpha) / (1.0 - self.alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.k0 = 0
+        self.counts = np.zeros(0, dtype="int64")
+        self.zeros = 0
+        self.n = 0
+
+    def _add_counts(self, k0: int, counts):
+        if not len(self.counts):
+            self.k0, self.counts = k0, np.asarray(counts, dtype="int64")
+            return
+        lo = min(self.k0, k0)
+        hi = max(self.k0 + len(self.counts), k0 + len(counts))
+        out = np.zeros(hi - lo, dtype="int64")
+        out[self.k0 - lo:self.k0 - lo + len(self.counts)] += self.counts
+        out[k0 - lo:k0 - lo + len(counts)] += counts
+        self.k0, self.counts = lo, out
+
+    def add(self, x):
+        xp = _xp_of(x)
+        x = x.astype("float64")
+        pos = x > 0
+        self.n += int(x.shape[0])
+        self.zeros += int(x.shape[0]) - int(pos.sum())
+        k = xp.ceil(xp.log(x[pos]) / self.log_gamma).astype("int64")
+        if k.shape[0] == 0:
+            return
+        lo = int(k.min())
+        c = xp.bincount(k - lo)
+        self._add_counts(lo, c if xp is np else c.get())
+
+    def merge(self, other: "QuantileSketch"):
+        self.n += other.n
+        self.zeros += other.zeros
+        if len(other.counts):
+            self._add_counts(other.k0, other.counts)
+
+    def quantile(self, q: float) -> float:
+        if self.n == 0:
+            return float("nan")
+        rank = q * (self.n - 1)
+        if rank < self.zeros:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), rank - self.zeros, side="right"))
+        k = self.k0 + min(i, len(self.counts) - 1)
+        return 2.0 * self.gamma ** k / (self.gamma + 1.0)
+
+
+class NodeSample:
+    """
+    Uniform vertex sample by hash with exact in / out strengths: at level L a
+    vertex is sampled when the top L bits of its hash are zero, so it is kept
+    or dropped together with all of its events. When the sample outgrows `cap`
+    vertices, L is raised and the sample thinned; the rate is 2^-L.
+    """
+
+    def __init__(self, cudf, cap: int):
+        self.cudf = cudf
+        self.cap = max(1, int(cap))
+        self.level = 0
+        self.table = None  # h, in_s, out_s
+
+    @property
+    def rate(self) -> float:
+        return 2.0 ** -self.level
+
+    def _keep(self, h):
+        xp = _xp_of(h)
+        return (h >> xp.uint64(64 - self.level)) == 0 if self.level else xp.ones(h.shape[0], dtype=bool)
+
+    def add(self, hs, hd, w):
+        ks, kd = self._keep(hs), self._keep(hd)
+        zs, zd = cp.zeros(int(ks.sum())), cp.zeros(int(kd.sum()))
+        parts = [self.cudf.DataFrame({"h": hs[ks], "in_s": zs, "out_s": w[ks]}),
+                 self.cudf.DataFrame({"h": hd[kd], "in_s": w[kd], "out_s": zd})]
+        if self.table is not None:
+            parts.insert(0, self.table)
+        t = self.cudf.concat(parts, ignore_index=True).groupby("h").sum().reset_index()
+        while len(t) > self.cap:
+            self.level += 1
+            t = t[self._keep(cp.asarray(t["h"].values))]
+        self.table = t
+
+
+def weighted_distribution(x, w, prefix, qs=DIST_QS, tops=DIST_TOPS) -> Dict[str, float]:
+    """
+    DistributionSummary.pack keys for host values x with integer multiplicities
+    w (a value stands for w vertices), as if the expanded series were summarized;
+    quantiles take the order statistic at q * (n - 1) without interpolation.
+    """
+    order = np.argsort(x, kind="stable")
+    x, w = np.asarray(x, dtype="float64")[order], np.asarray(w, dtype="float64")[order]
+    nan = float("nan")
+    out = {f"{prefix}_{k}": nan for k in ["mean", "std", "min", "max"] + [f"q{int(q*100)}" for q in qs]
+           + ["gini", "hhi", "entropy", "theil"] + [f"{name}_share" for name, _ in tops] + ["max_share"]}
+    if len(x) == 0:
+        return out
+    W = np.cumsum(w)
+    n, tot = float(W[-1]), float((w * x).sum())
+    mean = tot / n
+    out.update({f"{prefix}_mean": mean, f"{prefix}_min": float(x[0]), f"{prefix}_max": float(x[-1])})
+    out[f"{prefix}_std"] = math.sqrt(float((w * (x - mean) ** 2).sum()) / (n - 1.0)) if n > 1 else nan
+    for q in qs:
+        out[f"{prefix}_q{int(q*100)}"] = float(x[min(len(x) - 1, int(np.searchsorted(W, q * (n - 1.0), side="right")))])
+    if tot <= 0:
+        out.update({f"{prefix}_{k}": 0.0 for k in ["gini", "hhi"] + [f"{name}_share" for name, _ in tops] + ["max_share"]})
+        return out
+    # vertex i of the expanded series holds ranks W[i-1]+1 .. W[i]
+    rank_sum = w * (W - w + W + 1.0) / 2.0
+    out[f"{prefix}_gini"] = float(2.0 * (rank_sum * x).sum() / (n * tot) - (n + 1.0) / n)
+    p = x / tot
+    pos = p > 0
+    out[f"{prefix}_hhi"] = float((w * p * p).sum())
+    out[f"{prefix}_entropy"] = float(-(w[pos] * p[pos] * np.log(p[pos])).sum())
+    out[f"{prefix}_theil"] = float((w[pos] * p[pos] * np.log(p[pos] * n)).sum())
+    # top share: the ceil(frac * n) largest of the expanded series, from the top down
+    R = np.cumsum(w[::-1])
+    S = np.cumsum((w * x)[::-1])
+    for name, frac in tops:
+        k = max(1.0, math.ceil(frac * n))
+        j = int(np.searchsorted(R, k))  # first reversed index reaching k vertices
+        j = min(j, len(R) - 1)
+        full = S[j - 1] if j else 0.0
+        taken = R[j - 1] if j else 0.0
+        out[f"{prefix}_{name}_share"] = float((full + (k - taken) * x[::-1][j]) / tot)
+    out[f"{prefix}_max_share"] = float(x[-1] / tot)
+    return out
+
+
+def sketch_window_metrics(cudf, args, company, start_ts, end_ts, outdir, catalog=None) -> Dict[str, Any]:
+    """
+    Base-variant summary of a window too large for the exact path, from one
+    streamed pass over its row groups in bounded memory:
+      - event count, self-loops and total weight exactly; unique nodes,
+        sources, targets, edges and self-loop edges by HyperLogLog,
+      - t10/t50/t90 from a quantile sketch of event times; peak, half-life and
+        early growth from exact fine-bin counts taken from the window start,
+      - in / out strength distributions from the Count-Min top-k vertices
+        (the heavy head, nearly exact) and a hash sample of the other vertices
+        (the tail, scaled by 1 / rate),
+      - approx_* keys with the error bound of each estimate.
+    Adoption-curve times (nodes_/src_/dst_t*) and the graph algorithms need
+    per-vertex or per-edge state and are left NaN / not computed; variants
+    other than base are skipped.
+    """
+    H = 3600.0 * 1e9
+    pref = "base__"
+    start_ns, end_ns = int(pd.Timestamp(start_ts).value), int(pd.Timestamp(end_ts).value)
+    out: Dict[str, Any] = {"approx": True, "variants": "base"}
+
+    hll = {r: HyperLogLog(args.hll_p) for r in ("nodes", "src", "dst", "edges", "self_loops")}
+    top = {side: CountMinTopK(cudf, args.cms_width, args.cms_depth, args.sketch_topk) for side in ("in", "out")}
+    times = QuantileSketch(args.quantile_alpha)
+    sample = NodeSample(cudf, args.node_sample_cap)
+    widths = [diff_bin_ns(args.diff_bin)] + [w for _, w in profile_bins(args.profile_bins)]
+    fine = math.gcd(*widths)
+    counts = np.zeros((end_ns - start_ns) // fine + 1, dtype="int64")
+
+    n_events = n_loops = 0
+    t_min, t_max = None, None
+    io_stats: Dict[str, Any] = {}
+    for ev in iter_window_row_groups(cudf, args, company, start_ts, end_ts, catalog, io_stats):
+        n_events += int(len(ev))
+        ts = cp.asarray(ts_series_ns(ev["ts"]).values) - start_ns
+        lo, hi = int(ts.min()), int(ts.max())
+        t_min = lo if t_min is None else min(t_min, lo)
+        t_max = hi if t_max is None else max(t_max, hi)
+        times.add(ts)
+        c = cp.bincount(ts // fine, minlength=len(counts))
+        counts += c if isinstance(c, np.ndarray) else c.get()
+
+        if args.drop_self_loops:
+            loop = ev["src"] == ev["dst"]
+            n = int(loop.sum())
+            if n:
+                n_loops += n
+                hll["self_loops"].add(hash_labels(ev["src"][loop]))
+                ev = ev[~loop]
+        hs, hd = hash_labels(ev["src"]), hash_labels(ev["dst"])
+        for key, h in (("nodes", hs), ("nodes", hd), ("src", hs), ("dst", hd)):
+            hll[key].add(h)
+        hll["edges"].add(splitmix64(hs ^ ((hd << cp.uint64(1)) | (hd >> cp.uint64(63)))))  # ordered pair
+        w = cp.ones(len(hs), dtype="float64")
+        top["in"].add(hd, ev["dst"], w)
+        top["out"].add(hs, ev["src"], w)
+        sample.add(hs, hd, w)
+
+    out["n_retweet_events"] = n_events
+    out.update(io_stats)
+    if n_events == 0:
+        return out
+    total = float(n_events - n_loops)
+    n_nodes = hll["nodes"].estimate()
+    out["n_self_loops_removed"] = int(round(hll["self_loops"].estimate())) if n_loops else 0
+    out["approx_n_sources"] = hll["src"].estimate()
+    out["approx_n_targets"] = hll["dst"].estimate()
+    out[pref + "n_nodes"] = int(round(n_nodes))
+    out[pref + "edges_unique"] = int(round(hll["edges"].estimate()))
+    out[pref + "total_weight"] = total
+    out[pref + "density"] = out[pref + "edges_unique"] / (n_nodes * (n_nodes - 1)) if n_nodes > 1 else float("nan")
+
+    # diffusion: quantiles of (ts - window start), shifted to the first event
+    for frac, name in ((0.10, "t10"), (0.50, "t50"), (0.90, "t90")):
+        out[f"{name}_hours"] = (times.quantile(frac) - t_min) / H
+        for role in ADOPTION_ROLES:
+            out[f"{role}_{name}_hours"] = float("nan")
+    nz = np.flatnonzero(counts)
+    prof = DiffusionProfile(nz - t_min // fine, counts[nz], fine)
+    base = prof.metrics_at(widths[0], args.growth_window_hours)
+    for k in ("time_to_peak_hours", "post_peak_half_life_hours", "early_log_cum_events_slope"):
+        out[k] = base[k]
+    for suffix, w in profile_bins(args.profile_bins):
+        out.update({f"{k}_{suffix}": v for k, v in prof.metrics_at(w, args.growth_window_hours).items()})
+
+    if sample.table is None:  # only self-loops
+        return out
+
+    # strengths: the top-k vertices by their Count-Min estimates, plus the sampled
+    # vertices outside them, each standing for 1 / rate vertices
+    names = user_names(cudf, args.user_dict) if args.save_node_tables and args.user_dict else None
+    tables = []
+    smp = _to_host(sample.table)
+    for side in ("in", "out"):
+        t = _to_host(top[side].top)
+        tail = smp[~smp["h"].isin(t["h"])]
+        x = np.concatenate([t["est"].to_numpy(), tail[f"{side}_s"].to_numpy()])
+        w = np.concatenate([np.ones(len(t)), np.full(len(tail), 1.0 / sample.rate)])
+        out.update({pref + k: v for k, v in weighted_distribution(x, w, side).items()})
+        out[pref + f"{side}_zero_share"] = float(w[x == 0].sum() / w.sum())
+        out[pref + f"{side}_topk_share"] = float(t["est"].sum()) / total if total else float("nan")
+        if args.save_node_tables:
+            tt = top[side].top
+            label = tt["label"] if names is None else names.take(tt["label"].values).reset_index(drop=True)
+            tab = cudf.DataFrame({"vertex": label, "strength_est": tt["est"]})
+            tab.insert(0, "side", side)
+            tables.append(tab)
+    if tables:
+        cudf.concat(tables, ignore_index=True).to_parquet(os.path.join(outdir, "base_topk_strength.parquet"), index=False)
+
+    # error bounds
+    n_s = int(len(sample.table))
+    out["approx_hll_rse"] = hll["nodes"].rse
+    out["approx_cms_eps"] = top["in"].eps  # additive error / total weight of a top-k strength
+    out["approx_cms_delta"] = top["in"].delta
+    out["approx_topk"] = args.sketch_topk
+    out["approx_quantile_rel_err"] = times.alpha
+    out["approx_t_hours_err"] = times.alpha * t_max / H  # bound on t10/t50/t90
+    out["approx_bin_align_hours"] = fine / H  # profile bins start at the window start, not the first event
+    out["approx_node_sample_rate"] = sample.rate
+    out["approx_node_sample_n"] = n_s
+    out["approx_strength_rank_err"] = math.sqrt(math.log(2.0 / 0.05) / (2.0 * max(1, n_s)))  # DKW, 95%
+    out["approx_sketch_mb"] = (sum(h.m for h in hll.values()) + sum(t.table.nbytes for t in top.values())
+                               + times.counts.nbytes + counts.nbytes + n_s * 24) / 2**20
+    skipped = [v.strip() for v in args.variants.split(",") if v.strip() and v.strip() != "base"]
+    out["approx_skipped_variants"] = ",".join(skipped)
+    return out
+
+
+def sketch_mode_estimate(args, company, start_str, end_str, catalog=None) -> float:
+    """Estimated events of a window above --approx-above (it then runs in sketch mode), else 0."""
+    if args.approx_above <= 0:
+        return 0.0
+    start_ts = pd.Timestamp(start_str)
+    end_ts = normalize_end_of_day_cudf(None, pd.Timestamp(end_str))
+    plan = window_read_plan(args.parquet_root, company, start_ts, end_ts, args.timestamp_col, [], catalog)
+    est = float(plan["est_rows"]) if plan is not None else 0.0
+    return est if est > args.approx_above else 0.0
+
+
+# ----------------------------
+# Per-window compute
+# ----------------------------
+def load_window(cudf, args, company, start_str, end_str, catalog=None, cache=None):
+    """Read and filter one window's events; returns (df, io_stats) with the read time in io_read_s."""
+    t0 = time.time()
+    start_ts = cudf.to_datetime(start_str)
+    end_ts = normalize_end_of_day_cudf(cudf, cudf.to_datetime(end_str))
+    io_stats: Dict[str, Any] = {}
+    df = read_window_parquet(
+        cudf, args.parquet_root, company, start_ts, end_ts, args.timestamp_col,
+        columns=[args.src_col, args.dst_col, args.timestamp_col],
+        reader=args.reader,
+        io_stats=io_stats,
+        catalog=catalog,
+        cache=cache,
+    )
+    io_stats["io_read_s"] = round(time.time() - t0, 4)
+    return df, io_stats
 
+
+def compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_id, stop_flag,
+                       catalog=None, cache=None, rolling=None, sink=None, manifest=None, prefetched=None,
+                       budget=None, warm=None):
+    window_id, outdir = window_paths(args, company, start_str, end_str, window_id)
     summary_path = os.path.join(outdir, "summary.json")
-    errors_path = os.path.join(outdir, "errors.json")
-    validation_path = os.path.join(outdir, "validation.json")
 
-    if args.skip_existing and os.path.exists(summary_path):
+    if sink is None and args.skip_existing and not args.retry_failed and os.path.exists(summary_path):
         return
+    if sink is None or args.save_node_tables:
+        os.makedirs(outdir, exist_ok=True)
 
     summary: Dict[str, Any] = {
         "company": company,
@@ -858,12 +2794,34 @@ def compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_
     }
     errors: Dict[str, str] = {}
     validations = []
+    boot = BootstrapCI.from_args(args)
+    if boot is not None:
+        summary.update(boot.info())
 
     try:
         start_ts = cudf.to_datetime(start_str)
         end_ts = normalize_end_of_day_cudf(cudf, cudf.to_datetime(end_str))
 
-        df = read_window_parquet(cudf, args.parquet_root, company, start_ts, end_ts, args.timestamp_col)
+        # very large windows: one streamed pass of sketches instead of the exact path
+        est = sketch_mode_estimate(args, company, start_str, end_str, catalog)
+        if est:
+            summary["approx_events_estimate"] = est
+            with stage("sketch"):
+                summary.update(sketch_window_metrics(cudf, args, company, start_ts, end_ts, outdir, catalog))
+            if summary["n_retweet_events"] == 0:
+                raise RuntimeError("No events found in window.")
+            with stage("write"):
+                emit_window(args, sink, outdir, summary, errors, validations, manifest)
+            return
+
+        with stage("read"):
+            if prefetched is None:
+                df, io_stats = load_window(cudf, args, company, start_str, end_str, catalog=catalog, cache=cache)
+            else:
+                df, io_stats, err = prefetched
+                if err is not None:
+                    raise err
+        summary.update(io_stats)
         if df is None or len(df) == 0:
             summary["n_retweet_events"] = 0
             raise RuntimeError("No events found in window.")
@@ -877,48 +2835,75 @@ def compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_
         summary["n_retweet_events"] = int(len(events))
 
         # diffusion / speed metrics
-        summary.update(diffusion_metrics(cudf, events, args.diff_bin, args.growth_window_hours))
+        with stage("diffusion"):
+            curves = {} if args.export_adoption_curves else None
+            summary.update(diffusion_metrics(cudf, events, args.diff_bin, args.growth_window_hours, curves=curves,
+                                             profile=profile_bins(args.profile_bins)))
+            if curves:
+                os.makedirs(outdir, exist_ok=True)
+                save_adoption_curves(os.path.join(outdir, "adoption_curves.npz"),
+                                     {k: v for k, v in curves.items() if k not in ("bin_ns", "t0_ns")},
+                                     curves["bin_ns"], curves["t0_ns"])
 
         # weighted edges
-        edges_base, n_self = build_weighted_edges(events, args.drop_self_loops)
-        summary["n_self_loops_removed"] = int(n_self)
+        with stage("edges"):
+            if rolling is not None:
+                edges_all, mode = rolling.update(events, company, start_ts, end_ts)
+                summary["rolling_mode"] = mode
+                edges_base, n_self = drop_edge_self_loops(edges_all, args.drop_self_loops)
+            else:
+                edges_base, n_self = build_weighted_edges(cudf, events, args.drop_self_loops)
+            summary["n_self_loops_removed"] = int(n_self)
 
         # edge weight stats
-        try:
-            w = edges_base["weight"].astype("float64")
-            summary.update(stats_pack_cudf(w, "edge_w"))
-            summary.update(conc_pack_cudf(cudf, w, "edge_w"))
-        except Exception as ex:
-            errors["edge_weight_stats"] = repr(ex)
+        with stage("edge_stats"):
+            try:
+                w = edges_base["weight"].astype("float64")
+                summary.update(DistributionSummary(w).pack("edge_w"))
+            except Exception as ex:
+                errors["edge_weight_stats"] = repr(ex)
 
-        # save base edges
-        edges_base.to_parquet(os.path.join(outdir, "weighted_edges.parquet"), index=False)
+        # save base edges (with the parquet sink only alongside node tables)
+        with stage("write_edges"):
+            if sink is None or args.save_node_tables:
+                edges_base.to_parquet(os.path.join(outdir, "weighted_edges.parquet"), index=False)
 
         variants = [v.strip() for v in args.variants.split(",") if v.strip()]
         if "base" not in variants:
             variants = ["base"] + variants
 
+        # factorize once; variants are reweightings / edge masks over this structure
+        with stage("graph_build"):
+            names = user_names(cudf, args.user_dict) if args.save_node_tables and args.user_dict else None
+            base_graph = WindowGraph.from_edges(cudf, cugraph, edges_base, names)
+        topo_memo: Dict[Any, Any] = {}
+
         for vname in variants:
             if args.fail_fast_global and stop_flag.is_set():
                 break
 
-            evar = apply_variant(edges_base, vname)
-
             # Compute variant graph metrics (dominance, fragmentation, echo chambers, influence)
-            vm = compute_variant_metrics(
-                cudf=cudf,
-                cugraph=cugraph,
-                edges_label=evar.rename(columns={"src":"src","dst":"dst","weight":"weight"}),
-                variant_name=vname,
-                outdir=outdir,
-                save_node_tables=args.save_node_tables,
-                extra_centrality=args.extra_centrality,
-                errors=errors,
-            )
-            summary.update(vm)
-
-            ok, rep = validate_variant(summary, vname, args.validation_tol)
-            validations.append(rep)
+            with stage(vname):
+                vm = compute_variant_metrics(
+                    cudf=cudf,
+                    cugraph=cugraph,
+                    wg=variant_graph(base_graph, vname),
+                    variant_name=vname,
+                    outdir=outdir,
+                    save_node_tables=args.save_node_tables,
+                    extra_centrality=args.extra_centrality,
+                    errors=errors,
+                    topo_memo=topo_memo,
+                    budget=budget,
+                    warm=warm,
+                    company=company,
+                    boot=boot,
+                    window_id=window_id,
+                )
+                summary.update(vm)
+
+                ok, rep = validate_variant(summary, vname, args.validation_tol)
+                validations.append(rep)
 
             if vname == "base":
                 summary["base_validation_ok"] = bool(ok)
@@ -931,39 +2916,736 @@ def compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_
                         stop_flag.set()
                         break
 
-        with open(summary_path, "w") as f:
-            json.dump(summary, f, indent=2)
-        with open(errors_path, "w") as f:
-            json.dump(errors, f, indent=2)
-        with open(validation_path, "w") as f:
-            json.dump(validations, f, indent=2)
+        with stage("write"):
+            emit_window(args, sink, outdir, summary, errors, validations, manifest)
 
     except Exception as ex:
         errors["fatal"] = f"{repr(ex)}\n{traceback.format_exc()}"
-        with open(summary_path, "w") as f:
-            json.dump(summary, f, indent=2)
-        with open(errors_path, "w") as f:
-            json.dump(errors, f, indent=2)
-        with open(validation_path, "w") as f:
-            json.dump(validations, f, indent=2)
+        emit_window(args, sink, outdir, summary, errors, validations, manifest)
+
+
+# ----------------------------
+# Batched small windows (segmented one-pass metrics)
+# ----------------------------
+def _to_host(df):
+    return df.to_pandas() if hasattr(df, "to_pandas") else df
+
+
+def seg_dist_pack(df, col, prefix, qs=DIST_QS) -> pd.DataFrame:
+    """
+    Segmented DistributionSummary.pack: df has `seg` and `col`; returns a
+    host frame indexed by seg with the same column names the per-window path uses.
+    """
+    return batched_distribution(df[col], df["seg"], prefix, qs)
+
+
+def _seg_kth(d, frac, n_col):
+    """Rows holding the k-th smallest value per seg, k = max(1, ceil(frac * n)); d is seg-sorted with 0-based `r`."""
+    k = np.ceil(frac * d[n_col]).clip(lower=1)
+    return d[d["r"] == (k - 1)]
+
+
+def seg_diffusion(cudf, ev, bin_ns: int, growth_window_hours: float) -> pd.DataFrame:
+    """
+    Segmented diffusion_metrics: ev has seg, src, dst, ts (int64 ns). Returns a host
+    frame indexed by seg with the same keys as the per-window path.
+    """
+    H = 3600.0 * 1e9
+    ev = ev.sort_values(["seg", "ts"])
+    t0 = ev.groupby("seg")["ts"].min().reset_index().rename(columns={"ts": "t0"})
+    ev = ev.merge(t0, on="seg", how="left").sort_values(["seg", "ts"])
+    ev["r"] = ev.groupby("seg").cumcount()
+    ev = ev.merge(ev.groupby("seg").size().reset_index().rename(columns={0: "n"}), on="seg", how="left")
+
+    out = pd.DataFrame(index=_to_host(t0)["seg"].values)
+    for frac, name in ((0.10, "t10"), (0.50, "t50"), (0.90, "t90")):
+        hit = _to_host(_seg_kth(ev, frac, "n")[["seg", "ts", "t0"]]).set_index("seg")
+        out[f"{name}_hours"] = (hit["ts"] - hit["t0"]) / H
+
+    # adoption curves: first appearance per id, k-th first-appearance floored to its bin
+    for role, first in adoption_first_times(cudf, ev[["seg", "src", "dst", "ts"]], keys=["seg"]).items():
+        first = first.merge(t0, on="seg", how="left").sort_values(["seg", "ts"])
+        first["r"] = first.groupby("seg").cumcount()
+        first = first.merge(first.groupby("seg").size().reset_index().rename(columns={0: "n"}), on="seg", how="left")
+        for frac, name in ((0.10, "t10"), (0.50, "t50"), (0.90, "t90")):
+            hit = _to_host(_seg_kth(first, frac, "n")[["seg", "ts", "t0"]]).set_index("seg")
+            out[f"{role}_{name}_hours"] = bin_codes(hit["ts"], bin_ns, hit["t0"]) * bin_ns / H
+
+    # binned event counts: peak, post-peak half-life, early growth
+    ev["b"] = bin_codes(ev["ts"], bin_ns, ev["t0"])
+    binc = ev.groupby(["seg", "b"]).size().reset_index().rename(columns={0: "c"})
+    pk = binc.groupby("seg")["c"].max().reset_index().rename(columns={"c": "pk_c"})
+    binc = binc.merge(pk, on="seg", how="left")
+    peak = binc[binc["c"] == binc["pk_c"]].groupby("seg")["b"].min().reset_index().rename(columns={"b": "pk_b"})
+    binc = binc.merge(peak, on="seg", how="left")
+    pk_b = _to_host(peak).set_index("seg")["pk_b"]
+    out["time_to_peak_hours"] = pk_b * bin_ns / H
+
+    # post-peak half-life: first non-empty bin after the peak with count <= half the peak
+    after = binc[(binc["b"] > binc["pk_b"]) & (binc["c"] <= 0.5 * binc["pk_c"])]
+    half = _to_host(after.groupby("seg")["b"].min())
+    out["post_peak_half_life_hours"] = (half - pk_b.reindex(half.index)) * bin_ns / H
+
+    # early growth: slope of log(cum events) vs hours over the first growth_window_hours
+    binc = binc.sort_values(["seg", "b"])
+    binc["cum"] = binc.groupby("seg")["c"].cumsum().astype("float64")
+    binc["x"] = binc["b"] * bin_ns / H
+    bw = binc[(binc["x"] <= float(growth_window_hours)) & (binc["cum"] > 0)].copy()
+    bw["y"] = np.log(bw["cum"])
+    bw["xy"] = bw["x"] * bw["y"]
+    bw["xx"] = bw["x"] * bw["x"]
+    s = _to_host(bw.groupby("seg").agg({"x": ["count", "sum"], "y": "sum", "xy": "sum", "xx": "sum"}))
+    s.columns = ["n", "sx", "sy", "sxy", "sxx"]
+    xm, ym = s["sx"] / s["n"], s["sy"] / s["n"]
+    cov = s["sxy"] / s["n"] - xm * ym
+    var = s["sxx"] / s["n"] - xm * xm
+    slope = (cov / var).where((s["n"] >= 3) & (var > 0))
+    out["early_log_cum_events_slope"] = slope
+    return out
+
+
+def seg_profile(cudf, ev, profile, growth_window_hours: float) -> pd.DataFrame:
+    """
+    Segmented DiffusionProfile columns: ev has seg, ts (int64 ns). One groupby of
+    fine bin codes (from each segment's first event) on the device, then each
+    segment's profile on the host from its cumulative counts.
+    """
+    fine = math.gcd(*[w for _, w in profile])
+    d = cudf.DataFrame({"seg": ev["seg"], "ts": ev["ts"]})
+    d["b"] = bin_codes(d["ts"], fine, d.groupby("seg")["ts"].transform("min"))
+    vc = _to_host(d.groupby(["seg", "b"]).size().reset_index().rename(columns={0: "c"})).sort_values(["seg", "b"])
+    rows = {}
+    for sid, g in vc.groupby("seg"):
+        prof = DiffusionProfile(g["b"].to_numpy(), g["c"].to_numpy(), fine)
+        row = {}
+        for suffix, w in profile:
+            row.update({f"{k}_{suffix}": v for k, v in prof.metrics_at(w, growth_window_hours).items()})
+        rows[sid] = row
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def seg_variant_pack(cudf, edges, vname, boot=None, seeds=None) -> pd.DataFrame:
+    """
+    Segmented non-graph part of compute_variant_metrics: sizes, strengths,
+    reciprocity, centralization (and bootstrap intervals with a BootstrapCI,
+    seeds[seg] from BootstrapCI.window_seed).
+    """
+    pref = f"{vname}__"
+    nodes = cudf.concat([
+        edges[["seg", "src"]].rename(columns={"src": "v"}),
+        edges[["seg", "dst"]].rename(columns={"dst": "v"}),
+    ], ignore_index=True).drop_duplicates()
+    ins = edges.groupby(["seg", "dst"]).agg({"weight": "sum", "src": "count"}).reset_index().rename(
+        columns={"dst": "v", "weight": "in_strength", "src": "in_deg"})
+    outs = edges.groupby(["seg", "src"]).agg({"weight": "sum", "dst": "count"}).reset_index().rename(
+        columns={"src": "v", "weight": "out_strength", "dst": "out_deg"})
+    deg = nodes.merge(ins, on=["seg", "v"], how="left").merge(outs, on=["seg", "v"], how="left").fillna(0)
+
+    g = _to_host(deg.groupby("seg").agg({"v": "count", "in_strength": "sum", "out_strength": "sum"}))
+    ge = _to_host(edges.groupby("seg").agg({"weight": ["count", "sum"]}))
+    ge.columns = ["m", "tw"]
+    n = g["v"].astype("float64")
+
+    out = pd.DataFrame(index=ge.index)
+    out[pref + "n_nodes"] = n.astype("int64")
+    out[pref + "edges_unique"] = ge["m"].astype("int64")
+    out[pref + "total_weight"] = ge["tw"].astype("float64")
+    out[pref + "density"] = (ge["m"] / (n * (n - 1))).where(n > 1)
+
+    # Freeman centralization on unweighted degrees: sum(max - deg_i) / ((n-1)(n-2))
+    mxs = deg.groupby("seg").agg({"in_deg": "max", "out_deg": "max"}).reset_index().rename(
+        columns={"in_deg": "in_max", "out_deg": "out_max"})
+    mx = deg.merge(mxs, on="seg", how="left")
+    mx["in_gap"] = mx["in_max"] - mx["in_deg"]
+    mx["out_gap"] = mx["out_max"] - mx["out_deg"]
+    mx["in_zero"] = (mx["in_strength"] == 0).astype("float64")
+    mx["out_zero"] = (mx["out_strength"] == 0).astype("float64")
+    gaps = _to_host(mx.groupby("seg").agg({"in_gap": "sum", "out_gap": "sum", "in_zero": "mean", "out_zero": "mean"}))
+    denom = (n - 1) * (n - 2)
+    out[pref + "in_deg_centralization"] = (gaps["in_gap"] / denom).where(n >= 3)
+    out[pref + "out_deg_centralization"] = (gaps["out_gap"] / denom).where(n >= 3)
+    out[pref + "in_zero_share"] = gaps["in_zero"]
+    out[pref + "out_zero_share"] = gaps["out_zero"]
+    out[pref + "check_sum_in_minus_total"] = g["in_strength"] - ge["tw"]
+    out[pref + "check_sum_out_minus_total"] = g["out_strength"] - ge["tw"]
+
+    for side in ("in", "out"):
+        pack = seg_dist_pack(deg, f"{side}_strength", side)
+        out = out.join(pack.add_prefix(pref))
+
+    e = edges[["seg", "src", "dst", "weight"]]
+    rev = e[["seg", "src", "dst"]].rename(columns={"src": "dst", "dst": "src"})
+    mutual = e.merge(rev, on=["seg", "src", "dst"], how="inner")
+    mut = _to_host(mutual.groupby("seg").agg({"weight": ["count", "sum"]}))
+    mut.columns = ["m", "tw"]
+    mut = mut.reindex(out.index).fillna(0)
+    out[pref + "reciprocity"] = (mut["m"] / ge["m"].clip(lower=1)).astype("float64")
+    out[pref + "reciprocity_weighted"] = (mut["tw"] / ge["tw"]).where(ge["tw"] > 0).astype("float64")
+    if boot is not None:
+        out = out.join(boot.segments(edges, nodes, pref + "in", seeds))
+    return out
+
+
+def variant_edges(edges, variant: str):
+    """Label-space variant edge list (batched path; the per-window path derives WindowGraphs)."""
+    if variant == "unweighted":
+        e = edges.copy()
+        e["weight"] = 1
+        return e
+    if variant.startswith("thr"):
+        thr = int(variant.replace("thr", ""))
+        return edges[edges["weight"] >= thr]
+    return edges  # base
+
+
+def window_paths(args, company, start_str, end_str, window_id):
+    if not window_id:
+        window_id = f"{company}_{start_str.replace(':','').replace(' ','T')}_{end_str.replace(':','').replace(' ','T')}"
+    outdir = os.path.join(args.outroot, f"company={company}", window_id)
+    return window_id, outdir
+
+
+def compute_window_batch(cudf, cugraph, args, windows, stop_flag, catalog=None, cache=None, sink=None,
+                         manifest=None, prefetched=None, budget=None, warm=None):
+    """
+    Segmented path for many small windows: read each window, tag rows with a
+    segment id, and compute event counts, diffusion timings, edge weights,
+    per-variant strengths / concentration, reciprocity and degree centralization
+    for all windows with groupby operations in one pass, syncing to the host once.
+    Graph-algorithm metrics (components, PageRank, Louvain, core, triangles, echo
+    chambers) are not computed here; summaries carry batched=True.
+    Windows with more than --batch-small events fall back to compute_one_window,
+    which gets the frame already read here.
+    prefetched, if given, holds one (df, io_stats, err) per window, in order.
+    """
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    if "base" not in variants:
+        variants = ["base"] + variants
+    boot = BootstrapCI.from_args(args)
+
+    frames, meta, fallback = [], [], []
+    for i, (company, start_str, end_str, window_id) in enumerate(windows):
+        window_id, outdir = window_paths(args, company, start_str, end_str, window_id)
+        summary_path = os.path.join(outdir, "summary.json")
+        if sink is None and args.skip_existing and not args.retry_failed and os.path.exists(summary_path):
+            continue
+        summary: Dict[str, Any] = {
+            "company": company,
+            "window_id": window_id,
+            "start_time": start_str,
+            "end_time": end_str,
+            "variants": args.variants,
+            "diff_bin": args.diff_bin,
+            "growth_window_hours": args.growth_window_hours,
+            "batched": True,
+        }
+        if boot is not None:
+            summary.update(boot.info())
+        errors: Dict[str, str] = {}
+        try:
+            if prefetched is None:
+                df, io_stats = load_window(cudf, args, company, start_str, end_str, catalog=catalog, cache=cache)
+            else:
+                df, io_stats, err = prefetched[i]
+                if err is not None:
+                    raise err
+            summary.update(io_stats)
+            n = 0 if df is None else int(len(df))
+            summary["n_retweet_events"] = n
+            if n == 0:
+                raise RuntimeError("No events found in window.")
+            if n > args.batch_small:
+                # already loaded: hand the frame over instead of reading the window again
+                fallback.append((company, start_str, end_str, window_id, (df, io_stats, None)))
+                continue
+            ev = df.rename(columns={args.src_col: "src", args.dst_col: "dst", args.timestamp_col: "ts"})[["src", "dst", "ts"]]
+            ev["seg"] = len(meta)
+            frames.append(ev)
+            meta.append((outdir, summary, errors))
+        except Exception as ex:
+            errors["fatal"] = f"{repr(ex)}\n{traceback.format_exc()}"
+            emit_window(args, sink, outdir, summary, errors, manifest=manifest)
+
+    if frames:
+        try:
+            ev = cudf.concat(frames, ignore_index=True)
+            ev["ts"] = ts_series_ns(ev["ts"])
+            ev["seg"] = ev["seg"].astype("int32")
+            cols = [seg_diffusion(cudf, ev, diff_bin_ns(args.diff_bin), args.growth_window_hours)]
+            if args.profile_bins:
+                cols.append(seg_profile(cudf, ev, profile_bins(args.profile_bins), args.growth_window_hours))
+
+            edges = ev.groupby(["seg", "src", "dst"]).size().reset_index().rename(columns={0: "weight"})
+            self_loops = _to_host(edges[edges["src"] == edges["dst"]].groupby("seg").size())
+            if args.drop_self_loops:
+                edges = edges[edges["src"] != edges["dst"]]
+            cols.append(pd.DataFrame({"n_self_loops_removed": self_loops if args.drop_self_loops else 0},
+                                     index=pd.RangeIndex(len(meta))))
+            cols.append(seg_dist_pack(edges, "weight", "edge_w"))
+            seeds = [boot.window_seed(sm["company"], sm["window_id"]) for _, sm, _ in meta] if boot else None
+            for vname in variants:
+                cols.append(seg_variant_pack(cudf, variant_edges(edges, vname), vname, boot, seeds))
+
+            table = pd.DataFrame(index=pd.RangeIndex(len(meta)))
+            for c in cols:
+                table = table.join(c)
+            table["n_self_loops_removed"] = table["n_self_loops_removed"].fillna(0).astype("int64")
+        except Exception as ex:
+            table = None
+            msg = f"{repr(ex)}\n{traceback.format_exc()}"
+
+        for seg, (outdir, summary, errors) in enumerate(meta):
+            if table is None:
+                errors["fatal"] = msg
+            else:
+                row = table.loc[seg]
+                summary.update({k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()})
+                for vname in variants:
+                    ok, _ = validate_variant(summary, vname, args.validation_tol)
+                    if vname == "base":
+                        summary["base_validation_ok"] = bool(ok)
+            emit_window(args, sink, outdir, summary, errors, manifest=manifest)
+
+    for company, start_str, end_str, window_id, loaded in fallback:
+        compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_id, stop_flag,
+                           catalog=catalog, cache=cache, sink=sink, manifest=manifest, prefetched=loaded,
+                           budget=budget, warm=warm)
+
+
+# ----------------------------
+# Scheduling
+# ----------------------------
+def read_windows(args):
+    tasks = []
+    with open(args.windows_file, newline="") as f:
+        r = csv.DictReader(f)
+        for row in r:
+            company = row["company"].strip()
+            start_str = row["start"].strip()
+            end_str = row["end"].strip()
+            window_id = row.get("window_id", "").strip()
+
+            tasks.append((company, start_str, end_str, window_id))
+            if args.max_tasks and len(tasks) >= args.max_tasks:
+                break
+    return tasks
+
+
+def estimate_window_cost(catalog, company, start_str, end_str) -> float:
+    """Estimated event count of a window from catalog row-group statistics (0 if unknown)."""
+    if catalog is None:
+        return 0.0
+    start_ts = pd.Timestamp(start_str)
+    end_ts = normalize_end_of_day_cudf(None, pd.Timestamp(end_str))
+    return float(catalog.estimate_rows(company, start_ts, end_ts))
+
+
+def group_small_windows(tasks, task_cost, batch_small, batch_size):
+    """Singleton units for large windows; small ones (estimate <= batch_small) in batches of batch_size, by company."""
+    small = sorted([t for t in tasks if task_cost[t] <= batch_small], key=lambda t: (t[0], t[1]))
+    units = [(t,) for t in tasks if task_cost[t] > batch_small]
+    for i in range(0, len(small), max(1, batch_size)):
+        units.append(tuple(small[i:i + max(1, batch_size)]))
+    return units
+
+
+def is_batch_unit(args, unit) -> bool:
+    return args.batch_small > 0 and not args.rolling and len(unit) > 1
+
+
+class WindowScheduler:
+    """
+    Longest-processing-time-first dispatch with company affinity and memory gating.
+
+    A unit is a tuple of windows of one company (a single window, or a rolling
+    series that must run in order on one worker). Workers ask for work when idle,
+    reporting their free device memory. A worker is offered the largest pending
+    unit of the company it ran last (its cached partitions are warm) if that unit
+    is at least `affinity_slack` times the largest pending unit overall; otherwise
+    the largest pending unit. A unit whose estimated footprint exceeds the
+    worker's free memory is passed over when another worker has reported more
+    free memory, so it lands on the roomiest device; an idle worker is never left
+    without work if any remains.
+    """
+
+    def __init__(self, units, costs, bytes_per_event, affinity_slack=0.5, lpt=True):
+        self.bytes_per_event = float(bytes_per_event)
+        self.affinity_slack = float(affinity_slack)
+        order = range(len(units))
+        if lpt:
+            order = sorted(order, key=lambda i: -costs[i])
+        # pending lists are kept largest-first (or in file order for fifo); items are (cost, company, unit)
+        self.pending = [(costs[i], units[i][0][0], units[i]) for i in order]
+        self.by_company: Dict[str, list] = {}
+        for item in self.pending:
+            self.by_company.setdefault(item[1], []).append(item)
+        self.last_company: Dict[int, str] = {}
+        self.free_mem: Dict[int, Optional[int]] = {}
+        self.use_affinity = lpt
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _fits(self, cost, free):
+        return free is None or cost * self.bytes_per_event <= free
+
+    def next_for(self, worker_id, free_bytes=None):
+        self.free_mem[worker_id] = free_bytes
+        if not self.pending:
+            return None
+
+        candidates = []
+        comp = self.last_company.get(worker_id)
+        if self.use_affinity and self.by_company.get(comp):
+            head = self.by_company[comp][0]
+            if head[0] >= self.affinity_slack * self.pending[0][0]:
+                candidates.append(head)
+        candidates.extend(self.pending)
+
+        roomiest = max([f for f in self.free_mem.values() if f is not None], default=None)
+        pick = None
+        for item in candidates:
+            if self._fits(item[0], free_bytes):
+                pick = item
+                break
+            # oversized: leave it for a worker with more free memory, if there is one
+            if free_bytes is None or roomiest is None or roomiest <= free_bytes:
+                pick = item
+                break
+        if pick is None:
+            pick = self.pending[0]
+
+        self.pending.remove(pick)
+        self.by_company[pick[1]].remove(pick)
+        self.last_company[worker_id] = pick[1]
+        return pick[2]
+
+
+def run_log(args, record: Dict[str, Any]):
+    """Append one JSON line to <outroot>/run_log.jsonl (shared by all workers)."""
+    record = {"time": datetime.now().isoformat(timespec="seconds"), **record}
+    with open(os.path.join(args.outroot, "run_log.jsonl"), "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def device_free_bytes() -> Optional[int]:
+    try:
+        return int(cp.cuda.runtime.memGetInfo()[0])
+    except Exception:
+        return None
+
+
+# ----------------------------
+# Prefetch: read the next windows while the current one computes
+# ----------------------------
+def frame_nbytes(df) -> int:
+    if df is None:
+        return 0
+    try:
+        return int(df.memory_usage(deep=True).sum())
+    except Exception:
+        return 0
+
+
+class WindowPrefetcher:
+    """
+    Background thread that takes leases from the dispatcher and reads their
+    windows ahead of the compute loop, so parquet I/O and decode overlap with
+    metrics. At most `depth` windows are read ahead of the one computing, and no
+    new window is started while the read-ahead frames hold `cap_bytes` or more
+    (one window is always allowed). A new lease is only requested once a slot
+    for its first window is free, so a worker holds at most the computing lease
+    plus what is being read ahead.
+
+    The stream handed to the compute loop is ("lease", (unit, degraded) | None)
+    followed by one ("window", (df, io_stats, err)) per window of the unit.
+    Waits are accumulated: wait_data_s (compute waiting on I/O) against
+    wait_space_s (reads waiting on compute) tells which side bounds the run.
+    """
+
+    def __init__(self, cudf, args, gpu_id, q, send, catalog=None, cache=None):
+        self.cudf, self.args, self.gpu_id, self.q, self.send = cudf, args, gpu_id, q, send
+        self.catalog, self.cache = catalog, cache
+        self.depth = max(1, int(args.prefetch_depth))
+        self.cap_bytes = args.prefetch_mb * 1024 * 1024 if args.prefetch_mb > 0 else float("inf")
+        self.buf = queue.Queue()
+        self.cv = threading.Condition()
+        self.n_ahead = 0
+        self.bytes_ahead = 0
+        self.stats = {"read_s": 0.0, "wait_data_s": 0.0, "wait_space_s": 0.0, "windows": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _reserve(self):
+        t0 = time.time()
+        with self.cv:
+            while self.n_ahead >= self.depth or (self.n_ahead > 0 and self.bytes_ahead >= self.cap_bytes):
+                self.cv.wait()
+            self.n_ahead += 1
+        self.stats["wait_space_s"] += time.time() - t0
+
+    def _run(self):
+        while True:
+            self._reserve()
+            self.send(("ready", self.gpu_id, device_free_bytes()))
+            lease = self.q.get()
+            if lease is None:
+                with self.cv:
+                    self.n_ahead -= 1
+                self.buf.put(("lease", None))
+                return
+            self.buf.put(("lease", lease))
+            for i, (company, start_str, end_str, _) in enumerate(lease[0]):
+                if i:
+                    self._reserve()
+                try:
+                    if sketch_mode_estimate(self.args, company, start_str, end_str, self.catalog):
+                        self.buf.put(("window", (None, {}, None), 0))  # streamed by compute_one_window
+                        continue
+                    with stage("prefetch_read", company=company):
+                        df, io_stats = load_window(self.cudf, self.args, company, start_str, end_str,
+                                                   catalog=self.catalog, cache=self.cache)
+                    item = (df, io_stats, None)
+                except Exception as ex:
+                    item, io_stats = (None, {}, ex), {}
+                self.stats["read_s"] += io_stats.get("io_read_s", 0.0)
+                nbytes = frame_nbytes(item[0])
+                with self.cv:
+                    self.bytes_ahead += nbytes
+                self.buf.put(("window", item, nbytes))
+
+    def next_lease(self):
+        t0 = time.time()
+        _, lease = self.buf.get()
+        self.stats["wait_data_s"] += time.time() - t0
+        return lease
+
+    def next_window(self):
+        t0 = time.time()
+        _, item, nbytes = self.buf.get()
+        wait = time.time() - t0
+        self.stats["wait_data_s"] += wait
+        self.stats["windows"] += 1
+        with self.cv:
+            self.n_ahead -= 1
+            self.bytes_ahead -= nbytes
+            self.cv.notify_all()
+        item[1]["io_wait_s"] = round(wait, 4)
+        return item
+
+    def summary(self) -> Dict[str, Any]:
+        s = {k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.stats.items()}
+        s["bound"] = "io" if s["wait_data_s"] > s["wait_space_s"] else "compute"
+        return s
+
+
+# ----------------------------
+# Stage profiling (--profile)
+# ----------------------------
+class StageProfiler:
+    """
+    Per-process recorder of named stage spans: wall time, host RSS and device
+    memory in use at the end of the stage (when a device exists). Spans nest per
+    thread and are named by their path ("base/topology/wcc"). Events are
+    streamed to a Chrome trace-event JSON file (open in chrome://tracing or
+    Perfetto), one event per line so a crashed worker's trace stays readable.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.f = open(path, "w")
+        self.f.write("[")
+        self.n = 0
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.native_id = threading.get_native_id
+        self.page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def _rss_mb(self) -> Optional[float]:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self.page / 2**20
+        except Exception:
+            return None
+
+    def _device_used_mb(self) -> Optional[float]:
+        try:
+            cp.cuda.runtime.deviceSynchronize()  # attribute queued kernels to this stage
+            free, total = cp.cuda.runtime.memGetInfo()
+            return (total - free) / 2**20
+        except Exception:
+            return None
+
+    @contextmanager
+    def span(self, name, push=True, **fields):
+        stack = self._stack()
+        full = "/".join(stack + [name]) if push else name
+        if push:
+            stack.append(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            dev = self._device_used_mb()
+            end = time.time()
+            if push:
+                stack.pop()
+            ev_args = {"rss_mb": self._rss_mb(), "device_used_mb": dev, **fields}
+            event = {"name": full, "cat": "stage", "ph": "X", "ts": round(start * 1e6, 1),
+                     "dur": round((end - start) * 1e6, 1), "pid": self.pid,
+                     "tid": self.native_id(), "args": ev_args}
+            with self.lock:
+                self.f.write(("\n" if self.n == 0 else ",\n") + json.dumps(event))
+                self.n += 1
+                self.f.flush()
+
+    def close(self):
+        with self.lock:
+            self.f.write("\n]\n")
+            self.f.close()
+
+
+_PROFILER: Optional[StageProfiler] = None
+
+
+def start_profiler(args, name):
+    global _PROFILER
+    if args.profile:
+        _PROFILER = StageProfiler(os.path.join(args.outroot, "profile", f"trace-{name}.json"))
+    return _PROFILER
+
+
+def stage(name, push=True, **fields):
+    """Profiling span for `name` (no-op unless --profile)."""
+    return _PROFILER.span(name, push, **fields) if _PROFILER is not None else nullcontext()
+
+
+def profile_rollup(args, traces="trace-*.json", out_name="stage_rollup.csv"):
+    """
+    Read the worker traces under <outroot>/profile/ and write stage_rollup.csv:
+    per stage count, total seconds, p50 / p95 / max milliseconds and peak RSS /
+    device memory seen at the end of the stage.
+    """
+    rows: Dict[str, Dict[str, list]] = {}
+    for path in glob.glob(os.path.join(args.outroot, "profile", traces)):
+        with open(path) as f:
+            for line in f:
+                line = line.strip().strip(",")
+                if not line.startswith("{"):
+                    continue
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed worker
+                r = rows.setdefault(ev["name"], {"dur": [], "rss": [], "dev": []})
+                r["dur"].append(ev["dur"] / 1000.0)
+                r["rss"].append(ev["args"].get("rss_mb") or 0.0)
+                r["dev"].append(ev["args"].get("device_used_mb") or 0.0)
+    table = []
+    for name, r in rows.items():
+        d = np.asarray(r["dur"])
+        table.append({"stage": name, "count": len(d), "total_s": d.sum() / 1000.0,
+                      "p50_ms": float(np.percentile(d, 50)), "p95_ms": float(np.percentile(d, 95)),
+                      "max_ms": float(d.max()), "max_rss_mb": max(r["rss"]), "max_device_used_mb": max(r["dev"])})
+    out = pd.DataFrame(table, columns=["stage", "count", "total_s", "p50_ms", "p95_ms", "max_ms",
+                                       "max_rss_mb", "max_device_used_mb"]).sort_values("total_s", ascending=False)
+    out.to_csv(os.path.join(args.outroot, "profile", out_name), index=False)
+    return out
 
 
 # ----------------------------
 # Worker
 # ----------------------------
-def worker_main(gpu_id, q, args, stop_flag):
-    os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
-    import cudf  # noqa
-    import cugraph  # noqa
+def degraded_args(args):
+    """Profile for retrying a unit after its worker died or timed out: no extra centrality, no node tables."""
+    d = argparse.Namespace(**vars(args))
+    d.extra_centrality = False
+    d.save_node_tables = False
+    return d
+
+
+def record_lost_windows(args, unit, reason, sink, manifest):
+    """Write a failed result for every window of a unit that exhausted its retries."""
+    for company, start_str, end_str, window_id in unit:
+        window_id, outdir = window_paths(args, company, start_str, end_str, window_id)
+        summary = {"company": company, "window_id": window_id, "start_time": start_str, "end_time": end_str}
+        emit_window(args, sink, outdir, summary, {"fatal": reason}, manifest=manifest)
+
+
+def worker_main(gpu_id, q, ready, args, stop_flag, results_q=None):
+    if args.backend == "gpu":
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
+    cudf, cugraph = load_backend(args.backend)
+
+    catalog = None
+    if args.catalog_mode != "off":
+        catalog = PartitionCatalog.load(args.catalog, args.parquet_root, args.timestamp_col)
+    cache = None
+    if args.partition_cache_mb > 0:
+        cache = MonthCache(cudf, args.partition_cache_mb * 1024 * 1024, args.partition_cache_location)
+    rolling = RollingEdges(cudf, args.rolling_step) if args.rolling else None
+    budget = MetricBudget.from_args(args)
+    warm = PageRankWarmStart(cudf) if args.pagerank_warm_start == "on" else None
+    manifest = open_manifest(args, f"worker-{gpu_id}-{os.getpid()}") if results_q is None else None
+    profiler = start_profiler(args, f"worker{gpu_id}-{os.getpid()}")
+
+    # ready/ack messages go over one pipe; the prefetch thread and this loop both send
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            ready.send(msg)
+
+    prefetch = None
+    if args.prefetch_depth > 0:
+        prefetch = WindowPrefetcher(cudf, args, gpu_id, q, send, catalog=catalog, cache=cache)
 
     while True:
         if args.fail_fast_global and stop_flag.is_set():
             break
-        task = q.get()
-        if task is None:
+        if prefetch is not None:
+            lease = prefetch.next_lease()
+        else:
+            send(("ready", gpu_id, device_free_bytes()))
+            lease = q.get()
+        if lease is None:
             break
-        company, start_str, end_str, window_id = task
-        compute_one_window(cudf, cugraph, args, company, start_str, end_str, window_id, stop_flag)
+        unit, degraded = lease
+        wargs = degraded_args(args) if degraded else args
+        if is_batch_unit(wargs, unit):
+            loaded = [prefetch.next_window() for _ in unit] if prefetch is not None else None
+            with stage("batch", push=False, company=unit[0][0], windows=len(unit)):
+                compute_window_batch(cudf, cugraph, wargs, unit, stop_flag, catalog=catalog, cache=cache,
+                                     sink=results_q, manifest=manifest, prefetched=loaded, budget=budget, warm=warm)
+        else:
+            for company, start_str, end_str, window_id in unit:
+                loaded = prefetch.next_window() if prefetch is not None else None
+                with stage("window", push=False, company=company, window_id=window_id):
+                    compute_one_window(cudf, cugraph, wargs, company, start_str, end_str, window_id, stop_flag,
+                                       catalog=catalog, cache=cache, rolling=rolling, sink=results_q,
+                                       manifest=manifest, prefetched=loaded, budget=budget, warm=warm)
+                if cache is not None:
+                    run_log(args, {"event": "window_done", "worker": gpu_id, "company": company,
+                                   "window_id": window_id, **cache.stats()})
+        send(("ack", gpu_id))
+
+    if manifest is not None:
+        manifest.close()
+    if profiler is not None:
+        profiler.close()
+    exit_rec: Dict[str, Any] = {"event": "worker_exit", "worker": gpu_id}
+    if cache is not None:
+        exit_rec.update(cache.stats())
+    if prefetch is not None:
+        exit_rec.update({f"prefetch_{k}": v for k, v in prefetch.summary().items()})
+    if len(exit_rec) > 2:
+        run_log(args, exit_rec)
 
 
 # ----------------------------
@@ -973,40 +3655,198 @@ def main():
     args = parse_args()
     os.makedirs(args.outroot, exist_ok=True)
 
+    # build / refresh the partition catalog once; workers load the saved copy
+    catalog = open_catalog(args)
+    if catalog is not None and not args.catalog:
+        args.catalog = os.path.join(args.outroot, "_partition_catalog.json")
+
+    tasks = read_windows(args)
+    if args.skip_existing or args.retry_failed:
+        # resume from the completion manifest before anything is scheduled
+        done, failed = load_manifest(args)
+        keyed = [((t[0], window_paths(args, *t)[0]), t) for t in tasks]
+        if args.retry_failed:
+            tasks = [t for k, t in keyed if k in failed]
+        else:
+            tasks = [t for k, t in keyed if k not in done and k not in failed]
+        print(f"Manifest: {len(done)} done, {len(failed)} failed; {len(tasks)} windows to run")
+    task_cost = {t: estimate_window_cost(catalog, t[0], t[1], t[2]) for t in tasks}
+    if args.rolling:
+        units = group_rolling_series(tasks, args.rolling_chunk)
+    elif args.batch_small > 0:
+        units = group_small_windows(tasks, task_cost, args.batch_small, args.batch_size)
+    else:
+        units = [(t,) for t in tasks]
+    costs = [sum(task_cost[t] for t in u) for u in units]
+    sched = WindowScheduler(units, costs, args.bytes_per_event, args.affinity_slack, lpt=(args.schedule == "lpt"))
+    print(f"Scheduling {len(tasks)} windows in {len(units)} units ({args.schedule}), estimated events: {int(sum(costs))}")
+
     ctx = get_context("spawn")
-    q = ctx.Queue(maxsize=args.queue_max)
     stop_flag = ctx.Event()
 
-    procs = []
-    for gpu_id in range(args.ngpus):
-        p = ctx.Process(target=worker_main, args=(gpu_id, q, args, stop_flag), daemon=True)
+    results_q, writer = None, None
+    if args.results_sink == "parquet":
+        results_q = ctx.Queue(maxsize=args.queue_max)
+        writer = ctx.Process(target=results_writer_main, args=(results_q, args))
+        writer.start()
+
+    manifest = open_manifest(args, f"dispatcher-{os.getpid()}") if results_q is None else None
+
+    # each worker gets its own lease queue and ready pipe, so a worker that dies
+    # mid-write can only wedge channels that are replaced along with it
+    procs, queues, readies = [None] * args.ngpus, [None] * args.ngpus, [None] * args.ngpus
+    worked = set()  # workers whose current process has taken a lease
+
+    def spawn(gpu_id):
+        if procs[gpu_id] is not None:
+            # close the replaced worker's channels (the queue may still hold a lease it never took)
+            readies[gpu_id].close()
+            queues[gpu_id].cancel_join_thread()
+            queues[gpu_id].close()
+            procs[gpu_id].close()
+        worked.discard(gpu_id)
+        q = ctx.Queue(maxsize=args.queue_max)
+        r, w = ctx.Pipe(duplex=False)
+        p = ctx.Process(target=worker_main, args=(gpu_id, q, w, args, stop_flag, results_q), daemon=True)
         p.start()
-        procs.append(p)
-
-    count = 0
-    with open(args.windows_file, newline="") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            company = row["company"].strip()
-            start_str = row["start"].strip()
-            end_str = row["end"].strip()
-            window_id = row.get("window_id", "").strip()
+        w.close()
+        procs[gpu_id], queues[gpu_id], readies[gpu_id] = p, q, r
 
-            q.put((company, start_str, end_str, window_id))
-            count += 1
-            if args.max_tasks and count >= args.max_tasks:
-                break
-            if args.fail_fast_global and stop_flag.is_set():
-                break
-
-    for _ in range(args.ngpus):
-        q.put(None)
+    for gpu_id in range(args.ngpus):
+        spawn(gpu_id)
+
+    # dispatch: lease the next unit to whichever worker reports ready. A worker
+    # may hold several leases (the computing unit plus what it prefetches); the
+    # oldest is retired by its ack, and --task-timeout runs from the moment a
+    # lease becomes the oldest. A worker that dies or overruns is replaced; its
+    # oldest unit is retried in the degraded profile (batches split into single
+    # windows) up to --max-retries times, the others are simply re-queued.
+    leases: Dict[int, list] = {g: [] for g in range(args.ngpus)}
+    attempts: Dict[tuple, int] = {}
+    retry = []
+    stopped = set()
+
+    def lease_deadline(unit):
+        return time.time() + args.task_timeout * len(unit) if args.task_timeout > 0 else 0.0
+
+    def reclaim(gpu_id, why):
+        held, leases[gpu_id] = leases[gpu_id], []
+        unit = held[0][0]
+        retry.extend((u, d) for u, _, d in held[1:])
+        retry_units = [(w,) for w in unit] if is_batch_unit(args, unit) else [unit]
+        for u in retry_units:
+            attempts[u] = attempts.get(u, 0) + 1
+            if attempts[u] <= args.max_retries:
+                retry.append((u, True))
+            else:
+                record_lost_windows(args, u, f"worker {gpu_id} {why}; gave up after {args.max_retries} retries",
+                                    results_q, manifest)
+        run_log(args, {"event": "lease_lost", "worker": gpu_id, "reason": why, "windows": len(unit)})
+
+    def on_ack(gpu_id):
+        held = leases[gpu_id]
+        if held:
+            held.pop(0)
+        if held:
+            held[0][1] = lease_deadline(held[0][0])
+
+    def drain_acks(gpu_id):
+        """Retire the leases a stopped worker acked before it went (its ready requests are dropped)."""
+        conn = readies[gpu_id]
+        try:
+            while conn.poll():
+                msg = conn.recv()
+                if msg[0] == "ack":
+                    on_ack(gpu_id)
+        except (EOFError, OSError):
+            pass
+
+    while any(g not in stopped or leases[g] for g in range(args.ngpus)):
+        now = time.time()
+        for gpu_id, p in enumerate(procs):
+            held = leases[gpu_id]
+            if gpu_id in stopped and not held:
+                continue
+            if held and held[0][1] and now > held[0][1]:
+                why = f"timed out after {args.task_timeout * len(held[0][0]):.0f}s"
+                p.terminate()
+                p.join()
+                drain_acks(gpu_id)
+                if leases[gpu_id]:
+                    reclaim(gpu_id, why)
+                spawn(gpu_id)
+                stopped.discard(gpu_id)
+            elif not p.is_alive():
+                drain_acks(gpu_id)  # it may have acked its last unit just before exiting
+                if p.exitcode == 0 or gpu_id not in worked:
+                    # died before taking any work (e.g. at startup): do not respawn in a
+                    # loop; a clean exit (--fail-fast-global) has finished its unit
+                    leases[gpu_id] = []
+                    stopped.add(gpu_id)
+                    continue
+                if leases[gpu_id]:
+                    reclaim(gpu_id, f"exited with code {p.exitcode}")
+                spawn(gpu_id)
+                stopped.discard(gpu_id)
+
+        live = [readies[g] for g in range(args.ngpus) if g not in stopped or leases[g]]
+        for conn in mp_wait(live, timeout=1.0):
+            try:
+                msg = conn.recv()
+            except EOFError:
+                continue  # worker died; handled by the liveness check above
+            gpu_id = msg[1]
+            held = leases[gpu_id]
+            if msg[0] == "ack":
+                on_ack(gpu_id)
+                continue
+            free_bytes = msg[2]
+            task = None
+            if not (args.fail_fast_global and stop_flag.is_set()):
+                if retry:
+                    task = retry.pop(0)
+                else:
+                    unit = sched.next_for(gpu_id, free_bytes)
+                    task = (unit, False) if unit is not None else None
+            queues[gpu_id].put(task)
+            if task is None:
+                stopped.add(gpu_id)
+                continue
+            held.append([task[0], lease_deadline(task[0]) if not held else 0.0, task[1]])
+            worked.add(gpu_id)
+
+    # every worker stopped with work still queued (e.g. all died at startup):
+    # write those windows off so they are not silently missing from the outputs
+    lost = [u for u, _ in retry] + [item[2] for item in sched.pending]
+    if lost and not (args.fail_fast_global and stop_flag.is_set()):
+        for unit in lost:
+            record_lost_windows(args, unit, "no live worker left to run it", results_q, manifest)
+        run_log(args, {"event": "units_lost", "units": len(lost), "windows": sum(len(u) for u in lost)})
+    else:
+        lost = []
 
     for p in procs:
-        p.join()
-
+        p.join(timeout=60)
+        if p.is_alive():
+            p.terminate()
+
+    if manifest is not None:
+        manifest.close()
+    if writer is not None:
+        results_q.put(None)
+        writer.join()
+
+    if args.profile:
+        rollup = profile_rollup(args)
+        print(f"Stage profile ({len(rollup)} stages) -> {os.path.join(args.outroot, 'profile', 'stage_rollup.csv')}")
+        print(rollup.head(10).to_string(index=False))
+
+    if lost:
+        print(f"FAILED: {sum(len(u) for u in lost)} windows in {len(lost)} units were never run "
+              f"(no live worker left). Outputs under: {args.outroot}")
+        raise SystemExit(1)
     print("DONE. Outputs under:", args.outroot)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
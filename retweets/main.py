@@ -20,6 +20,9 @@ import cugraph
 # EDIT THESE SETTINGS
 # =========================
 INPUT_PATH = "/workspace/retweet_network2017.csv"
+# csv_to_parquet.py output; when set, events are read from it with the integer
+# src_id/dst_id columns and handles are decoded only for the node tables
+PARQUET_ROOT = ""
 OUTDIR = "/workspace/output/network_desc_TSLA"
 
 COMPANY_FILTER = "TSLA"
@@ -99,6 +102,24 @@ def parse_timestamp_dask_safe(col):
     return col.map_partitions(_parse_partition, meta=col._meta.astype("datetime64[ns]"))
 
 
+def read_events_parquet():
+    """src/dst as int32 user ids, ts as datetime, for COMPANY_FILTER."""
+    ddf = dc.read_parquet(
+        os.path.join(PARQUET_ROOT, f"company={COMPANY_FILTER}"),
+        columns=["src_id", "dst_id", "timestamp"],
+    )
+    return ddf.rename(columns={"src_id": "edgeA", "dst_id": "edgeB"})
+
+
+def decode_vertices(df, names, col="vertex"):
+    """Replace user ids in `col` with screen names (node tables only)."""
+    if names is None:
+        return df
+    out = df.merge(names, left_on=col, right_on="user_id", how="left")
+    out[col] = out["screen_name"]
+    return out.drop(columns=["user_id", "screen_name"])
+
+
 def main():
     os.makedirs(OUTDIR, exist_ok=True)
 
@@ -110,22 +131,27 @@ def main():
     client = Client(cluster)
     Comms.initialize(p2p=True)
 
-    ddf = dc.read_csv(
-        INPUT_PATH,
-        header=None,
-        names=COLS,
-        dtype={
-            "company": "str",
-            "edgeA": "str",
-            "edgeB": "str",
-            "year": "int32",
-            "month": "int8",
-            "timestamp": "str",
-        }
-    )
-
-    ddf = ddf[ddf["company"] == COMPANY_FILTER]
-    ddf["timestamp"] = parse_timestamp_dask_safe(ddf["timestamp"])
+    names = None
+    if PARQUET_ROOT:
+        ddf = read_events_parquet()
+        names = cudf.read_parquet(os.path.join(PARQUET_ROOT, "_user_dict.parquet"))
+    else:
+        ddf = dc.read_csv(
+            INPUT_PATH,
+            header=None,
+            names=COLS,
+            dtype={
+                "company": "str",
+                "edgeA": "str",
+                "edgeB": "str",
+                "year": "int32",
+                "month": "int8",
+                "timestamp": "str",
+            }
+        )
+
+        ddf = ddf[ddf["company"] == COMPANY_FILTER]
+        ddf["timestamp"] = parse_timestamp_dask_safe(ddf["timestamp"])
     ddf = ddf.dropna(subset=["edgeA", "edgeB", "timestamp"])
 
     start_ts = pd.Timestamp(START_TIME)
@@ -207,7 +233,7 @@ def main():
         columns={"src": "vertex", "weight": "out_strength"})
     deg = indeg.merge(outdeg, on="vertex", how="outer").fillna(0)
 
-    deg.to_parquet(os.path.join(OUTDIR, "node_strengths.parquet"), index=False)
+    decode_vertices(deg, names).to_parquet(os.path.join(OUTDIR, "node_strengths.parquet"), index=False)
 
     # ---- Concentration measures (FIXED & DGX-safe) ----
     in_s = deg["in_strength"].astype("float64")
@@ -248,7 +274,7 @@ def main():
     # ---- PageRank ----
     try:
         pr = dcg.pagerank(G, weight="weight").compute()
-        pr.to_parquet(os.path.join(OUTDIR, "pagerank.parquet"), index=False)
+        decode_vertices(pr, names).to_parquet(os.path.join(OUTDIR, "pagerank.parquet"), index=False)
         summary["pagerank_gini"] = gini_from_cudf(pr["pagerank"])
         summary["pagerank_top1_share"] = top_share_from_cudf(pr["pagerank"], 0.01)
     except Exception:
@@ -259,7 +285,7 @@ def main():
     try:
         parts, modularity = dcg.louvain(G)
         parts = parts.compute()
-        parts.to_parquet(os.path.join(OUTDIR, "communities.parquet"), index=False)
+        decode_vertices(parts, names).to_parquet(os.path.join(OUTDIR, "communities.parquet"), index=False)
         comm_sizes = parts.groupby("partition").size().astype("float64")
         summary["modularity"] = safe_float(modularity)
         summary["n_communities"] = int(len(comm_sizes))
@@ -275,7 +301,7 @@ def main():
     try:
         core = dcg.core_number(G, directed=False).compute()
         summary["max_core"] = float(core["core_number"].max()) if len(core) else float("nan")
-        core.to_parquet(os.path.join(OUTDIR, "core_number.parquet"), index=False)
+        decode_vertices(core, names).to_parquet(os.path.join(OUTDIR, "core_number.parquet"), index=False)
     except Exception:
         summary["max_core"] = float("nan")
 
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic retweet events in the same layout as csv_to_parquet.py output:
+
+    <out>/company=<C>/year=<Y>/month=<M>/part-00000.parquet   (edgeA, edgeB, timestamp, src_id, dst_id)
+    <out>/_user_dict.parquet                                   (user_id, screen_name)
+
+plus a windows CSV (company,start,end,window_id,tier) for
+dgx_windows_single_gpu_hardened_plus.py and bench_windows.py.
+
+The model is simple, but it has the properties that drive the engine's cost
+and metrics:
+  - skewed company sizes (Zipf over companies),
+  - power-law user activity (who retweets) and popularity (who is retweeted),
+  - bursty timestamps (cascades around a root account with heavy-tailed sizes
+    and durations, on top of a uniform background),
+  - reciprocity (a share of events answer an earlier event in reverse).
+Everything is drawn with NumPy from --seed, so runs are reproducible.
+"""
+
+import os, csv, argparse, time
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+
+    p.add_argument("--out", required=True, help="Parquet root to write (company=/year=/month= layout)")
+    p.add_argument("--windows-out", default="", help="Windows CSV to write (default: <out>/windows.csv)")
+
+    p.add_argument("--companies", type=int, default=8)
+    p.add_argument("--events", type=int, default=2_000_000, help="Total events over all companies")
+    p.add_argument("--start", default="2017-01-01", help="First month (events start on its 1st)")
+    p.add_argument("--months", type=int, default=3)
+    p.add_argument("--seed", type=int, default=7)
+
+    # shape of the data
+    p.add_argument("--company-skew", type=float, default=1.1, help="Zipf exponent of company sizes")
+    p.add_argument("--users", type=int, default=500_000, help="Global user pool shared by all companies")
+    p.add_argument("--users-per-event", type=float, default=0.2, help="Company user pool size / its events")
+    p.add_argument("--activity-alpha", type=float, default=1.0, help="Zipf exponent of retweeter activity")
+    p.add_argument("--popularity-alpha", type=float, default=1.4, help="Zipf exponent of retweeted accounts")
+    p.add_argument("--burst-frac", type=float, default=0.6, help="Share of events inside cascades")
+    p.add_argument("--burst-size", type=float, default=200.0, help="Mean cascade size")
+    p.add_argument("--burst-minutes", type=float, default=45.0, help="Median cascade time scale (lognormal)")
+    p.add_argument("--burst-root-share", type=float, default=0.8, help="Share of cascade events retweeting the root")
+    p.add_argument("--reciprocity", type=float, default=0.05, help="Share of events answering an earlier one")
+    p.add_argument("--self-loop-share", type=float, default=0.002)
+
+    # output
+    p.add_argument("--row-group-rows", type=int, default=1_000_000)
+    p.add_argument("--tiers", default="day,week,month", help="Window tiers written to the windows CSV")
+    p.add_argument("--windows-per-tier", type=int, default=4, help="Per company and tier (0 = all)")
+
+    return p.parse_args(argv)
+
+
+# ----------------------------
+# Sampling helpers
+# ----------------------------
+def zipf_weights(n: int, alpha: float) -> np.ndarray:
+    w = np.arange(1, n + 1, dtype="float64") ** -alpha
+    return w / w.sum()
+
+
+def month_bounds(start: str, months: int) -> List[pd.Timestamp]:
+    s = pd.Timestamp(start).normalize().replace(day=1)
+    return [s + pd.DateOffset(months=i) for i in range(months + 1)]
+
+
+def bursty_times(rng, n: int, t0: int, t1: int, args) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    n timestamps (int64 ns) in [t0, t1) and a cascade id per event (-1 = background).
+    Cascade sizes follow a Pareto law and offsets are exponential with a lognormal
+    per-cascade scale, so a few cascades dominate and most are short.
+    """
+    n_burst = int(round(n * args.burst_frac))
+    n_cascades = max(1, int(n_burst / max(1.0, args.burst_size)))
+    w = rng.pareto(1.5, n_cascades) + 1.0
+    sizes = rng.multinomial(n_burst, w / w.sum())
+    centers = rng.integers(t0, t1, n_cascades)
+    scale_ns = np.exp(rng.normal(np.log(args.burst_minutes * 60e9), 1.0, n_cascades))
+    cid = np.repeat(np.arange(n_cascades), sizes)
+    ts_burst = centers[cid] + (rng.exponential(1.0, n_burst) * scale_ns[cid]).astype("int64")
+    ts = np.concatenate([ts_burst, rng.integers(t0, t1, n - n_burst)])
+    return np.clip(ts, t0, t1 - 1), np.concatenate([cid, np.full(n - n_burst, -1)])
+
+
+def company_events(rng, n: int, t0: int, t1: int, args) -> pd.DataFrame:
+    """edgeA (retweeter), edgeB (retweeted), timestamp for one company, sorted by time."""
+    pool = max(50, min(args.users, int(n * args.users_per_event)))
+    users = rng.choice(args.users, size=pool, replace=False)
+    # activity and popularity ranks are independent permutations of the same pool
+    act = users[rng.permutation(pool)]
+    pop = users[rng.permutation(pool)]
+    p_act = zipf_weights(pool, args.activity_alpha)
+    p_pop = zipf_weights(pool, args.popularity_alpha)
+
+    n_recip = int(round(n * args.reciprocity))
+    n_base = n - n_recip
+    ts, cid = bursty_times(rng, n_base, t0, t1, args)
+    src = act[rng.choice(pool, size=n_base, p=p_act)]
+    dst = pop[rng.choice(pool, size=n_base, p=p_pop)]
+
+    # cascades mostly retweet their root account
+    in_burst = cid >= 0
+    if in_burst.any():
+        roots = pop[rng.choice(pool, size=int(cid.max()) + 1, p=p_pop)]
+        to_root = in_burst & (rng.random(n_base) < args.burst_root_share)
+        dst[to_root] = roots[cid[to_root]]
+
+    # self-loops are rare but present in the real data (and --drop-self-loops counts them)
+    loops = rng.random(n_base) < args.self_loop_share
+    dst[loops] = src[loops]
+
+    # reciprocity: answer an earlier event in reverse, shortly after it
+    if n_recip:
+        j = rng.integers(0, n_base, n_recip)
+        r_ts = np.minimum(ts[j] + (rng.exponential(3600e9, n_recip)).astype("int64"), t1 - 1)
+        src, dst = np.concatenate([src, dst[j]]), np.concatenate([dst, src[j]])
+        ts = np.concatenate([ts, r_ts])
+
+    order = np.argsort(ts, kind="stable")
+    return pd.DataFrame({
+        "edgeA": pd.Series(src[order]).map("u{}".format),
+        "edgeB": pd.Series(dst[order]).map("u{}".format),
+        "timestamp": pd.to_datetime(ts[order] // 10**9, unit="s"),  # second resolution, like the source CSV
+        "src_id": src[order].astype("int32"),
+        "dst_id": dst[order].astype("int32"),
+    })
+
+
+# ----------------------------
+# Output
+# ----------------------------
+def write_month(out_root, company, y, m, df, row_group_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    d = os.path.join(out_root, f"company={company}", f"year={y}", f"month={m}")
+    os.makedirs(d, exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(d, "part-00000.parquet"),
+                   row_group_size=row_group_rows)
+
+
+def write_user_dict(out_root, n_users):
+    """The converter's dictionary: user u<i> has id i."""
+    os.makedirs(out_root, exist_ok=True)
+    ids = np.arange(n_users, dtype="int32")
+    pd.DataFrame({"user_id": ids, "screen_name": pd.Series(ids).map("u{}".format)}).to_parquet(
+        os.path.join(out_root, "_user_dict.parquet"), index=False)
+
+
+def tier_windows(company, tier, lo: pd.Timestamp, hi: pd.Timestamp):
+    """Consecutive [start, end] windows of one tier inside [lo, hi) with day-granular ends."""
+    step = {"day": pd.DateOffset(days=1), "week": pd.DateOffset(weeks=1), "month": pd.DateOffset(months=1)}[tier]
+    s = lo
+    while s + step <= hi:
+        e = s + step - pd.Timedelta(seconds=1)
+        yield (company, s.strftime("%Y-%m-%d %H:%M:%S"), e.strftime("%Y-%m-%d %H:%M:%S"),
+               f"{tier}_{s:%Y%m%d}", tier)
+        s = s + step
+
+
+def write_windows(path, companies, lo, hi, tiers, per_tier, rng):
+    rows = []
+    for company in companies:
+        for tier in tiers:
+            ws = list(tier_windows(company, tier, lo, hi))
+            if per_tier and len(ws) > per_tier:
+                ws = [ws[i] for i in sorted(rng.choice(len(ws), per_tier, replace=False))]
+            rows.extend(ws)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["company", "start", "end", "window_id", "tier"])
+        w.writerows(rows)
+    return len(rows)
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main(argv=None):
+    args = parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    bounds = month_bounds(args.start, args.months)
+    t_all = [b.value for b in bounds]
+
+    companies = [f"C{i:03d}" for i in range(args.companies)]
+    sizes = rng.multinomial(args.events, zipf_weights(args.companies, args.company_skew))
+
+    t_start = time.time()
+    write_user_dict(args.out, args.users)
+    for company, n in zip(companies, sizes):
+        # months get a share of the company's events proportional to their length
+        month_n = rng.multinomial(n, np.diff(t_all) / (t_all[-1] - t_all[0]))
+        for i, k in enumerate(month_n):
+            if k == 0:
+                continue
+            df = company_events(rng, int(k), t_all[i], t_all[i + 1], args)
+            write_month(args.out, company, bounds[i].year, bounds[i].month, df, args.row_group_rows)
+        print(f"{company}: {n} events")
+
+    windows_out = args.windows_out or os.path.join(args.out, "windows.csv")
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip()]
+    n_win = write_windows(windows_out, companies, bounds[0], bounds[-1], tiers, args.windows_per_tier, rng)
+    print(f"Wrote {int(sizes.sum())} events for {len(companies)} companies under {args.out} "
+          f"in {time.time() - t_start:.1f}s; {n_win} windows -> {windows_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BootstrapCI checks on the NumPy backend (python -m pytest retweets/test_bootstrap_ci.py).
+np.repeat is disabled while the engine runs, so the code path is the one CuPy takes.
+"""
+
+import os, sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import dgx_windows_single_gpu_hardened_plus as eng
+
+
+@pytest.fixture
+def no_repeat(monkeypatch):
+    def _fail(*a, **k):
+        raise AssertionError("np.repeat with array counts has no CuPy equivalent")
+    monkeypatch.setattr(np, "repeat", _fail)
+
+
+def _edges(sizes=((300, 120), (50, 40)), seed=1):
+    rng = np.random.default_rng(seed)
+    segs = []
+    for s, (E, V) in enumerate(sizes):
+        segs.append(pd.DataFrame({"seg": s, "src": rng.integers(0, V, E), "dst": rng.zipf(1.6, E) % V,
+                                  "weight": rng.integers(1, 6, E)}))
+    edges = pd.concat(segs).groupby(["seg", "src", "dst"], as_index=False)["weight"].sum()
+    nodes = pd.concat([edges[["seg", "src"]].rename(columns={"src": "v"}),
+                       edges[["seg", "dst"]].rename(columns={"dst": "v"})]).drop_duplicates()
+    return edges, nodes
+
+
+def _graph(edges, seg):
+    return eng.WindowGraph.from_edges(pd, None, edges[edges["seg"] == seg][["src", "dst", "weight"]])
+
+
+def test_expand_counts(no_repeat):
+    out = eng.expand_counts(np.array([7, 8, 9, 10]), np.array([2, 0, 3, 1]))
+    assert out.tolist() == [7, 7, 9, 9, 9, 10]
+    assert eng.expand_counts(np.array([1, 2]), np.array([0, 0])).tolist() == []
+
+
+def test_segments_match_per_replicate_summary(no_repeat):
+    edges, nodes = _edges()
+    B, seeds = 200, [11, 12]
+    boot = eng.BootstrapCI(B, 0.9, max_cells=5000)  # several chunks
+    out = boot.segments(edges, nodes, "in", seeds)
+
+    # reference: same uniforms, one DistributionSummary per replicate and segment
+    for s in range(2):
+        e = edges[edges["seg"] == s]
+        verts = np.sort(nodes[nodes["seg"] == s]["v"].values)
+        vi = np.searchsorted(verts, e["dst"].values)
+        ev_v = np.sort(np.array([x for x, w in zip(vi, e["weight"]) for _ in range(w)]))
+        n = len(ev_v)
+        est = eng.DistributionSummary(pd.Series(np.bincount(ev_v, minlength=len(verts)).astype("float64")))
+        u = eng.BootstrapCI.uniforms(np.full(n, seeds[s], dtype="uint64"), np.arange(B), np.arange(n))
+        reps = {k: [] for k in boot.metrics}
+        for r in range(B):
+            cnt = np.bincount(ev_v[np.minimum((u[r] * n).astype("int64"), n - 1)], minlength=len(verts))
+            d = eng.DistributionSummary(pd.Series(cnt.astype("float64")))
+            for k in boot.metrics:
+                reps[k].append(d.get(k))
+        row = out.loc[s]
+        for k in boot.metrics:
+            a = np.array(reps[k])
+            bias = a.mean() - est.get(k)
+            lo, hi = np.quantile(a, [0.05, 0.95]) - bias
+            assert np.allclose([row[f"in_{k}_ci_lo"], row[f"in_{k}_ci_hi"], row[f"in_{k}_se"], row[f"in_{k}_bias"]],
+                               [lo, hi, a.std(ddof=1), bias]), (s, k)
+
+
+def test_window_same_per_window_and_in_any_batch(no_repeat):
+    edges, nodes = _edges(sizes=((300, 120), (50, 40), (80, 60)))
+    boot = eng.BootstrapCI(100, 0.95)
+    seeds = [boot.window_seed("C", f"w{s}") for s in range(3)]
+    batch = boot.segments(edges, nodes, "in", seeds)
+    # segment 1 alone, renumbered to segment 0
+    alone = boot.segments(edges[edges["seg"] == 1].assign(seg=0), nodes[nodes["seg"] == 1].assign(seg=0),
+                          "in", seeds[1:2])
+    assert np.allclose(batch.loc[1].values, alone.loc[0].values)
+    for s in range(3):
+        row = boot.window(_graph(edges, s), "in", seeds[s])
+        assert np.allclose([row[c] for c in batch.columns], batch.loc[s].values), s
+
+
+def test_interval_covers_point_estimate():
+    # a few thousand events: the raw replicate percentiles sit above the estimate
+    edges, _ = _edges(sizes=((3000, 1500),), seed=4)
+    wg = _graph(edges, 0)
+    assert wg.total_weight > 2000
+    boot = eng.BootstrapCI(300, 0.95)
+    row = boot.window(wg, "in", boot.window_seed("C", "w"))
+    est = eng.DistributionSummary(pd.Series(wg.in_strength))
+    for k in boot.metrics:
+        assert row[f"in_{k}_ci_lo"] <= est.get(k) <= row[f"in_{k}_ci_hi"], (k, est.get(k), row)
+    assert row["in_gini_bias"] > 0